@@ -1,5 +1,5 @@
 __version__ = "1.0.0"
 from .middleware import AuditTrailMiddleware
-from .ledger import add_entry, verify_ledger
+from .ledger import add_entries, add_entry, verify_ledger
 
-__all__ = ["AuditTrailMiddleware", "add_entry", "verify_ledger"]
+__all__ = ["AuditTrailMiddleware", "add_entries", "add_entry", "verify_ledger"]
@@ -12,16 +12,15 @@ from typing import List, Dict, Any, Optional
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
+from .store import connection, cursor, ensure_schema
+
 
 # Anomaly detection database
 ANOMALY_DB = os.path.expanduser("~/.audittrail_anomalies.db")
 ALERT_CONFIG = os.path.expanduser("~/.audittrail_alerts.json")
 
 
-def init_anomaly_db():
-    """Initialize the anomaly detection database."""
-    conn = sqlite3.connect(ANOMALY_DB)
-    
+def _create_anomaly_schema(conn):
     conn.execute("""
     CREATE TABLE IF NOT EXISTS anomalies (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -60,15 +59,15 @@ def init_anomaly_db():
         description TEXT
     )
     """)
-    
-    conn.commit()
-    conn.close()
+
+
+def init_anomaly_db():
+    """Initialize the anomaly detection database."""
+    ensure_schema(ANOMALY_DB, _create_anomaly_schema)
 
 
 def init_default_rules():
     """Initialize default anomaly detection rules."""
-    init_anomaly_db()
-    
     default_rules = [
         {
             "rule_name": "rapid_failed_verification",
@@ -128,23 +127,18 @@ def init_default_rules():
         }
     ]
     
-    conn = sqlite3.connect(ANOMALY_DB)
-    cur = conn.cursor()
-    
-    for rule in default_rules:
-        try:
-            cur.execute(
-                "INSERT INTO detection_rules (rule_name, rule_type, threshold_value, time_window_minutes, severity, description) "
-                "VALUES (?, ?, ?, ?, ?, ?)",
-                (rule["rule_name"], rule["rule_type"], rule["threshold_value"], 
-                 rule["time_window_minutes"], rule["severity"], rule["description"])
-            )
-        except sqlite3.IntegrityError:
-            # Rule already exists
-            pass
-    
-    conn.commit()
-    conn.close()
+    with cursor(ANOMALY_DB, _create_anomaly_schema) as cur:
+        for rule in default_rules:
+            try:
+                cur.execute(
+                    "INSERT INTO detection_rules (rule_name, rule_type, threshold_value, time_window_minutes, severity, description) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (rule["rule_name"], rule["rule_type"], rule["threshold_value"], 
+                     rule["time_window_minutes"], rule["severity"], rule["description"])
+                )
+            except sqlite3.IntegrityError:
+                # Rule already exists
+                pass
 
 
 def record_anomaly(anomaly_type: str, severity: str, description: str, 
@@ -162,21 +156,16 @@ def record_anomaly(anomaly_type: str, severity: str, description: str,
     Returns:
         Anomaly ID
     """
-    init_anomaly_db()
-    
     detected_at = datetime.now(timezone.utc).isoformat()
     
-    conn = sqlite3.connect(ANOMALY_DB)
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO anomalies (detected_at, anomaly_type, severity, db_path, description, details) "
-        "VALUES (?, ?, ?, ?, ?, ?)",
-        (detected_at, anomaly_type, severity, db_path, description, 
-         json.dumps(details) if details else None)
-    )
-    anomaly_id = cur.lastrowid
-    conn.commit()
-    conn.close()
+    with cursor(ANOMALY_DB, _create_anomaly_schema) as cur:
+        cur.execute(
+            "INSERT INTO anomalies (detected_at, anomaly_type, severity, db_path, description, details) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (detected_at, anomaly_type, severity, db_path, description, 
+             json.dumps(details) if details else None)
+        )
+        anomaly_id = cur.lastrowid
     
     # Trigger alerts
     send_alerts_for_anomaly(anomaly_id, anomaly_type, severity, description)
@@ -209,33 +198,28 @@ def send_alerts_for_anomaly(anomaly_id: int, anomaly_type: str, severity: str, d
     
     sent_at = datetime.now(timezone.utc).isoformat()
     
-    init_anomaly_db()
-    conn = sqlite3.connect(ANOMALY_DB)
-    
-    # Log alerts (actual sending would happen here)
-    for channel in config.get("channels", []):
-        if channel.get("enabled", False):
-            channel_type = channel.get("type")
-            
-            if channel_type == "log":
-                # Already logged in anomalies table
-                status = "logged"
-            elif channel_type == "email":
-                status = "configured"  # Would actually send email
-            elif channel_type == "webhook":
-                status = "configured"  # Would actually call webhook
-            else:
-                status = "unknown"
-            
-            conn.execute(
-                "INSERT INTO alerts (anomaly_id, sent_at, channel, recipient, status) "
-                "VALUES (?, ?, ?, ?, ?)",
-                (anomaly_id, sent_at, channel_type, 
-                 channel.get("recipient", ""), status)
-            )
-    
-    conn.commit()
-    conn.close()
+    with cursor(ANOMALY_DB, _create_anomaly_schema) as cur:
+        # Log alerts (actual sending would happen here)
+        for channel in config.get("channels", []):
+            if channel.get("enabled", False):
+                channel_type = channel.get("type")
+                
+                if channel_type == "log":
+                    # Already logged in anomalies table
+                    status = "logged"
+                elif channel_type == "email":
+                    status = "configured"  # Would actually send email
+                elif channel_type == "webhook":
+                    status = "configured"  # Would actually call webhook
+                else:
+                    status = "unknown"
+                
+                cur.execute(
+                    "INSERT INTO alerts (anomaly_id, sent_at, channel, recipient, status) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (anomaly_id, sent_at, channel_type, 
+                     channel.get("recipient", ""), status)
+                )
 
 
 def load_alert_config() -> Dict:
@@ -285,20 +269,14 @@ def detect_failed_verification_spike(db_path: str, time_window_minutes: int = 60
     
     cutoff_time = datetime.now(timezone.utc) - timedelta(minutes=time_window_minutes)
     
-    conn = sqlite3.connect(CLI_AUDIT_PATH)
-    cur = conn.cursor()
-    
     try:
-        count = cur.execute(
+        count = connection(CLI_AUDIT_PATH).execute(
             "SELECT COUNT(*) FROM cli_audit WHERE command = 'verify' AND success = 0 AND timestamp > ?",
             (cutoff_time.isoformat(),)
         ).fetchone()[0]
     except sqlite3.OperationalError:
-        conn.close()
         return None
     
-    conn.close()
-    
     # Check against rule threshold
     rule = get_rule("rapid_failed_verification")
     if rule and count >= rule["threshold_value"]:
@@ -331,20 +309,14 @@ def detect_access_pattern_anomaly(db_path: str, time_window_minutes: int = 5) ->
     
     cutoff_time = datetime.now(timezone.utc) - timedelta(minutes=time_window_minutes)
     
-    conn = sqlite3.connect(CLI_AUDIT_PATH)
-    cur = conn.cursor()
-    
     try:
-        count = cur.execute(
+        count = connection(CLI_AUDIT_PATH).execute(
             "SELECT COUNT(*) FROM cli_audit WHERE timestamp > ?",
             (cutoff_time.isoformat(),)
         ).fetchone()[0]
     except sqlite3.OperationalError:
-        conn.close()
         return None
     
-    conn.close()
-    
     rule = get_rule("suspicious_access_pattern")
     if rule and count >= rule["threshold_value"]:
         return record_anomaly(
@@ -360,17 +332,13 @@ def detect_access_pattern_anomaly(db_path: str, time_window_minutes: int = 5) ->
 
 def get_rule(rule_name: str) -> Optional[Dict]:
     """Get a detection rule by name."""
-    init_anomaly_db()
-    
-    conn = sqlite3.connect(ANOMALY_DB)
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT rule_type, enabled, threshold_value, time_window_minutes, severity, description "
-        "FROM detection_rules WHERE rule_name = ?",
-        (rule_name,)
-    )
-    row = cur.fetchone()
-    conn.close()
+    with cursor(ANOMALY_DB, _create_anomaly_schema) as cur:
+        cur.execute(
+            "SELECT rule_type, enabled, threshold_value, time_window_minutes, severity, description "
+            "FROM detection_rules WHERE rule_name = ?",
+            (rule_name,)
+        )
+        row = cur.fetchone()
     
     if not row:
         return None
@@ -397,26 +365,21 @@ def get_recent_anomalies(limit: int = 50, unresolved_only: bool = False) -> List
     Returns:
         List of anomaly records
     """
-    init_anomaly_db()
-    
-    conn = sqlite3.connect(ANOMALY_DB)
-    cur = conn.cursor()
-    
-    if unresolved_only:
-        cur.execute(
-            "SELECT id, detected_at, anomaly_type, severity, db_path, description, details "
-            "FROM anomalies WHERE resolved = 0 ORDER BY id DESC LIMIT ?",
-            (limit,)
-        )
-    else:
-        cur.execute(
-            "SELECT id, detected_at, anomaly_type, severity, db_path, description, details, resolved "
-            "FROM anomalies ORDER BY id DESC LIMIT ?",
-            (limit,)
-        )
-    
-    rows = cur.fetchall()
-    conn.close()
+    with cursor(ANOMALY_DB, _create_anomaly_schema) as cur:
+        if unresolved_only:
+            cur.execute(
+                "SELECT id, detected_at, anomaly_type, severity, db_path, description, details "
+                "FROM anomalies WHERE resolved = 0 ORDER BY id DESC LIMIT ?",
+                (limit,)
+            )
+        else:
+            cur.execute(
+                "SELECT id, detected_at, anomaly_type, severity, db_path, description, details, resolved "
+                "FROM anomalies ORDER BY id DESC LIMIT ?",
+                (limit,)
+            )
+        
+        rows = cur.fetchall()
     
     anomalies = []
     for row in rows:
@@ -436,43 +399,33 @@ def get_recent_anomalies(limit: int = 50, unresolved_only: bool = False) -> List
 
 def resolve_anomaly(anomaly_id: int):
     """Mark an anomaly as resolved."""
-    init_anomaly_db()
-    
     resolved_at = datetime.now(timezone.utc).isoformat()
     
-    conn = sqlite3.connect(ANOMALY_DB)
-    conn.execute(
-        "UPDATE anomalies SET resolved = 1, resolved_at = ? WHERE id = ?",
-        (resolved_at, anomaly_id)
-    )
-    conn.commit()
-    conn.close()
+    with cursor(ANOMALY_DB, _create_anomaly_schema) as cur:
+        cur.execute(
+            "UPDATE anomalies SET resolved = 1, resolved_at = ? WHERE id = ?",
+            (resolved_at, anomaly_id)
+        )
 
 
 def get_anomaly_statistics() -> Dict:
     """Get statistics about detected anomalies."""
-    init_anomaly_db()
-    
-    conn = sqlite3.connect(ANOMALY_DB)
-    cur = conn.cursor()
-    
-    total = cur.execute("SELECT COUNT(*) FROM anomalies").fetchone()[0]
-    unresolved = cur.execute("SELECT COUNT(*) FROM anomalies WHERE resolved = 0").fetchone()[0]
-    
-    by_severity = cur.execute(
-        "SELECT severity, COUNT(*) FROM anomalies GROUP BY severity"
-    ).fetchall()
-    
-    by_type = cur.execute(
-        "SELECT anomaly_type, COUNT(*) FROM anomalies GROUP BY anomaly_type"
-    ).fetchall()
-    
-    recent_24h = cur.execute(
-        "SELECT COUNT(*) FROM anomalies WHERE detected_at > ?",
-        ((datetime.now(timezone.utc) - timedelta(hours=24)).isoformat(),)
-    ).fetchone()[0]
-    
-    conn.close()
+    with cursor(ANOMALY_DB, _create_anomaly_schema) as cur:
+        total = cur.execute("SELECT COUNT(*) FROM anomalies").fetchone()[0]
+        unresolved = cur.execute("SELECT COUNT(*) FROM anomalies WHERE resolved = 0").fetchone()[0]
+        
+        by_severity = cur.execute(
+            "SELECT severity, COUNT(*) FROM anomalies GROUP BY severity"
+        ).fetchall()
+        
+        by_type = cur.execute(
+            "SELECT anomaly_type, COUNT(*) FROM anomalies GROUP BY anomaly_type"
+        ).fetchall()
+        
+        recent_24h = cur.execute(
+            "SELECT COUNT(*) FROM anomalies WHERE detected_at > ?",
+            ((datetime.now(timezone.utc) - timedelta(hours=24)).isoformat(),)
+        ).fetchone()[0]
     
     return {
         "total_anomalies": total,
@@ -12,7 +12,8 @@ import hashlib
 import secrets
 from pathlib import Path
 from datetime import datetime, timezone
-import sqlite3
+
+from .store import cursor, ensure_schema
 
 # User roles configuration
 ROLES_PATH = os.path.expanduser("~/.audittrail_users.json")
@@ -38,9 +39,7 @@ ROLES = {
 }
 
 
-def init_cli_audit_db():
-    """Initialize the CLI audit log database."""
-    conn = sqlite3.connect(CLI_AUDIT_PATH)
+def _create_cli_audit_schema(conn):
     conn.execute("""
     CREATE TABLE IF NOT EXISTS cli_audit (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -53,20 +52,20 @@ def init_cli_audit_db():
         error TEXT
     )
     """)
-    conn.commit()
-    conn.close()
+
+
+def init_cli_audit_db():
+    """Initialize the CLI audit log database."""
+    ensure_schema(CLI_AUDIT_PATH, _create_cli_audit_schema)
 
 
 def log_cli_operation(username, role, command, args="", success=True, error=None):
     """Log a CLI operation to the audit trail."""
-    init_cli_audit_db()
-    conn = sqlite3.connect(CLI_AUDIT_PATH)
-    conn.execute(
-        "INSERT INTO cli_audit (timestamp, username, role, command, args, success, error) VALUES (?, ?, ?, ?, ?, ?, ?)",
-        (datetime.now(timezone.utc).isoformat(), username, role, command, args, success, error)
-    )
-    conn.commit()
-    conn.close()
+    with cursor(CLI_AUDIT_PATH, _create_cli_audit_schema) as cur:
+        cur.execute(
+            "INSERT INTO cli_audit (timestamp, username, role, command, args, success, error) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (datetime.now(timezone.utc).isoformat(), username, role, command, args, success, error)
+        )
 
 
 def hash_password(password):
@@ -0,0 +1,210 @@
+"""
+Spool store for large request/response bodies.
+
+Bodies above the middleware's stream threshold are not buffered in memory.
+Each chunk is encrypted as it arrives and appended to a blob file, while a
+running SHA-256 digest is kept over the encrypted stream. The ledger row
+stores a reference (blob id, digest and size) in place of the ciphertext,
+so the hash chain still commits to the payload.
+
+With envelope encryption a blob file starts with ``BLOB_MAGIC`` and the
+blob's wrapped data key, followed by length-prefixed encrypted chunks.
+Older blob files are newline-delimited Fernet tokens and still decrypt.
+"""
+
+import hashlib
+import os
+import uuid
+from pathlib import Path
+from typing import Iterator, Optional, Dict, Any
+
+from .cipher import (
+    EnvelopeCipher, decrypt_record, frame, legacy_cipher, load_data_key_record, read_frames
+)
+
+
+BLOB_PREFIX = "blob:"
+BLOB_MAGIC = b"ATBLOB2\n"
+
+
+def default_blob_dir(db_path: str) -> str:
+    """Blob directory used for a ledger database when none is configured."""
+    return os.path.abspath(db_path) + ".blobs"
+
+
+def is_blob_ref(value) -> bool:
+    """Check whether a stored body/response value is a blob reference."""
+    return isinstance(value, str) and value.startswith(BLOB_PREFIX)
+
+
+def parse_blob_ref(ref: str) -> Dict[str, Any]:
+    """
+    Parse a blob reference of the form ``blob:<id>:<sha256>:<size>``.
+
+    Returns:
+        Dictionary with blob_id, digest and size
+    """
+    _, blob_id, digest, size = ref.split(":")
+    return {"blob_id": blob_id, "digest": digest, "size": int(size)}
+
+
+class BlobWriter:
+    """
+    Incremental writer for one encrypted blob.
+
+    Chunks are encrypted one at a time, so memory use is bounded by the
+    chunk size. An envelope cipher encrypts the whole blob with one data
+    key, stored at the start of the file.
+    """
+
+    def __init__(self, blob_dir: str, cipher):
+        self.blob_id = uuid.uuid4().hex
+        self.size = 0
+        self._cipher = cipher
+        self._digest = hashlib.sha256()
+        self._path = os.path.join(blob_dir, f"{self.blob_id}.blob")
+        self._tmp_path = self._path + ".tmp"
+        Path(blob_dir).mkdir(mode=0o700, parents=True, exist_ok=True)
+        self._file = open(self._tmp_path, "wb")
+        self._data_key = None
+        if isinstance(cipher, EnvelopeCipher):
+            # Stored in the file header only, so it is not cached
+            self._data_key = cipher.new_data_key(cache=False)
+            self._append(BLOB_MAGIC + frame(self._data_key.record()))
+
+    def _append(self, data: bytes):
+        self._digest.update(data)
+        self._file.write(data)
+
+    def write(self, chunk: bytes):
+        """Encrypt and append a plaintext chunk."""
+        if not chunk:
+            return
+        if self._data_key is not None:
+            self._append(frame(self._cipher.encrypt(bytes(chunk), self._data_key)))
+        else:
+            self._append(self._cipher.encrypt(bytes(chunk)).encode() + b"\n")
+        self.size += len(chunk)
+
+    def close(self) -> str:
+        """
+        Finish the blob and move it into place.
+
+        Returns:
+            Blob reference to store in the ledger row
+        """
+        self._file.close()
+        os.replace(self._tmp_path, self._path)
+        os.chmod(self._path, 0o600)
+        return f"{BLOB_PREFIX}{self.blob_id}:{self._digest.hexdigest()}:{self.size}"
+
+    def abort(self):
+        """Discard a partially written blob."""
+        self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+
+
+class BodySpool:
+    """
+    Captures a body in memory until it exceeds ``threshold`` bytes, then
+    spills it to a :class:`BlobWriter`.
+
+    Args:
+        blob_dir: Directory for blob files
+        cipher: Cipher used to encrypt chunks (see ``cipher.get_cipher``)
+        threshold: In-memory limit in bytes (None keeps everything in memory)
+    """
+
+    def __init__(self, blob_dir: str, cipher, threshold: Optional[int] = None):
+        self.blob_dir = blob_dir
+        self.threshold = threshold
+        self._cipher = cipher
+        self._chunks = []
+        self._buffered = 0
+        self._writer = None
+
+    @property
+    def spooled(self) -> bool:
+        return self._writer is not None
+
+    def write(self, chunk: bytes):
+        if not chunk:
+            return
+        if self._writer is not None:
+            self._writer.write(chunk)
+            return
+
+        self._chunks.append(chunk)
+        self._buffered += len(chunk)
+        if self.threshold is not None and self._buffered > self.threshold:
+            self._writer = BlobWriter(self.blob_dir, self._cipher)
+            for buffered in self._chunks:
+                self._writer.write(buffered)
+            self._chunks = []
+            self._buffered = 0
+
+    def getvalue(self) -> bytes:
+        """Return the buffered body. Only valid when the body was not spooled."""
+        return b"".join(self._chunks)
+
+    def close(self) -> Optional[str]:
+        """Finish a spooled body and return its blob reference, or None if it stayed in memory."""
+        if self._writer is None:
+            return None
+        return self._writer.close()
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.abort()
+
+
+def iter_blob(blob_dir: str, ref: str, cipher=None) -> Iterator[bytes]:
+    """
+    Decrypt a blob chunk by chunk.
+
+    Args:
+        blob_dir: Directory holding blob files
+        ref: Blob reference stored in the ledger
+        cipher: Fernet cipher for blobs written before envelope encryption
+            (default: the master key's)
+
+    Yields:
+        Plaintext chunks
+    """
+    info = parse_blob_ref(ref)
+    with open(os.path.join(blob_dir, f"{info['blob_id']}.blob"), "rb") as f:
+        if f.read(len(BLOB_MAGIC)) == BLOB_MAGIC:
+            frames = read_frames(f)
+            # Used for this blob only, so it is not cached
+            data_key = load_data_key_record(next(frames), cache=False)
+            for record in frames:
+                yield decrypt_record(data_key, record)
+            return
+
+        f.seek(0)
+        cipher = cipher or legacy_cipher()
+        for line in f:
+            line = line.rstrip(b"\n")
+            if line:
+                yield cipher.decrypt(line)
+
+
+def verify_blob(blob_dir: str, ref: str) -> bool:
+    """
+    Check a blob file against the digest and presence recorded in its reference.
+
+    No decryption is required; the digest covers the encrypted stream.
+    """
+    info = parse_blob_ref(ref)
+    path = os.path.join(blob_dir, f"{info['blob_id']}.blob")
+    if not os.path.exists(path):
+        return False
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest() == info["digest"]
@@ -0,0 +1,162 @@
+"""
+Chain-head tracking for ledger appends.
+
+Every append needs the hash of the previous entry. Instead of sorting the
+ledger to find it, the head (last rowid and hash) is kept in a one-row
+``ledger_head`` table updated in the same transaction as the insert. The
+stored head is validated against the ledger tail the first time a
+database is used in a process.
+
+Appends read the head inside an IMMEDIATE write transaction
+(``store.write_cursor``), so workers in different processes take turns
+instead of chaining onto the same predecessor. ``chain_lock`` orders the
+threads of one process before they contend for the database lock.
+
+Hashes are handled as hex strings everywhere in code. Schema 2 ledgers
+store them as 32-byte BLOBs; :func:`hash_hex` and :func:`hash_blob`
+convert at the storage boundary.
+"""
+
+import os
+import sqlite3
+import threading
+
+
+_HEADS = {}
+_LOCKS = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def _key(db_path):
+    return os.path.abspath(db_path)
+
+
+def hash_hex(value):
+    """Hex string for a stored chain hash (BLOB in schema 2 ledgers, TEXT before)."""
+    if isinstance(value, bytes):
+        return value.hex()
+    return value
+
+
+def hash_blob(value):
+    """
+    Storage form of a hex chain hash for a schema 2 ledger.
+
+    A value that is not valid hex is kept as it is, so a damaged hash stays
+    visible to verification instead of failing the write or migration.
+    """
+    try:
+        return bytes.fromhex(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def chain_base(conn):
+    """
+    The (seq, hash) a ledger's first entry chains onto.
+
+    (0, "") for a standalone ledger. A ledger segment continues the chain
+    of the segment before it (see ``segments.py``).
+    """
+    try:
+        row = conn.execute("SELECT base_seq, base_hash FROM segment_info WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        return 0, ""
+    return (row[0], row[1]) if row else (0, "")
+
+
+def ensure_head_table(conn):
+    """Create the one-row chain head table if it does not exist."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ledger_head (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        seq INTEGER NOT NULL,
+        hash TEXT NOT NULL
+    )
+    """)
+
+
+def chain_lock(db_path):
+    """
+    Get the in-process append lock for a ledger.
+
+    Hold it from reading the head until the insert is committed so that
+    threads in one process never fork the chain.
+    """
+    key = _key(db_path)
+    with _REGISTRY_LOCK:
+        lock = _LOCKS.get(key)
+        if lock is None:
+            lock = _LOCKS[key] = threading.RLock()
+        return lock
+
+
+def load_chain_head(conn, db_path):
+    """
+    Read the chain head from the database and validate it against the ledger tail.
+
+    A missing or stale head row (e.g. a ledger written by an older version)
+    is repaired from the last row by rowid, which is an index lookup.
+
+    Returns:
+        Tuple of (seq, hash); :func:`chain_base` for an empty ledger
+    """
+    ensure_head_table(conn)
+    cur = conn.cursor()
+    head = cur.execute("SELECT seq, hash FROM ledger_head WHERE id = 1").fetchone()
+    tail = cur.execute("SELECT rowid, hash FROM ledger ORDER BY rowid DESC LIMIT 1").fetchone()
+    tail = (tail[0], hash_hex(tail[1]) or "") if tail else chain_base(conn)
+
+    if head is None or tuple(head) != tail:
+        in_transaction = conn.in_transaction
+        cur.execute(
+            "INSERT OR REPLACE INTO ledger_head (id, seq, hash) VALUES (1, ?, ?)", tail
+        )
+        # Inside an append's transaction the repair commits with the append
+        if not in_transaction:
+            conn.commit()
+
+    _HEADS[_key(db_path)] = tail
+    return tail
+
+
+def get_chain_head(conn, db_path):
+    """
+    Get the (seq, hash) of the last entry.
+
+    Call it inside the append's write transaction: another process may have
+    appended since this one last did, so the head is always read from
+    ``ledger_head`` (a primary-key lookup), never from the in-process cache.
+
+    Returns:
+        Tuple of (seq, hash); :func:`chain_base` for an empty ledger
+    """
+    if _key(db_path) not in _HEADS:
+        return load_chain_head(conn, db_path)
+    head = conn.execute("SELECT seq, hash FROM ledger_head WHERE id = 1").fetchone()
+    if head is None:
+        return load_chain_head(conn, db_path)
+    return head[0], head[1]
+
+
+def advance_chain_head(cur, seq, entry_hash):
+    """Move the stored head forward. Call inside the insert's transaction."""
+    cur.execute(
+        "INSERT OR REPLACE INTO ledger_head (id, seq, hash) VALUES (1, ?, ?)",
+        (seq, entry_hash)
+    )
+
+
+def set_cached_head(db_path, seq, entry_hash):
+    """Record the head this process last committed (it also marks the stored head as validated)."""
+    _HEADS[_key(db_path)] = (seq, entry_hash)
+
+
+def cached_head(db_path):
+    """The (seq, hash) this process last committed or validated, or None."""
+    return _HEADS.get(_key(db_path))
+
+
+def reset_chain_head(db_path):
+    """Forget the cached head so the next append revalidates against the database."""
+    _HEADS.pop(_key(db_path), None)
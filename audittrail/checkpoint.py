@@ -0,0 +1,213 @@
+"""
+Signed verification checkpoints.
+
+A clean verification pass with ``checkpoint=True`` records the last
+verified rowid, the chain hash at that row and a digest of the verified
+range, and signs them with the audit trail signing key. The next
+``verify_ledger`` call only checks rows after the latest trusted
+checkpoint, so routine verification costs O(new rows) instead of
+O(ledger). Verifying without ``checkpoint`` never writes to the ledger,
+and sealed segments are never checkpointed.
+
+A checkpoint is trusted only if its signature verifies and the ledger row
+it names still carries the recorded chain hash. Rows before it are not
+re-hashed; with ``recheck`` their stored hashes are read again and compared
+with the signed range digests of the checkpoints that cover them, which
+catches rows deleted, inserted or given a rewritten hash at the cost of one
+pass over the ``hash`` column.
+"""
+
+import hashlib
+import json
+import sqlite3
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, Tuple
+
+from .chain import hash_hex
+from .store import connection, cursor, ensure_schema
+from .signatures import get_signer, verify_signature
+
+
+def _create_checkpoint_schema(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS verification_checkpoints (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at TEXT NOT NULL,
+        from_rowid INTEGER NOT NULL,
+        last_rowid INTEGER NOT NULL,
+        chain_hash TEXT NOT NULL,
+        range_digest TEXT NOT NULL,
+        total_entries INTEGER NOT NULL,
+        signature TEXT NOT NULL
+    )
+    """)
+
+
+def init_checkpoint_table(db_path: str):
+    """Create the checkpoint table in a ledger database."""
+    ensure_schema(db_path, _create_checkpoint_schema)
+
+
+def _checkpoint_message(checkpoint: Dict[str, Any]) -> str:
+    return json.dumps({
+        "created_at": checkpoint["created_at"],
+        "from_rowid": checkpoint["from_rowid"],
+        "last_rowid": checkpoint["last_rowid"],
+        "chain_hash": checkpoint["chain_hash"],
+        "range_digest": checkpoint["range_digest"],
+        "total_entries": checkpoint["total_entries"],
+    }, sort_keys=True)
+
+
+def compute_range_digest(db_path: str, from_rowid: int, last_rowid: int) -> str:
+    """
+    SHA-256 over the entry hashes of rows with ``from_rowid < rowid <= last_rowid``.
+
+    Only the narrow ``hash`` column is read.
+    """
+    digest = hashlib.sha256()
+    rows = connection(db_path).execute(
+        "SELECT hash FROM ledger WHERE rowid > ? AND rowid <= ? ORDER BY rowid ASC",
+        (from_rowid, last_rowid)
+    )
+    for (entry_hash,) in rows:
+        digest.update(hash_hex(entry_hash).encode())
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def create_checkpoint(db_path: str, from_rowid: int, last_rowid: int, total_entries: int,
+                      signer=None) -> Dict[str, Any]:
+    """
+    Record a signed checkpoint for a verified range.
+
+    Args:
+        db_path: Ledger database path
+        from_rowid: Rowid the verified range starts after
+        last_rowid: Last verified rowid
+        total_entries: Number of ledger entries up to and including ``last_rowid``
+        signer: Signer to use (default: the shared process-wide signer)
+
+    Returns:
+        Checkpoint dictionary including its id and signature
+    """
+    (chain_hash,) = connection(db_path).execute(
+        "SELECT hash FROM ledger WHERE rowid = ?", (last_rowid,)
+    ).fetchone()
+
+    checkpoint = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "from_rowid": from_rowid,
+        "last_rowid": last_rowid,
+        "chain_hash": hash_hex(chain_hash),
+        "range_digest": compute_range_digest(db_path, from_rowid, last_rowid),
+        "total_entries": total_entries,
+    }
+    checkpoint["signature"] = (signer or get_signer()).sign(_checkpoint_message(checkpoint))
+
+    with cursor(db_path, _create_checkpoint_schema) as cur:
+        cur.execute(
+            "INSERT INTO verification_checkpoints "
+            "(created_at, from_rowid, last_rowid, chain_hash, range_digest, total_entries, signature) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (checkpoint["created_at"], checkpoint["from_rowid"], checkpoint["last_rowid"],
+             checkpoint["chain_hash"], checkpoint["range_digest"], checkpoint["total_entries"],
+             checkpoint["signature"])
+        )
+        checkpoint["id"] = cur.lastrowid
+
+    return checkpoint
+
+
+_CHECKPOINT_KEYS = ["id", "created_at", "from_rowid", "last_rowid", "chain_hash",
+                    "range_digest", "total_entries", "signature"]
+
+
+def _find_checkpoint(db_path: str, where: str = "", params: tuple = ()) -> Optional[Dict[str, Any]]:
+    # A lookup only reads: a ledger that was never checkpointed has no table
+    try:
+        row = connection(db_path).execute(
+            f"SELECT {', '.join(_CHECKPOINT_KEYS)} FROM verification_checkpoints {where} ORDER BY id DESC LIMIT 1",
+            params
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return dict(zip(_CHECKPOINT_KEYS, row)) if row else None
+
+
+def _is_signed(checkpoint: Dict[str, Any]) -> bool:
+    try:
+        return verify_signature(_checkpoint_message(checkpoint), checkpoint["signature"])
+    except Exception:
+        return False
+
+
+def get_latest_checkpoint(db_path: str) -> Optional[Dict[str, Any]]:
+    """Get the most recent checkpoint, trusted or not."""
+    return _find_checkpoint(db_path)
+
+
+def recheck_checkpoint_ranges(db_path: str, checkpoint: Dict[str, Any]) -> Optional[str]:
+    """
+    Compare the rows up to a checkpoint with the range digests that cover them.
+
+    Walks back from ``checkpoint`` through the checkpoints whose ranges end
+    where the later one starts, so each row's stored hash is read once. A
+    row whose contents were edited but whose hash was left alone is only
+    found by a full verification.
+
+    Returns:
+        None if every range still matches, otherwise the problem
+    """
+    conn = connection(db_path)
+    while True:
+        from_rowid, last_rowid = checkpoint["from_rowid"], checkpoint["last_rowid"]
+        if compute_range_digest(db_path, from_rowid, last_rowid) != checkpoint["range_digest"]:
+            return (f"Checkpoint {checkpoint['id']} range digest does not match rows "
+                    f"{from_rowid + 1}-{last_rowid}")
+        if conn.execute("SELECT 1 FROM ledger WHERE rowid <= ? LIMIT 1", (from_rowid,)).fetchone() is None:
+            return None
+        earlier = _find_checkpoint(db_path, "WHERE last_rowid = ? AND id < ?", (from_rowid, checkpoint["id"]))
+        if earlier is None:
+            return f"Rows up to {from_rowid} are not covered by a checkpoint before {checkpoint['id']}"
+        if not _is_signed(earlier):
+            return f"Checkpoint {earlier['id']} signature verification failed"
+        checkpoint = earlier
+
+
+def latest_trusted_checkpoint(db_path: str, recheck: bool = False) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Get the latest checkpoint if it can be trusted.
+
+    Args:
+        db_path: Ledger database path
+        recheck: Also compare the stored hashes of the rows it covers with
+            the signed range digests (see :func:`recheck_checkpoint_ranges`)
+
+    Returns:
+        Tuple of (checkpoint, problem). ``problem`` is None for a trusted
+        checkpoint and otherwise says why it was rejected; both are None when
+        there is no checkpoint.
+    """
+    checkpoint = get_latest_checkpoint(db_path)
+    if checkpoint is None:
+        return None, None
+
+    if not _is_signed(checkpoint):
+        return checkpoint, f"Checkpoint {checkpoint['id']} signature verification failed"
+
+    row = connection(db_path).execute(
+        "SELECT hash FROM ledger WHERE rowid = ?", (checkpoint["last_rowid"],)
+    ).fetchone()
+    if row is None or hash_hex(row[0]) != checkpoint["chain_hash"]:
+        return checkpoint, f"Checkpoint {checkpoint['id']} chain hash does not match the ledger"
+
+    if recheck:
+        return checkpoint, recheck_checkpoint_ranges(db_path, checkpoint)
+    return checkpoint, None
+
+
+def clear_checkpoints(db_path: str):
+    """Delete all checkpoints (e.g. after the ledger was cleared)."""
+    with cursor(db_path, _create_checkpoint_schema) as cur:
+        cur.execute("DELETE FROM verification_checkpoints")
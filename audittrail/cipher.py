@@ -0,0 +1,357 @@
+"""
+Payload encryption.
+
+Bodies and responses used to be stored as Fernet tokens (AES-128-CBC plus
+HMAC-SHA256, base64-encoded): two passes over every payload and a third
+more bytes on disk than the ciphertext. New payloads use envelope
+encryption instead:
+
+- The master key (``~/.audittrail.key``, or another key of the keyring,
+  see ``key_manager.py``) only wraps data keys (RFC 3394 AES key wrap
+  under a key derived from it with HKDF).
+- A data key encrypts up to ``DATA_KEY_MAX_USES`` payloads with
+  AES-256-GCM or ChaCha20-Poly1305 before it is replaced.
+- A payload is one raw BLOB: algorithm tag, data key id, nonce, then the
+  ciphertext and tag, 37 bytes more than the plaintext.
+- The wrapped data keys a ledger file uses are stored in its ``data_keys``
+  table, with the id of the master key that wrapped them, in the same
+  transaction as the rows, so every shard and segment decrypts on its
+  own with the keyring.
+
+Stored Fernet tokens (TEXT) still decrypt, and ``AUDITTRAIL_CIPHER=fernet``
+keeps writing them.
+
+Usage:
+    value = encrypt_payload(b'{"amount": 1000}')    # bytes, or str for Fernet
+    plaintext = decrypt_payload(value, "audit_log.db")
+"""
+
+import os
+import sqlite3
+import struct
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.keywrap import aes_key_unwrap, aes_key_wrap
+
+from .key_manager import KEY_PATH, get_keyring
+from .store import connection
+
+
+# Payload ciphers, by name; the envelope ones carry a one-byte tag
+ALGORITHMS = {"aes-256-gcm": 1, "chacha20-poly1305": 2}
+CIPHERS = tuple(ALGORITHMS) + ("fernet",)
+DEFAULT_CIPHER = os.getenv("AUDITTRAIL_CIPHER", "aes-256-gcm")
+
+# Payloads per data key. Nonces are random, so this stays far below the
+# 2**32 messages NIST allows per AES-GCM key.
+DATA_KEY_MAX_USES = 100000
+
+_AEADS = {"aes-256-gcm": AESGCM, "chacha20-poly1305": ChaCha20Poly1305}
+_NAMES = {tag: name for name, tag in ALGORITHMS.items()}
+_KEY_ID_SIZE = 8
+_NONCE_SIZE = 12
+_WRAPPED_SIZE = 40
+# tag | data key id | nonce; authenticated as associated data
+_HEADER_SIZE = 1 + _KEY_ID_SIZE + _NONCE_SIZE
+
+# Data keys by id: created by this process or unwrapped from a ledger
+_DATA_KEYS: Dict[bytes, "DataKey"] = {}
+_lock = threading.Lock()
+# Cipher for new payloads, and the keyring it was built from (None if set explicitly)
+_cipher = None
+_cipher_keyring = None
+
+
+def load_master_key() -> bytes:
+    """The current master key of the keyring (``~/.audittrail.key`` is created on first use)."""
+    return get_keyring().key()
+
+
+def master_key_id() -> str:
+    """Id recorded with rows and data keys for the current master key."""
+    return get_keyring().current
+
+
+def _kek(master_key: bytes) -> bytes:
+    """Key-encryption key derived from the master key."""
+    return HKDF(
+        algorithm=hashes.SHA256(), length=32, salt=None, info=b"audittrail data key wrap"
+    ).derive(master_key)
+
+
+class DataKey:
+    """A data key, its AEAD and its wrapped form."""
+
+    def __init__(self, key_id: bytes, algorithm: str, key: bytes, wrapped: bytes, master_key_id: str):
+        self.id = key_id
+        self.algorithm = algorithm
+        self.wrapped = wrapped
+        self.master_key_id = master_key_id
+        self.aead = _AEADS[algorithm](key)
+
+    def record(self) -> bytes:
+        """Self-contained form (id, algorithm, wrapped key, master key id), e.g. for blob files."""
+        return self.id + bytes([ALGORITHMS[self.algorithm]]) + self.wrapped + self.master_key_id.encode()
+
+
+class FernetCipher:
+    """Fernet tokens, as written before envelope encryption."""
+
+    name = "fernet"
+
+    def __init__(self, key_id: Optional[str] = None):
+        self.key_id = key_id or master_key_id()
+
+    @property
+    def fernet(self) -> Fernet:
+        # Looked up on first use, not when the cipher is built
+        return get_keyring().fernet(self.key_id)
+
+    def encrypt(self, data: bytes) -> str:
+        return self.fernet.encrypt(data).decode()
+
+    def decrypt(self, token) -> bytes:
+        return get_keyring().decrypt_fernet(token, self.key_id)
+
+
+class EnvelopeCipher:
+    """
+    AES-256-GCM or ChaCha20-Poly1305 with data keys wrapped by the master key.
+
+    Args:
+        algorithm: "aes-256-gcm" or "chacha20-poly1305"
+        master_key: Master key (default: ``~/.audittrail.key``)
+        key_id: Id of the master key (default: ``AUDITTRAIL_KEY_ID`` or "local")
+        max_uses: Payloads encrypted per data key
+    """
+
+    def __init__(self, algorithm: str = "aes-256-gcm", master_key: Optional[bytes] = None,
+                 key_id: Optional[str] = None, max_uses: int = DATA_KEY_MAX_USES):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"algorithm must be one of {sorted(ALGORITHMS)}, got {algorithm!r}")
+        self.name = algorithm
+        self.key_id = key_id or master_key_id()
+        self.max_uses = max_uses
+        self._kek = _kek(master_key or load_master_key())
+        self._lock = threading.Lock()
+        self._current = None
+        self._uses = 0
+
+    def new_data_key(self, cache: bool = True) -> DataKey:
+        """
+        Generate and wrap a fresh data key.
+
+        Args:
+            cache: Keep it in the process-wide cache that ``store_data_keys``
+                reads; keys stored elsewhere (a blob file's header) pass False
+        """
+        key = os.urandom(32)
+        data_key = DataKey(os.urandom(_KEY_ID_SIZE), self.name, key, aes_key_wrap(self._kek, key), self.key_id)
+        if cache:
+            _DATA_KEYS[data_key.id] = data_key
+        return data_key
+
+    def data_key(self) -> DataKey:
+        """The current data key, replaced after ``max_uses`` payloads."""
+        with self._lock:
+            if self._current is None or self._uses >= self.max_uses:
+                self._current = self.new_data_key()
+                self._uses = 0
+            self._uses += 1
+            return self._current
+
+    def encrypt(self, data: bytes, data_key: Optional[DataKey] = None) -> bytes:
+        data_key = data_key or self.data_key()
+        header = bytes([ALGORITHMS[data_key.algorithm]]) + data_key.id + os.urandom(_NONCE_SIZE)
+        return header + data_key.aead.encrypt(header[-_NONCE_SIZE:], data, header)
+
+    def unwrap(self, key_id: bytes, algorithm: str, wrapped: bytes, master_key_id: str,
+               cache: bool = True) -> DataKey:
+        """Unwrap a stored data key and cache it (raises InvalidUnwrap for another master key)."""
+        data_key = _DATA_KEYS.get(key_id)
+        if data_key is None:
+            key = aes_key_unwrap(self._kek, wrapped)
+            data_key = DataKey(key_id, algorithm, key, wrapped, master_key_id)
+            if cache:
+                _DATA_KEYS[key_id] = data_key
+        return data_key
+
+
+def unwrap_data_key(key_id: bytes, algorithm: str, wrapped: bytes, master_key_id: str,
+                    cache: bool = True) -> DataKey:
+    """Unwrap a stored data key with the keyring's master key ``master_key_id``."""
+    data_key = _DATA_KEYS.get(key_id)
+    if data_key is None:
+        data_key = get_keyring().envelope(master_key_id).unwrap(key_id, algorithm, wrapped, master_key_id,
+                                                                cache)
+    return data_key
+
+
+def get_cipher():
+    """The process-wide cipher for new payloads (``AUDITTRAIL_CIPHER``, default AES-256-GCM)."""
+    global _cipher, _cipher_keyring
+    keyring = get_keyring()
+    if _cipher is None or (_cipher_keyring is not None and _cipher_keyring is not keyring):
+        # Built from the keyring's current key; rebuilt when the keyring is replaced
+        with _lock:
+            _cipher = make_cipher(DEFAULT_CIPHER)
+            _cipher_keyring = keyring
+    return _cipher
+
+
+def make_cipher(name: str):
+    """Build a cipher by name, one of :data:`CIPHERS`, for the keyring's current key."""
+    if name == "fernet":
+        return FernetCipher()
+    if name not in ALGORITHMS:
+        raise ValueError(f"cipher must be one of {CIPHERS}, got {name!r}")
+    return get_keyring().envelope(algorithm=name)
+
+
+def set_cipher(cipher):
+    """
+    Set the cipher for new payloads.
+
+    Args:
+        cipher: Name from :data:`CIPHERS` or a cipher object with
+            ``encrypt(data) -> str | bytes``
+    """
+    global _cipher, _cipher_keyring
+    if isinstance(cipher, str):
+        _cipher, _cipher_keyring = make_cipher(cipher), get_keyring()
+    else:
+        _cipher, _cipher_keyring = cipher, None
+
+
+def load_data_key_record(record: bytes, cache: bool = True) -> DataKey:
+    """Data key from a self-contained :meth:`DataKey.record` (``cache=False`` leaves it out of the cache)."""
+    end = _KEY_ID_SIZE + 1 + _WRAPPED_SIZE
+    return unwrap_data_key(record[:_KEY_ID_SIZE], _NAMES[record[_KEY_ID_SIZE]],
+                           record[_KEY_ID_SIZE + 1:end], record[end:].decode(), cache)
+
+
+def is_envelope(value) -> bool:
+    """Whether a stored payload is an envelope-encrypted BLOB."""
+    return isinstance(value, (bytes, bytearray)) and len(value) > _HEADER_SIZE and value[0] in _NAMES
+
+
+def encrypt_payload(data: bytes):
+    """Encrypt a payload with the current cipher; returns bytes (envelope) or str (Fernet)."""
+    return get_cipher().encrypt(data)
+
+
+def decrypt_payload(value, db_path: str, key_id: Optional[str] = None) -> bytes:
+    """
+    Decrypt a stored body/response (envelope BLOB or Fernet token).
+
+    Args:
+        value: Stored value
+        db_path: Ledger it was read from, or the root of a segmented ledger;
+            data keys not yet cached are unwrapped from its ``data_keys``
+        key_id: The row's ``key_id``, which selects the key for a Fernet
+            token (default: try every key of the keyring)
+    """
+    if not value:
+        return b""
+    if not is_envelope(value):
+        return get_keyring().decrypt_fernet(value, key_id)
+    value = bytes(value)
+    key_id = value[1:1 + _KEY_ID_SIZE]
+    data_key = _DATA_KEYS.get(key_id) or _load_data_key(db_path, key_id)
+    return decrypt_record(data_key, value)
+
+
+def decrypt_record(data_key: DataKey, value: bytes) -> bytes:
+    """Decrypt an envelope payload with its data key."""
+    return data_key.aead.decrypt(value[1 + _KEY_ID_SIZE:_HEADER_SIZE], value[_HEADER_SIZE:],
+                                 value[:_HEADER_SIZE])
+
+
+def legacy_cipher() -> FernetCipher:
+    """Fernet cipher of the current key, for rows and blobs written before envelope encryption."""
+    return FernetCipher()
+
+
+def _load_data_key(db_path: str, key_id: bytes) -> DataKey:
+    from .segments import ledger_files
+
+    for path in ledger_files(db_path):
+        try:
+            row = connection(path).execute(
+                "SELECT algorithm, wrapped, key_id FROM data_keys WHERE id = ?", (key_id,)
+            ).fetchone()
+        except sqlite3.OperationalError:
+            continue
+        if row is not None:
+            return unwrap_data_key(key_id, *row)
+    raise KeyError(f"Data key {key_id.hex()} not found in {db_path}")
+
+
+def ensure_data_key_table(conn):
+    """Create the table of wrapped data keys in a ledger database."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS data_keys (
+        id BLOB PRIMARY KEY,
+        algorithm TEXT NOT NULL,
+        wrapped BLOB NOT NULL,
+        key_id TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    )
+    """)
+
+
+def store_data_keys(conn, values: Iterable):
+    """
+    Record the data keys of envelope payloads in the ledger being written.
+
+    Called inside the write transaction that inserts the rows, so a
+    committed row's data key is always stored with it.
+
+    Raises:
+        KeyError: If a payload's data key is not cached in this process;
+            the transaction must roll back rather than commit a row that
+            can never be decrypted
+    """
+    key_ids = {bytes(value[1:1 + _KEY_ID_SIZE]) for value in values if is_envelope(value)}
+    if not key_ids:
+        return
+    rows = []
+    for key_id in key_ids:
+        data_key = _DATA_KEYS.get(key_id)
+        if data_key is None:
+            raise KeyError(f"Data key {key_id.hex()} is not cached; cannot store it with the row")
+        rows.append((key_id, data_key.algorithm, data_key.wrapped, data_key.master_key_id,
+                     datetime.now(timezone.utc).isoformat()))
+    insert = "INSERT OR IGNORE INTO data_keys (id, algorithm, wrapped, key_id, created_at) VALUES (?, ?, ?, ?, ?)"
+    try:
+        conn.executemany(insert, rows)
+    except sqlite3.OperationalError:
+        # Ledger created before envelope encryption, not yet opened with its schema
+        ensure_data_key_table(conn)
+        conn.executemany(insert, rows)
+
+
+def data_key_records(values: Iterable) -> List[bytes]:
+    """Records (see :meth:`DataKey.record`) of the data keys envelope payloads were encrypted with."""
+    key_ids = {bytes(value[1:1 + _KEY_ID_SIZE]) for value in values if is_envelope(value)}
+    return [_DATA_KEYS[key_id].record() for key_id in key_ids]
+
+
+def frame(record: bytes) -> bytes:
+    """Length-prefixed record, for blob files."""
+    return struct.pack(">I", len(record)) + record
+
+
+def read_frames(f):
+    """Yield the records written with :func:`frame`."""
+    while True:
+        size = f.read(4)
+        if len(size) < 4:
+            return
+        yield f.read(struct.unpack(">I", size)[0])
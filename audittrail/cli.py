@@ -1,3 +1,4 @@
+import base64
 import click
 import sqlite3
 import json
@@ -5,23 +6,103 @@ import csv
 import time
 import os
 from functools import wraps
-from .ledger import verify_ledger
+from cryptography.fernet import Fernet
+from .ledger import _ensure_db, verify_ledger, verify_payloads
+from .migrate import migrate_ledger
+from .shards import anchor_shards, is_shard_root, list_shards
+from .segments import (
+    SEGMENT_INTERVALS, init_segmented_ledger, is_segment_root, ledger_files, list_segments, rotate_segment
+)
+from .chain import ensure_head_table, hash_hex, reset_chain_head
+from .checkpoint import clear_checkpoints
+from .tamper import locate_tamper as locate_ledger_tamper
+from .merkle_index import (
+    clear_merkle_index, get_root, rebuild_merkle_index,
+    consistency_proof as merkle_consistency_proof, inclusion_proof as merkle_inclusion_proof
+)
+from .blobstore import default_blob_dir, is_blob_ref, iter_blob, parse_blob_ref
+from .cipher import CIPHERS, KEY_PATH, decrypt_payload, legacy_cipher
+from .key_manager import KEY_DIR, FileKeySource, get_keyring
+from .rotation import rotate_ledger
+from .compression import decompress_payload
+from .payloads import ensure_payload_table, load_payload
 from .auth import (
     authenticate, check_permission, get_current_session, create_session, clear_session,
     add_user as auth_add_user, remove_user as auth_remove_user, list_users as auth_list_users,
     log_cli_operation, ROLES, init_users_file, CLI_AUDIT_PATH
 )
-from cryptography.fernet import Fernet
 from tabulate import tabulate
 
 
-KEY_PATH = os.path.expanduser("~/.audittrail.key")
-
 def load_cipher():
+    """Fernet cipher for legacy payloads (any key of the keyring); fails if there is no master key."""
     if not os.path.exists(KEY_PATH):
         raise click.ClickException("Encryption key not found. Run your API once to generate ~/.audittrail.key.")
-    with open(KEY_PATH, "rb") as f:
-        return Fernet(f.read())
+    return legacy_cipher()
+
+
+def require_segment_root(db_path):
+    """Fail unless ``db_path`` is the root of a segmented ledger; the file is only read."""
+    if not os.path.exists(db_path):
+        raise click.ClickException(f"No ledger at {db_path}.")
+    root = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        segmented = is_segment_root(root)
+    finally:
+        root.close()
+    if not segmented:
+        raise click.ClickException(
+            f"{db_path} is not a segmented ledger. Create one with 'init --segment-interval' or '--segment-rows'."
+        )
+
+
+def decrypt_value(cipher, value, db_path, compression=None, full=False, key_id=None):
+    """
+    Decrypt (and decompress) a stored body/response.
+
+    Only the first chunk of a spooled blob is read unless ``full`` is set.
+    ``key_id`` is the row's master key, which decrypts legacy Fernet rows
+    without trying every key.
+    """
+    if not value:
+        return ""
+    if is_blob_ref(value):
+        try:
+            chunks = iter_blob(default_blob_dir(db_path), value, cipher)
+            data = b"".join(chunks) if full else next(chunks, b"")
+        except FileNotFoundError:
+            return f"[missing blob {parse_blob_ref(value)['blob_id']}]"
+        return data.decode(errors="ignore")
+    value = load_payload(value, db_path)
+    return decompress_payload(compression, decrypt_payload(value, db_path, key_id)).decode(errors="ignore")
+
+
+# Columns newer than some ledger files; ``{name}`` in a ledger_rows query
+# reads as NULL where the column does not exist yet
+_LATE_COLUMNS = ("compression", "key_id")
+
+
+def ledger_rows(db_path, sql, params=(), newest_first=False, limit=None):
+    """
+    Run a query on every ledger file of ``db_path`` and concatenate the rows.
+
+    A segmented ledger is queried segment by segment (newest first if
+    asked), stopping once ``limit`` rows were found. Columns from
+    ``_LATE_COLUMNS`` are written as ``{name}`` placeholders.
+    """
+    files = ledger_files(db_path)
+    rows = []
+    for path in reversed(files) if newest_first else files:
+        conn = sqlite3.connect(path)
+        query = sql
+        if "{" in sql:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(ledger)")}
+            query = sql.format(**{name: name if name in columns else "NULL" for name in _LATE_COLUMNS})
+        rows.extend(conn.execute(query, params).fetchall())
+        conn.close()
+        if limit is not None and len(rows) >= limit:
+            return rows[:limit]
+    return rows
 
 
 def print_table(rows, headers):
@@ -208,19 +289,84 @@ def list_users():
 
 @cli.command()
 @click.argument("db_path")
+@click.option("--workers", default=1, type=int, help="Worker processes for parallel verification (0 = all CPUs)")
+@click.option("--page-size", default=1000, type=int, help="Rows held in memory per page")
+@click.option("--max-memory", default=None, type=int, help="Approximate memory ceiling per page, in MB")
+@click.option("--full", is_flag=True, help="Ignore checkpoints and re-verify every entry")
+@click.option("--checkpoint", is_flag=True,
+              help="Record a signed checkpoint after a clean pass; the next verification starts after it")
+@click.option("--recheck", is_flag=True,
+              help="Compare the stored hashes of entries before the checkpoint with its signed range digests")
+@click.option("--payloads", is_flag=True, help="Also check bodies, responses and blob files against their digests")
 @require_auth("verify")
-def verify(db_path):
-    """Verify the integrity of the ledger (verifier, admin)."""
-    result = verify_ledger(db_path)
+def verify(db_path, workers, page_size, max_memory, full, checkpoint, recheck, payloads):
+    """
+    Verify the integrity of the ledger (verifier, admin).
+
+    Only entries after the latest trusted checkpoint are verified: without
+    --full, entries before it are not re-checked. --recheck reads their
+    stored hashes again, which catches deleted, inserted or re-hashed
+    entries but not an entry edited without touching its hash. The ledger
+    is only written to with --checkpoint.
+    """
+    def show_issue(issue):
+        location = f"Anchor {issue['anchor']}" if "anchor" in issue else f"Row {issue['row']}"
+        if issue.get("shard") is not None:
+            location = f"Shard {issue['shard']}, {location.lower()}"
+        click.echo(click.style(f"  - {location}: {issue['reason']}", fg="yellow"))
+
+    def show_progress(checked, total):
+        click.echo(f"  ... {checked}/{total} rows checked", err=True)
+
+    root = sqlite3.connect(db_path)
+    sharded, segmented = is_shard_root(root), is_segment_root(root)
+    root.close()
+    result = verify_ledger(
+        db_path,
+        workers=workers or None,
+        page_size=page_size,
+        max_memory=max_memory * 1024 * 1024 if max_memory else None,
+        on_issue=show_issue,
+        on_progress=show_progress,
+        full=full,
+        checkpoint=checkpoint,
+        recheck=recheck
+    )
+    if "checkpoint_id" in result:
+        click.echo(f"  Resumed from checkpoint {result['checkpoint_id']}: "
+                   f"{result['checked_entries']} of {result['total_entries']} entries checked")
+    if sharded:
+        click.echo(f"  {len(result['shards'])} shards, {result['checked_entries']} of {result['total_entries']} "
+                   f"entries checked, {result['anchors']} anchors ({result['unanchored_entries']} entries not yet anchored)")
+    if segmented:
+        click.echo(f"  {len(result['segments'])} segments ({result['sealed_segments']} sealed), "
+                   f"{result['checked_entries']} of {result['total_entries']} entries checked")
     if result.get("verified"):
         click.echo(click.style("✓ Ledger verified successfully — no tampering detected.", fg="green"))
     else:
-        click.echo(click.style("✗ Ledger verification FAILED", fg="red", bold=True))
-        if "details" in result:
-            for issue in result["details"]:
-                click.echo(click.style(f"  - Row {issue['row']}: {issue['reason']}", fg="yellow"))
+        click.echo(click.style(f"✗ Ledger verification FAILED ({result.get('issues', 0)} issues)", fg="red", bold=True))
+
+    if payloads:
+        if sharded or segmented:
+            # Shards and segments share the root's blob directory
+            parts = list_shards(db_path) if sharded else {s["id"]: s["path"] for s in list_segments(db_path)}
+            result = {"verified": True, "checked_entries": 0, "blobs_checked": 0, "issues": 0}
+            for shard, path in parts.items():
+                shard_result = verify_payloads(
+                    path, blob_dir=default_blob_dir(db_path), page_size=page_size,
+                    on_issue=lambda issue, shard=shard: show_issue(dict(issue, shard=shard)),
+                    on_progress=show_progress
+                )
+                for name in ("checked_entries", "blobs_checked", "issues"):
+                    result[name] += shard_result[name]
+                result["verified"] = result["verified"] and shard_result["verified"]
+        else:
+            result = verify_payloads(db_path, page_size=page_size, on_issue=show_issue, on_progress=show_progress)
+        if result["verified"]:
+            click.echo(click.style(f"✓ Payloads verified ({result['checked_entries']} entries, "
+                                   f"{result['blobs_checked']} blobs).", fg="green"))
         else:
-            click.echo(click.style(f"  Reason: {result.get('error', 'Unknown error')}", fg="yellow"))
+            click.echo(click.style(f"✗ Payload verification FAILED ({result['issues']} issues)", fg="red", bold=True))
 
 
 @cli.command()
@@ -237,28 +383,27 @@ def logs(db_path, limit, decrypt):
         click.echo(click.style("✗ Decryption requires admin role.", fg="red"))
         return
     
-    conn = sqlite3.connect(db_path)
-    
     if decrypt:
-        rows = conn.execute(
-            "SELECT ts, method, path, user, status, body, response FROM ledger ORDER BY ts DESC LIMIT ?",
-            (limit,)
-        ).fetchall()
-        conn.close()
+        rows = ledger_rows(
+            db_path,
+            "SELECT ts, method, path, user, status, body, response, {compression}, {key_id} FROM ledger "
+            "ORDER BY rowid DESC LIMIT ?",
+            (limit,), newest_first=True, limit=limit
+        )
         
         cipher = load_cipher()
         headers = ["Timestamp", "Method", "Path", "User", "Status", "Request Body", "Response"]
         rows_for_table = []
         for r in rows:
-            dec_body = cipher.decrypt(r[5].encode()).decode(errors="ignore") if r[5] else ""
-            dec_resp = cipher.decrypt(r[6].encode()).decode(errors="ignore") if r[6] else ""
+            dec_body = decrypt_value(cipher, r[5], db_path, r[7], key_id=r[8])
+            dec_resp = decrypt_value(cipher, r[6], db_path, r[7], key_id=r[8])
             rows_for_table.append([r[0], r[1], r[2], r[3], r[4], dec_body[:50], dec_resp[:50]])
     else:
-        rows = conn.execute(
-            "SELECT ts, method, path, user, status FROM ledger ORDER BY ts DESC LIMIT ?",
-            (limit,)
-        ).fetchall()
-        conn.close()
+        rows = ledger_rows(
+            db_path,
+            "SELECT ts, method, path, user, status FROM ledger ORDER BY rowid DESC LIMIT ?",
+            (limit,), newest_first=True, limit=limit
+        )
         
         headers = ["Timestamp", "Method", "Path", "User", "Status"]
         rows_for_table = [[r[0], r[1], r[2], r[3], r[4]] for r in rows]
@@ -274,7 +419,6 @@ def logs(db_path, limit, decrypt):
 @require_auth("search")
 def search(db_path, user, path):
     """Search entries by user or endpoint (all roles)."""
-    conn = sqlite3.connect(db_path)
     q = "SELECT ts, method, path, user, status FROM ledger WHERE 1=1"
     p = []
     if user:
@@ -283,8 +427,7 @@ def search(db_path, user, path):
     if path:
         q += " AND path LIKE ?"
         p.append(f"%{path}%")
-    rows = conn.execute(q + " ORDER BY ts DESC LIMIT 50", p).fetchall()
-    conn.close()
+    rows = ledger_rows(db_path, q + " ORDER BY rowid DESC LIMIT 50", p, newest_first=True, limit=50)
 
     if not rows:
         click.echo(click.style("No matching entries found.", fg="yellow"))
@@ -300,12 +443,44 @@ def search(db_path, user, path):
 @click.argument("db_path")
 @click.option("--format", type=click.Choice(["json", "csv"]), default="json")
 @click.option("--out", default="audit_export.json")
+@click.option("--decrypt", is_flag=True, help="Export decrypted request/response bodies (admin only)")
 @require_auth("export")
-def export(db_path, format, out):
-    """Export all logs to JSON or CSV (verifier, admin)."""
-    conn = sqlite3.connect(db_path)
-    rows = conn.execute("SELECT * FROM ledger").fetchall()
+def export(db_path, format, out, decrypt):
+    """Export all logs to JSON or CSV (verifier, admin; decrypt requires admin)."""
+    if decrypt and not check_permission(get_current_session()["role"], "decrypt"):
+        click.echo(click.style("✗ Decryption requires admin role.", fg="red"))
+        return
+
+    conn = sqlite3.connect(ledger_files(db_path)[0])
     cols = [d[1] for d in conn.execute("PRAGMA table_info(ledger)").fetchall()]
+    conn.close()
+    rows = ledger_rows(db_path, f"SELECT {', '.join(cols)} FROM ledger ORDER BY rowid ASC")
+
+    if decrypt:
+        cipher = load_cipher()
+        compression = cols.index("compression") if "compression" in cols else None
+        key_id = cols.index("key_id") if "key_id" in cols else None
+        payloads = [cols.index("body"), cols.index("response")]
+        rows = [
+            tuple(
+                decrypt_value(cipher, v, db_path, None if compression is None else r[compression],
+                              full=True, key_id=None if key_id is None else r[key_id])
+                if i in payloads else v
+                for i, v in enumerate(r)
+            )
+            for r in rows
+        ]
+
+    # Hashes are BLOBs in schema 2 ledgers; export them as hex, and
+    # envelope-encrypted payloads as base64
+    rows = [
+        tuple(
+            hash_hex(v) if c in ("hash", "prev_hash")
+            else base64.b64encode(v).decode() if isinstance(v, bytes) else v
+            for c, v in zip(cols, r)
+        )
+        for r in rows
+    ]
 
     if format == "json":
         data = [dict(zip(cols, r)) for r in rows]
@@ -316,7 +491,6 @@ def export(db_path, format, out):
             writer = csv.writer(f)
             writer.writerow(cols)
             writer.writerows(rows)
-    conn.close()
     click.echo(click.style(f"✓ Exported {len(rows)} entries to {out}", fg="green"))
 
 
@@ -325,12 +499,12 @@ def export(db_path, format, out):
 @require_auth("stats")
 def stats(db_path):
     """Show ledger statistics (all roles)."""
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
-    total = cur.execute("SELECT COUNT(*) FROM ledger").fetchone()[0]
-    users = cur.execute("SELECT COUNT(DISTINCT user) FROM ledger").fetchone()[0]
-    methods = cur.execute("SELECT method, COUNT(*) FROM ledger GROUP BY method").fetchall()
-    conn.close()
+    total = sum(n for (n,) in ledger_rows(db_path, "SELECT COUNT(*) FROM ledger"))
+    users = len({u for (u,) in ledger_rows(db_path, "SELECT DISTINCT user FROM ledger WHERE user IS NOT NULL")})
+    method_counts = {}
+    for m, c in ledger_rows(db_path, "SELECT method, COUNT(*) FROM ledger GROUP BY method"):
+        method_counts[m] = method_counts.get(m, 0) + c
+    methods = sorted(method_counts.items())
 
     click.echo(click.style("Ledger Statistics:\n", bold=True))
     headers = ["Metric", "Value"]
@@ -348,8 +522,15 @@ def clear(db_path):
     """Clear all log entries (admin only - use for testing only)."""
     conn = sqlite3.connect(db_path)
     conn.execute("DELETE FROM ledger")
+    ensure_head_table(conn)
+    conn.execute("DELETE FROM ledger_head")
+    ensure_payload_table(conn)
+    conn.execute("DELETE FROM payloads")
+    clear_merkle_index(conn)
     conn.commit()
     conn.close()
+    reset_chain_head(db_path)
+    clear_checkpoints(db_path)
     click.echo(click.style("⚠️  Ledger cleared.", fg="red"))
 
 
@@ -360,21 +541,21 @@ def clear(db_path):
 def watch(db_path, interval):
     """Continuously watch new logs in real time (all roles)."""
     click.echo(click.style("Watching for new entries (Ctrl+C to stop)\n", fg="cyan", bold=True))
-    last_count = 0
+    last_seq = 0
     while True:
         try:
-            conn = sqlite3.connect(db_path)
-            cur = conn.cursor()
-            cur.execute("SELECT ts, method, path, user, status FROM ledger ORDER BY ts ASC")
-            rows = cur.fetchall()
-            conn.close()
-
-            if len(rows) > last_count:
-                new_entries = rows[last_count:]
+            # Only rows after the last one shown: a seek on the primary key
+            new_entries = ledger_rows(
+                db_path,
+                "SELECT rowid, ts, method, path, user, status FROM ledger WHERE rowid > ? ORDER BY rowid ASC",
+                (last_seq,)
+            )
+
+            if new_entries:
                 headers = ["Timestamp", "Method", "Path", "User", "Status"]
-                rows_for_table = [[r[0], r[1], r[2], r[3], r[4]] for r in new_entries]
+                rows_for_table = [[r[1], r[2], r[3], r[4], r[5]] for r in new_entries]
                 print_table(rows_for_table, headers)
-                last_count = len(rows)
+                last_seq = new_entries[-1][0]
             time.sleep(interval)
         except KeyboardInterrupt:
             click.echo(click.style("\nStopped watching.", fg="yellow"))
@@ -383,28 +564,22 @@ def watch(db_path, interval):
 
 @cli.command()
 @click.argument("db_path", default="audit_log.db")
+@click.option("--segment-interval", default=None,
+              help=f"Roll over to a new segment file: {', '.join(SEGMENT_INTERVALS)} or seconds")
+@click.option("--segment-rows", default=None, type=int, help="Roll over once a segment holds this many entries")
 @require_auth("init")
-def init(db_path):
+def init(db_path, segment_interval, segment_rows):
     """Initialize a new empty ledger database (admin only)."""
     if os.path.exists(db_path):
         click.echo(click.style("✗ Database already exists.", fg="red"))
         return
-    conn = sqlite3.connect(db_path)
-    conn.execute("""
-    CREATE TABLE IF NOT EXISTS ledger (
-        ts TEXT,
-        method TEXT,
-        path TEXT,
-        user TEXT,
-        status INT,
-        body TEXT,
-        response TEXT,
-        hash TEXT,
-        prev_hash TEXT
-    )
-    """)
-    conn.commit()
-    conn.close()
+    if segment_interval or segment_rows:
+        if segment_interval and segment_interval not in SEGMENT_INTERVALS:
+            segment_interval = float(segment_interval)
+        init_segmented_ledger(db_path, segment_interval, segment_rows)
+        click.echo(click.style(f"✓ Initialized new segmented ledger at {db_path}", fg="green"))
+        return
+    _ensure_db(db_path)
     click.echo(click.style(f"✓ Initialized new ledger at {db_path}", fg="green"))
 
 
@@ -454,14 +629,15 @@ def roles():
 
 @cli.command()
 @click.argument("db_path")
+@click.option("--full", is_flag=True, help="Ignore checkpoints and re-verify every entry")
 @require_auth("verify")
-def verify_enhanced(db_path):
+def verify_enhanced(db_path, full):
     """Verify ledger with enhanced compliance checks (verifier, admin)."""
     try:
         from .ledger import verify_ledger as verify_enhanced_ledger
         
         click.echo(click.style("Running enhanced verification with compliance checks...\n", bold=True))
-        result = verify_enhanced_ledger(db_path, check_signatures=True, check_worm=True)
+        result = verify_enhanced_ledger(db_path, check_signatures=True, check_worm=True, full=full)
         
         if result.get("verified"):
             click.echo(click.style("✓ Ledger verified successfully with all compliance checks!", fg="green"))
@@ -469,6 +645,8 @@ def verify_enhanced(db_path):
             click.echo(click.style("✗ Ledger verification FAILED", fg="red", bold=True))
         
         click.echo(f"\nTotal entries: {result.get('total_entries', 0)}")
+        if "checkpoint_id" in result:
+            click.echo(f"Checked since checkpoint {result['checkpoint_id']}: {result.get('checked_entries', 0)}")
         click.echo(f"Issues found: {result.get('issues', 0)}")
         
         if "signature_failures" in result:
@@ -487,6 +665,177 @@ def verify_enhanced(db_path):
         click.echo("Install with: pip install cryptography")
 
 
+@cli.command()
+@click.argument("db_path")
+@click.option("--size", default=None, type=int, help="Tree size (default: whole ledger)")
+@require_auth("verify")
+def merkle_root(db_path, size):
+    """Show the Merkle root of the ledger (verifier, admin)."""
+    click.echo(json.dumps(get_root(db_path, size), indent=2))
+
+
+@cli.command()
+@click.argument("db_path")
+@click.argument("rowid", type=int)
+@click.option("--size", default=None, type=int, help="Tree size to prove against (default: whole ledger)")
+@require_auth("verify")
+def inclusion_proof(db_path, rowid, size):
+    """Print an inclusion proof for one ledger row (verifier, admin)."""
+    try:
+        proof = merkle_inclusion_proof(db_path, rowid, size)
+    except (LookupError, ValueError) as e:
+        raise click.ClickException(str(e))
+    click.echo(json.dumps(proof, indent=2))
+
+
+@cli.command()
+@click.argument("db_path")
+@click.argument("old_size", type=int)
+@click.option("--new-size", default=None, type=int, help="Newer tree size (default: whole ledger)")
+@require_auth("verify")
+def consistency_proof(db_path, old_size, new_size):
+    """Print a proof that the ledger at OLD_SIZE is a prefix of the current ledger (verifier, admin)."""
+    try:
+        proof = merkle_consistency_proof(db_path, old_size, new_size)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(json.dumps(proof, indent=2))
+
+
+@cli.command()
+@click.argument("db_path")
+@require_auth("verify")
+def locate_tamper(db_path):
+    """Find the first modified, missing or inserted entry (verifier, admin)."""
+    result = locate_ledger_tamper(db_path)
+    if not result["tampered"]:
+        click.echo(click.style(f"✓ All {result['tree_size']} indexed entries are intact.", fg="green"))
+    else:
+        click.echo(click.style(f"✗ First bad entry: row {result['first_bad_rowid']} ({result['reason']})",
+                               fg="red", bold=True))
+        for issue in result["issues"]:
+            click.echo(click.style(f"  - Row {issue['row']}: {issue['reason']}", fg="yellow"))
+    click.echo(f"  {result['range_checks']} range checks, {result['rows_hashed']} rows rehashed")
+    if result["unindexed_entries"]:
+        click.echo(click.style(f"  {result['unindexed_entries']} entries are not in the Merkle index; "
+                               "run 'audittrail verify' to check them.", fg="yellow"))
+
+
+@cli.command()
+@click.argument("db_path")
+@click.option("--batch-size", default=10000, type=int, help="Rows copied per transaction")
+@click.option("--keep-old", is_flag=True, help="Keep the old table as ledger_old")
+@require_auth("admin")
+def migrate(db_path, batch_size, keep_old):
+    """Upgrade a ledger to the current schema while it stays in use (admin only)."""
+    def show_progress(copied, total):
+        click.echo(f"  ... {copied}/{total} rows copied", err=True)
+
+    result = migrate_ledger(db_path, batch_size=batch_size, on_progress=show_progress, keep_old=keep_old)
+    if not result["migrated"]:
+        click.echo(click.style(f"✓ Ledger already at schema {result['schema_version']}.", fg="green"))
+        return
+    if result["resumed_from"]:
+        click.echo(f"  Resumed after row {result['resumed_from']}")
+    click.echo(click.style(f"✓ Migrated {result['rows_copied']} entries to schema {result['schema_version']} "
+                           f"in {result['seconds']:.1f}s.", fg="green"))
+
+
+@cli.command("rotate-key")
+@click.argument("db_path")
+@click.option("--key-id", help="Master key to re-encrypt under (default: AUDITTRAIL_KEY_ID or 'local')")
+@click.option("--create-key", is_flag=True, help="Generate the key in ~/.audittrail_keys/data if it does not exist")
+@click.option("--cipher", type=click.Choice(CIPHERS), help="Payload cipher (default: the current one)")
+@click.option("--out", help="Rotated ledger file (default: <name>.rotated.db)")
+@click.option("--workers", default=0, type=int, help="Worker processes (default: every CPU)")
+@click.option("--chunk-size", default=2000, type=int, help="Rows per worker task and transaction")
+@require_auth("admin")
+def rotate_key(db_path, key_id, create_key, cipher, out, workers, chunk_size):
+    """Re-encrypt a ledger under a new master key into a new file (admin only)."""
+    key_id = key_id or get_keyring().current
+    if create_key and not get_keyring().has_key(key_id):
+        FileKeySource().put_key(key_id, Fernet.generate_key())
+        get_keyring().reload()
+        click.echo(f"  Created key {key_id} in {KEY_DIR}")
+
+    def show_progress(rotated, total):
+        click.echo(f"  ... {rotated}/{total} rows re-encrypted", err=True)
+
+    try:
+        result = rotate_ledger(db_path, out_path=out, key_id=key_id, cipher=cipher,
+                               workers=workers or None, chunk_size=chunk_size, on_progress=show_progress)
+    except (RuntimeError, ValueError) as e:
+        raise click.ClickException(str(e))
+    record = result["record"]
+    if not result["rotated"]:
+        click.echo(click.style(f"✓ Already rotated to key {record['key_id']}: {result['path']}", fg="green"))
+        return
+    if result["resumed_from"]:
+        click.echo(f"  Resumed after row {result['resumed_from']}")
+    click.echo(click.style(f"✓ Re-encrypted {record['entries']} entries under key {record['key_id']} "
+                           f"({record['cipher']}) in {result['seconds']:.1f}s.", fg="green"))
+    click.echo(f"  Old head: seq {record['old_seq']}  {record['old_hash'][:16]}…")
+    click.echo(f"  New head: seq {record['new_seq']}  {record['new_hash'][:16]}…")
+    click.echo(f"  Stop writers, then replace {db_path} with {result['path']} "
+               f"and set AUDITTRAIL_KEY_ID={record['key_id']}.")
+
+
+@cli.command()
+@click.argument("db_path")
+@click.option("--force", is_flag=True, help="Write an anchor even if no shard moved")
+@require_auth("admin")
+def anchor(db_path, force):
+    """Anchor the heads of every shard into the root chain (admin only)."""
+    result = anchor_shards(db_path, force=force)
+    if result is None:
+        click.echo(click.style("✓ No shard moved since the last anchor.", fg="green"))
+        return
+    click.echo(click.style(f"✓ Anchor {result['seq']} covers {len(result['heads'])} shards.", fg="green"))
+    for shard, head in sorted(result["heads"].items()):
+        click.echo(f"  {shard}: seq {head['seq']}  {head['hash'][:16]}…")
+
+
+@cli.command()
+@click.argument("db_path")
+@require_auth("admin")
+def rotate(db_path):
+    """Seal the active segment and start a new one (admin only)."""
+    require_segment_root(db_path)
+    rotate_segment(db_path, force=True)
+    segments = list_segments(db_path)
+    sealed = segments[-2]["manifest"]
+    click.echo(click.style(f"✓ Sealed segment {sealed['segment']} ({sealed['entries']} entries, "
+                           f"seq {sealed['first_seq']}-{sealed['last_seq']}).", fg="green"))
+    click.echo(f"  Active segment: {os.path.basename(segments[-1]['path'])}")
+
+
+@cli.command()
+@click.argument("db_path")
+@require_auth("admin")
+def segments(db_path):
+    """List the segments of a segmented ledger (admin only)."""
+    require_segment_root(db_path)
+    rows = []
+    for segment in list_segments(db_path):
+        manifest = segment["manifest"]
+        rows.append([
+            segment["id"], os.path.basename(segment["path"]), segment["opened_at"],
+            segment["sealed_at"] or "active",
+            f"{manifest['first_seq']}-{manifest['last_seq']}" if manifest and manifest["entries"] else "",
+            manifest["entries"] if manifest else "",
+        ])
+    print_table(rows, ["Segment", "File", "Opened", "Sealed", "Seq", "Entries"])
+
+
+@cli.command()
+@click.argument("db_path")
+@require_auth("admin")
+def rebuild_merkle(db_path):
+    """Rebuild the Merkle index from the ledger (admin only)."""
+    size = rebuild_merkle_index(db_path)
+    click.echo(click.style(f"✓ Merkle index rebuilt over {size} entries.", fg="green"))
+
+
 @cli.command()
 @click.argument("db_path")
 @require_auth("admin")
@@ -531,8 +880,10 @@ def enable_worm(db_path):
 
 
 @cli.command()
+@click.option("--algorithm", type=click.Choice(["RSA", "Ed25519", "ECDSA-P256"]), default="RSA",
+              help="Signing algorithm (Ed25519 is much faster for high-volume ledgers)")
 @require_auth("admin")
-def init_signing():
+def init_signing(algorithm):
     """Initialize digital signature keys (admin only)."""
     try:
         from .signatures import initialize_signing_keys, get_key_metadata
@@ -543,13 +894,15 @@ def init_signing():
             click.echo(f"Created: {meta['created_at']}")
             click.echo(f"Key size: {meta['key_size']} bits")
             click.echo(f"Algorithm: {meta['algorithm']}")
+            if meta.get("key_id"):
+                click.echo(f"Key ID: {meta['key_id']}")
         else:
             password = click.prompt("Enter password to encrypt private key (or leave empty)", 
                                    hide_input=True, default="", show_default=False)
             if password == "":
                 password = None
             
-            initialize_signing_keys(password=password, key_size=2048)
+            initialize_signing_keys(password=password, key_size=2048, algorithm=algorithm)
             click.echo(click.style("✓ Signing keys initialized successfully.", fg="green"))
             click.echo("Keys stored in: ~/.audittrail_keys/")
     
@@ -644,6 +997,7 @@ def compliance_status():
         key_meta = get_key_metadata()
         if key_meta:
             click.echo(click.style("✓ Digital Signatures: ENABLED", fg="green"))
+            click.echo(f"  Algorithm: {key_meta.get('algorithm', 'RSA')}")
             click.echo(f"  Key size: {key_meta['key_size']} bits")
             click.echo(f"  Created: {key_meta['created_at']}")
         else:
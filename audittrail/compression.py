@@ -0,0 +1,104 @@
+"""
+Compression of payloads before encryption.
+
+JSON bodies compress 5-10x, but ciphertext does not compress at all, so
+payloads have to be compressed before they are encrypted. When enabled,
+the body and response of a row are compressed together once their
+combined size reaches the threshold, and the codec is recorded in the
+row's ``compression`` column (NULL when stored as is). Rows whose
+payloads do not shrink are stored uncompressed.
+
+Codecs are "zlib" and "lzma" from the standard library; others (zstd,
+brotli, ...) can be added with :func:`register_codec`. Spooled blob
+files are never compressed.
+
+Usage:
+    set_compression("zlib", threshold=256)
+    codec, (body, response) = compress_payloads([body, response])
+    body = decompress_payload(codec, body)
+"""
+
+import lzma
+import os
+import zlib
+from typing import Callable, List, Optional, Tuple
+
+
+# Codec name -> (compress, decompress)
+CODECS = {
+    "zlib": (lambda data: zlib.compress(data, 6), zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+
+# Codec for new rows (None: no compression) and the combined payload size
+# below which rows are stored as is
+DEFAULT_COMPRESSION = os.getenv("AUDITTRAIL_COMPRESSION") or None
+COMPRESS_THRESHOLD = int(os.getenv("AUDITTRAIL_COMPRESS_THRESHOLD", "256"))
+
+_compression = DEFAULT_COMPRESSION
+_threshold = COMPRESS_THRESHOLD
+
+
+def register_codec(name: str, compress: Callable[[bytes], bytes], decompress: Callable[[bytes], bytes]):
+    """
+    Add a compression codec.
+
+    Example:
+        import zstandard
+        register_codec("zstd", zstandard.ZstdCompressor().compress,
+                       zstandard.ZstdDecompressor().decompress)
+    """
+    CODECS[name] = (compress, decompress)
+
+
+def set_compression(codec: Optional[str], threshold: Optional[int] = None):
+    """
+    Set the codec for new rows.
+
+    Args:
+        codec: Name from :data:`CODECS`, or None to store payloads as is
+        threshold: Minimum combined body/response size in bytes to compress
+            (default: unchanged, initially 256)
+    """
+    global _compression, _threshold
+    if codec is not None and codec not in CODECS:
+        raise ValueError(f"compression must be one of {sorted(CODECS)} or None, got {codec!r}")
+    _compression = codec
+    if threshold is not None:
+        _threshold = threshold
+
+
+def compress_payloads(payloads: List[Optional[bytes]]) -> Tuple[Optional[str], List[Optional[bytes]]]:
+    """
+    Compress a row's plaintext payloads with the current codec.
+
+    None items (payloads spooled to blob files) are passed through.
+
+    Returns:
+        Tuple of (codec or None, payloads)
+    """
+    if _compression is None:
+        return None, payloads
+    size = sum(len(payload) for payload in payloads if payload is not None)
+    if size < _threshold:
+        return None, payloads
+
+    compress = _codec(_compression)[0]
+    compressed = [None if payload is None else compress(payload) for payload in payloads]
+    if sum(len(payload) for payload in compressed if payload is not None) >= size:
+        # Already compressed data (images, archives): keep it as is
+        return None, payloads
+    return _compression, compressed
+
+
+def decompress_payload(codec: Optional[str], data: bytes) -> bytes:
+    """Undo :func:`compress_payloads` for one decrypted payload."""
+    if not codec:
+        return data
+    return _codec(codec)[1](data)
+
+
+def _codec(name):
+    if name not in CODECS:
+        raise ValueError(f"Unknown compression codec {name!r}; register it with register_codec()")
+    return CODECS[name]
@@ -1,25 +1,241 @@
-from dataclasses import dataclass
-from typing import Protocol, Dict
-from cryptography.fernet import Fernet
+"""
+Master keys by key id.
+
+Every ledger row records the ``key_id`` of the master key it was written
+with. A :class:`Keyring` loads master keys from a :class:`KeySource` and
+caches the ciphers built from them by key id, so a ledger written under
+several keys (after a rotation) decrypts row by row with the right key
+and without constructing a cipher per row:
+
+- ``fernet(key_id)`` for Fernet tokens, with ``multi_fernet()`` (every
+  known key, current first) for tokens whose key id is unknown;
+- ``envelope(key_id)`` for unwrapping data keys (see ``cipher.py``).
+
+The current key, used for new rows, is ``AUDITTRAIL_KEY_ID`` (default
+"local"). Keys come from ``AUDITTRAIL_KEY_<key_id>`` environment
+variables, then ``~/.audittrail.key`` (key "local") and
+``~/.audittrail_keys/data/<key_id>.key``. A key id with no key of its own
+is only a label, as before the keyring: its rows use the local key.
+"""
+
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Protocol, Dict, List, Optional
+from cryptography.fernet import Fernet, MultiFernet
+
+KEY_PATH = os.path.expanduser("~/.audittrail.key")
+KEY_DIR = os.path.expanduser("~/.audittrail_keys/data")
+LOCAL_KEY_ID = "local"
+
 
 class KeySource(Protocol):
     def get_key(self, key_id: str) -> bytes: ...
 
+
 @dataclass
 class EnvKeySource:
     env: Dict[str, str]
+    prefix: str = "AUDITTRAIL_KEY_"
+
     def get_key(self, key_id: str) -> bytes:
-        k = self.env.get(f"AUDITTRAIL_KEY_{key_id}")
+        k = self.env.get(f"{self.prefix}{key_id}")
         if not k:
             raise RuntimeError(f"Missing key for {key_id}")
         return k.encode()
 
+    def key_ids(self) -> List[str]:
+        # AUDITTRAIL_KEY_ID names the current key; it is not a key
+        return [name[len(self.prefix):] for name, value in self.env.items()
+                if name.startswith(self.prefix) and name != "AUDITTRAIL_KEY_ID" and value]
+
+
+@dataclass
+class FileKeySource:
+    """Keys stored as files: ``key_path`` for "local", ``<key_dir>/<key_id>.key`` for the rest."""
+    key_path: str = KEY_PATH
+    key_dir: str = KEY_DIR
+
+    def _path(self, key_id: str) -> str:
+        if key_id == LOCAL_KEY_ID:
+            return self.key_path
+        return os.path.join(self.key_dir, f"{key_id}.key")
+
+    def get_key(self, key_id: str) -> bytes:
+        path = self._path(key_id)
+        if key_id == LOCAL_KEY_ID and not os.path.exists(path):
+            # preserves your ~/.audittrail.key for dev
+            with open(path, "wb") as f:
+                f.write(Fernet.generate_key())
+        if not os.path.exists(path):
+            raise RuntimeError(f"Missing key for {key_id}")
+        with open(path, "rb") as f:
+            return f.read().strip()
+
+    def put_key(self, key_id: str, key: bytes):
+        """Store a new key file (readable by the owner only)."""
+        path = self._path(key_id)
+        Path(os.path.dirname(path)).mkdir(mode=0o700, parents=True, exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(key)
+
+    def key_ids(self) -> List[str]:
+        ids = [LOCAL_KEY_ID] if os.path.exists(self.key_path) else []
+        if os.path.isdir(self.key_dir):
+            ids += sorted(name[:-4] for name in os.listdir(self.key_dir) if name.endswith(".key"))
+        return ids
+
+
+@dataclass
+class ChainKeySource:
+    """Try several sources in order."""
+    sources: List[KeySource] = field(default_factory=list)
+
+    def get_key(self, key_id: str) -> bytes:
+        for source in self.sources:
+            try:
+                return source.get_key(key_id)
+            except RuntimeError:
+                continue
+        raise RuntimeError(f"Missing key for {key_id}")
+
+    def key_ids(self) -> List[str]:
+        ids = []
+        for source in self.sources:
+            for key_id in getattr(source, "key_ids", list)():
+                if key_id not in ids:
+                    ids.append(key_id)
+        return ids
+
+
 # default fallbacks (dev)
-def default_key_source():
-    # preserves your ~/.audittrail.key for dev
-    # but runs through the same interface
-    from pathlib import Path, PurePosixPath
-    p = Path(PurePosixPath("~/.audittrail.key").expanduser())
-    if not p.exists():
-        p.write_bytes(Fernet.generate_key())
-    return lambda _key_id="local": p.read_bytes()
+def default_key_source() -> KeySource:
+    # environment first, then ~/.audittrail.key and ~/.audittrail_keys/data/
+    return ChainKeySource([EnvKeySource(os.environ), FileKeySource()])
+
+
+def current_key_id() -> str:
+    """Id of the master key new rows are written with."""
+    return os.getenv("AUDITTRAIL_KEY_ID", LOCAL_KEY_ID)
+
+
+class Keyring:
+    """
+    Master keys and the ciphers built from them, cached by key id.
+
+    Args:
+        source: Where keys come from (default: :func:`default_key_source`)
+        current: Key id for new rows (default: ``AUDITTRAIL_KEY_ID`` or "local")
+
+    Example:
+        keyring = Keyring(EnvKeySource(os.environ), current="2025-q4")
+        keyring.fernet(row_key_id).decrypt(token)
+    """
+
+    def __init__(self, source: Optional[KeySource] = None, current: Optional[str] = None):
+        self.source = source or default_key_source()
+        self.current = current or current_key_id()
+        self._lock = threading.Lock()
+        self._keys = {}
+        self._fernets = {}
+        self._envelopes = {}
+        self._multi = None
+
+    def key(self, key_id: Optional[str] = None) -> bytes:
+        """Master key by id (default: the current key); the local key for an id with no key of its own."""
+        key_id = key_id or self.current
+        key = self._keys.get(key_id)
+        if key is None:
+            with self._lock:
+                try:
+                    key = self.source.get_key(key_id)
+                except RuntimeError:
+                    if key_id == LOCAL_KEY_ID:
+                        raise
+                    key = self.source.get_key(LOCAL_KEY_ID)
+                self._keys[key_id] = key
+        return key
+
+    def has_key(self, key_id: str) -> bool:
+        """Whether the source holds a key for ``key_id`` (rather than it being a label)."""
+        try:
+            self.source.get_key(key_id)
+        except RuntimeError:
+            return False
+        return True
+
+    def key_ids(self) -> List[str]:
+        """Known key ids, current first."""
+        listed = getattr(self.source, "key_ids", list)()
+        return list(dict.fromkeys([self.current] + listed + list(self._keys)))
+
+    def fernet(self, key_id: Optional[str] = None) -> Fernet:
+        """Cached Fernet for a key id (default: the current key)."""
+        key_id = key_id or self.current
+        fernet = self._fernets.get(key_id)
+        if fernet is None:
+            fernet = self._fernets.setdefault(key_id, Fernet(self.key(key_id)))
+        return fernet
+
+    def multi_fernet(self) -> MultiFernet:
+        """Every known key, current first, for tokens whose key id is unknown."""
+        if self._multi is None:
+            fernets = []
+            for key_id in dict.fromkeys(self.key_ids()):
+                try:
+                    fernets.append(self.fernet(key_id))
+                except (RuntimeError, ValueError):
+                    # missing, or not a Fernet key (e.g. an unrelated AUDITTRAIL_KEY_* variable)
+                    continue
+            self._multi = MultiFernet(fernets)
+        return self._multi
+
+    def decrypt_fernet(self, token, key_id: Optional[str] = None) -> bytes:
+        """Decrypt a Fernet token with its row's key, falling back to every known key."""
+        token = token.encode() if isinstance(token, str) else token
+        if key_id:
+            try:
+                return self.fernet(key_id).decrypt(token)
+            except Exception:
+                pass
+        return self.multi_fernet().decrypt(token)
+
+    def envelope(self, key_id: Optional[str] = None, algorithm: str = "aes-256-gcm"):
+        """Cached envelope cipher (see ``cipher.EnvelopeCipher``) for a master key."""
+        from .cipher import EnvelopeCipher
+
+        key_id = key_id or self.current
+        cache_key = (key_id, algorithm)
+        cipher = self._envelopes.get(cache_key)
+        if cipher is None:
+            cipher = self._envelopes.setdefault(
+                cache_key, EnvelopeCipher(algorithm, master_key=self.key(key_id), key_id=key_id)
+            )
+        return cipher
+
+    def reload(self):
+        """Forget cached keys and ciphers, e.g. after adding a key."""
+        with self._lock:
+            self._keys.clear()
+            self._fernets.clear()
+            self._envelopes.clear()
+            self._multi = None
+
+
+_keyring = None
+
+
+def get_keyring() -> Keyring:
+    """The process-wide keyring."""
+    global _keyring
+    if _keyring is None:
+        _keyring = Keyring()
+    return _keyring
+
+
+def set_keyring(keyring: Keyring):
+    """Replace the process-wide keyring (e.g. with one backed by a KMS key source)."""
+    global _keyring
+    _keyring = keyring
@@ -0,0 +1,70 @@
+"""
+Signed key rotation records.
+
+A ledger rotated to a new master key (see ``rotation.py``) carries a
+signed record linking the head of the chain it replaced to its own, in
+its ``key_rotations`` table, after the records of earlier rotations.
+``verify_ledger`` checks them with :func:`check_rotation_records`.
+"""
+
+import json
+import sqlite3
+from typing import Any, Dict, List
+
+from .chain import chain_base, hash_hex
+from .store import connection
+
+# Import compliance modules (optional)
+try:
+    from .signatures import verify_signature
+    COMPLIANCE_AVAILABLE = True
+except ImportError:
+    COMPLIANCE_AVAILABLE = False
+
+
+def record_message(record: Dict[str, Any]) -> str:
+    """The signed part of a rotation record: everything but its signature."""
+    return json.dumps({k: v for k, v in record.items() if k != "signature"}, sort_keys=True)
+
+
+def rotation_records(db_path: str) -> List[Dict[str, Any]]:
+    """The rotation records of a ledger, oldest first (empty if it was never rotated)."""
+    try:
+        rows = connection(db_path).execute("SELECT record FROM key_rotations ORDER BY id").fetchall()
+    except sqlite3.OperationalError:
+        return []
+    return [json.loads(record) for (record,) in rows]
+
+
+def check_rotation_records(db_path: str, check_signatures: bool = True) -> List[Dict[str, Any]]:
+    """
+    Check a rotated ledger's latest rotation record.
+
+    The record must be signed and the row it names must still carry the
+    new chain hash. Earlier records describe rotations of the files this
+    one was rotated from, and only their signatures are checked.
+
+    Returns:
+        Issue dictionaries (row, reason, path), empty if the records check out
+    """
+    issues = []
+    records = rotation_records(db_path)
+    for i, record in enumerate(records):
+        if check_signatures and COMPLIANCE_AVAILABLE:
+            try:
+                signed = verify_signature(record_message(record), record["signature"])
+            except Exception:
+                signed = False
+            if not signed:
+                issues.append({"row": record["new_seq"], "path": None,
+                               "reason": f"Key rotation record {i + 1} signature verification failed"})
+    if records:
+        latest = records[-1]
+        row = connection(db_path).execute(
+            "SELECT hash FROM ledger WHERE rowid = ?", (latest["new_seq"],)
+        ).fetchone()
+        expected = hash_hex(row[0]) if row else chain_base(connection(db_path))[1]
+        if expected != latest["new_hash"]:
+            issues.append({"row": latest["new_seq"], "path": None,
+                           "reason": "Key rotation record does not match the ledger"})
+    return issues
@@ -9,74 +9,168 @@ Ledger module with optional compliance features:
 import hashlib
 import json
 import os
-import sqlite3
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timezone
-from cryptography.fernet import Fernet
 from typing import Optional, Dict, Any
 
+from .store import connection, cursor, ensure_schema, write_cursor
+from .chain import (
+    advance_chain_head, chain_base, chain_lock, ensure_head_table, get_chain_head, hash_blob, hash_hex,
+    set_cached_head
+)
+from .merkle_index import ensure_merkle_tables, extend_merkle_index
+from .blobstore import default_blob_dir, is_blob_ref, verify_blob
+from .cipher import encrypt_payload, ensure_data_key_table, get_cipher, legacy_cipher, store_data_keys
+from .compression import compress_payloads
+from .key_rotations import check_rotation_records
+from .payloads import ensure_payload_table, is_payload_ref, payload_id, store_payload, verify_payload_ref
+from .shards import is_shard_root, verify_shards
+from .segments import is_sealed_segment, is_segment_root, on_active_segment, verify_segments
+
 # Import compliance modules (optional)
 try:
-    from .signatures import sign_entry, verify_entry_signature, initialize_signing_keys
-    from .timestamp import create_local_timestamp, get_timestamp
-    from .worm import protect_entry, verify_entry_integrity
+    from .signatures import (
+        sign_entry, sign_entry_batch, verify_entry_signature, initialize_signing_keys, get_signer
+    )
+    from .timestamp import create_local_timestamp, create_local_timestamps, get_timestamp
+    from .worm import protect_entries, protect_entry, verify_entry_integrity
     from .anomaly import record_anomaly
+    from .checkpoint import create_checkpoint, latest_trusted_checkpoint
     COMPLIANCE_AVAILABLE = True
 except ImportError:
     COMPLIANCE_AVAILABLE = False
 
-# --- must match middleware ---
-KEY_PATH = os.path.expanduser("~/.audittrail.key")
-if not os.path.exists(KEY_PATH):
-    with open(KEY_PATH, "wb") as f:
-        f.write(Fernet.generate_key())
-with open(KEY_PATH, "rb") as f:
-    CIPHER = Fernet(f.read())
-key_id = os.getenv("AUDITTRAIL_KEY_ID", "local")
+def __getattr__(name):
+    # Fernet cipher of the master key, for payloads written before envelope
+    # encryption; built on first use so that importing needs no key
+    if name == "CIPHER":
+        return legacy_cipher().fernet
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
-def _ensure_db(db):
-    """Ensure database exists with schema supporting compliance features."""
-    conn = sqlite3.connect(db)
-    conn.execute("""
-    CREATE TABLE IF NOT EXISTS ledger (
+# Ledger table layout, recorded in PRAGMA user_version. Schema 2 adds the
+# integer seq key, BLOB hashes and the ts/user/path indexes; schema 1
+# ledgers are upgraded with ``audittrail migrate`` (see migrate.py).
+LEDGER_SCHEMA_VERSION = 2
+
+
+def _create_ledger_table(conn, table="ledger"):
+    """Create a schema 2 ledger table (and its indexes) named ``table``."""
+    # seq aliases the rowid, so rowid-ordered reads are primary-key scans;
+    # AUTOINCREMENT keeps it from ever being reused. body/response come
+    # last: reading the columns before them never has to walk a large
+    # payload's overflow pages.
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {table} (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
         ts TEXT,
         method TEXT,
         path TEXT,
         user TEXT,
         status INT,
-        body TEXT,
-        response TEXT,
-        hash TEXT,
-        prev_hash TEXT,
+        hash BLOB,
+        prev_hash BLOB,
         key_id TEXT DEFAULT 'local',
         signature TEXT,
         timestamp_token TEXT,
-        worm_protected INTEGER DEFAULT 0
+        worm_protected INTEGER DEFAULT 0,
+        format_version INTEGER DEFAULT 1,
+        body_digest TEXT,
+        response_digest TEXT,
+        compression TEXT,
+        body TEXT,
+        response TEXT
     )
     """)
-    conn.commit()
-    conn.close()
+    conn.execute(f"CREATE INDEX IF NOT EXISTS ledger_ts ON {table} (ts)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS ledger_user ON {table} (user)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS ledger_path ON {table} (path)")
+
+
+def ledger_schema_version(conn) -> int:
+    """Schema version of the ledger in this database (0 or 1 before versioning)."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _create_ledger_schema(conn):
+    if is_shard_root(conn) or is_segment_root(conn):
+        # A root only holds the registry; entries live in its shard/segment files
+        return
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ledger'"
+    ).fetchone()
+    if exists:
+        # Older ledgers keep their layout until migrated
+        _add_missing_columns(conn)
+    else:
+        _create_ledger_table(conn)
+        conn.execute(f"PRAGMA user_version = {LEDGER_SCHEMA_VERSION}")
+    ensure_head_table(conn)
+    ensure_merkle_tables(conn)
+    ensure_data_key_table(conn)
+    ensure_payload_table(conn)
+
+
+# Columns added after the first release, with their definitions
+_ADDED_COLUMNS = (
+    ("key_id", "TEXT DEFAULT 'local'"),
+    ("signature", "TEXT"),
+    ("timestamp_token", "TEXT"),
+    ("worm_protected", "INTEGER DEFAULT 0"),
+    ("format_version", "INTEGER DEFAULT 1"),
+    ("body_digest", "TEXT"),
+    ("response_digest", "TEXT"),
+    ("compression", "TEXT"),
+)
+
+
+def _ledger_columns(conn):
+    return [col[1] for col in conn.execute("PRAGMA table_info(ledger)").fetchall()]
 
 
-def _encrypt_body(value) -> str:
+def _add_missing_columns(conn):
+    """Bring a ledger table created by an older release up to the current columns."""
+    columns = _ledger_columns(conn)
+    for name, definition in _ADDED_COLUMNS:
+        if name not in columns:
+            conn.execute(f"ALTER TABLE ledger ADD COLUMN {name} {definition}")
+
+
+def _ensure_db(db):
+    """Ensure database exists with schema supporting compliance features."""
+    ensure_schema(db, _create_ledger_schema)
+
+
+def _blob_hashes(conn) -> bool:
+    """Whether this ledger stores chain hashes as BLOBs (schema 2)."""
+    return ledger_schema_version(conn) >= 2
+
+
+def _storage_row(row, blob_hashes):
+    """An ``INSERT_SQL`` row with hash and prev_hash in the ledger's storage form."""
+    if not blob_hashes:
+        return row
+    return row[:7] + (hash_blob(row[7]), hash_blob(row[8])) + row[9:]
+
+
+def _payload_bytes(value) -> bytes:
     """
-    Accepts dict/str/bytes/None and returns base64-url string (Fernet token, decoded).
+    Accepts dict/str/bytes/None and returns the plaintext to store.
     Matches middleware behavior:
       - request body is JSON-dumped with sort_keys=True (when parseable) before encrypt
       - response is raw bytes encrypted
     """
     if value is None:
-        s = ""
-        return CIPHER.encrypt(s.encode()).decode()
+        return b""
 
     # If already bytes, encrypt directly (like response in middleware)
     if isinstance(value, (bytes, bytearray)):
-        return CIPHER.encrypt(bytes(value)).decode()
+        return bytes(value)
 
     # If it's JSON-like, normalize deterministically
     if isinstance(value, (dict, list)):
-        s = json.dumps(value, sort_keys=True)
-        return CIPHER.encrypt(s.encode()).decode()
+        return json.dumps(value, sort_keys=True).encode()
 
     # Try to interpret string as JSON; if that fails, encrypt the raw string
     if isinstance(value, str):
@@ -85,11 +179,36 @@ def _encrypt_body(value) -> str:
             s = json.dumps(parsed, sort_keys=True)
         except Exception:
             s = value
-        return CIPHER.encrypt(s.encode()).decode()
+        return s.encode()
 
     # Fallback: stringify then encrypt
-    s = str(value)
-    return CIPHER.encrypt(s.encode()).decode()
+    return str(value).encode()
+
+
+def _encrypt_body(value):
+    """
+    Encrypt one payload (see ``_payload_bytes``) without compression.
+
+    Returns an envelope BLOB, or a Fernet token string with ``AUDITTRAIL_CIPHER=fernet``.
+    """
+    return encrypt_payload(_payload_bytes(value))
+
+
+def _encrypt_payloads(entry):
+    """
+    Compress (if enabled) and encrypt an entry's body and response.
+
+    Returns:
+        Tuple of (key id, compression codec or None, payloads), where the
+        key id is the master key's (the row's ``key_id``) and payloads holds
+        an (encrypted value, content id) pair for the body and the response;
+        see ``payloads.store_payload``
+    """
+    cipher = get_cipher()
+    compression, payloads = compress_payloads([
+        _payload_bytes(entry.get("body", "")), _payload_bytes(entry.get("response", ""))
+    ])
+    return cipher.key_id, compression, [(cipher.encrypt(data), payload_id(data, compression)) for data in payloads]
 
 
 def _compute_hash_string(ts, method, path, user, status, enc_body, enc_resp, prev_hash, key_id) -> str:
@@ -97,6 +216,167 @@ def _compute_hash_string(ts, method, path, user, status, enc_body, enc_resp, pre
     return hashlib.sha256(entry_str.encode()).hexdigest()
 
 
+# Row format written by this release. Format 1 rows chain over the encrypted
+# body/response themselves; format 2 rows chain over their SHA-256 digests,
+# so the chain can be verified without reading payloads.
+FORMAT_VERSION = 2
+
+
+def payload_digest(value) -> str:
+    """SHA-256 (hex) of a stored body/response: the envelope BLOB, Fernet token or blob reference."""
+    if value is None:
+        value = ""
+    return hashlib.sha256(value.encode() if isinstance(value, str) else value).hexdigest()
+
+
+def _compute_digest_hash_string(ts, method, path, user, status, body_digest, response_digest,
+                                prev_hash, key_id) -> str:
+    # The version marker keeps a format 1 row from being relabelled as format 2
+    entry_str = (
+        f"v2|{ts}|{method}|{path}|{user}|{status}|{body_digest}|{response_digest}|{prev_hash}|{key_id}"
+    )
+    return hashlib.sha256(entry_str.encode()).hexdigest()
+
+
+def _hash_entry(ts, method, path, user, status, enc_body, enc_resp, prev_hash, key_id):
+    """
+    Chain a new (format 2) entry.
+
+    Returns:
+        Tuple of (entry_hash, body_digest, response_digest)
+    """
+    body_digest = payload_digest(enc_body)
+    response_digest = payload_digest(enc_resp)
+    entry_hash = _compute_digest_hash_string(
+        ts, method, path, user, status, body_digest, response_digest, prev_hash, key_id
+    )
+    return entry_hash, body_digest, response_digest
+
+
+def _recompute_hash(ts, method, path, user, status, body, response, prev_hash, key_id,
+                    format_version, body_digest, response_digest) -> str:
+    """Recompute a stored row's chain hash according to its format."""
+    if format_version is not None and format_version >= 2:
+        return _compute_digest_hash_string(
+            ts, method, path, user, status, body_digest, response_digest, prev_hash, key_id
+        )
+    return _compute_hash_string(ts, method, path, user, status, body, response, prev_hash, key_id)
+
+
+INSERT_SQL = (
+    "INSERT INTO ledger (ts, method, path, user, status, body, response, hash, prev_hash, key_id, "
+    "signature, timestamp_token, worm_protected, format_version, body_digest, response_digest, "
+    "compression) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def _signature_data(ts, method, path, user, status, entry_hash, prev_hash):
+    """Fields covered by an entry's digital signature."""
+    return {
+        "ts": ts,
+        "method": method,
+        "path": path,
+        "user": user,
+        "status": status,
+        "hash": entry_hash,
+        "prev_hash": prev_hash
+    }
+
+
+def _seal_compliance(db, ts, method, path, user, status, entry_hash, prev_hash,
+                     timestamp_metadata=None, enable_compliance=True, signer=None, sign=True,
+                     timestamp=True):
+    """
+    Sign and timestamp a chained entry.
+
+    Shared by add_entry, the middleware and the background writer so every
+    write path produces identical compliance columns. ``signer`` defaults to
+    the process-wide Signer so the private key is parsed once, not per entry.
+    With ``sign=False`` the signature is left to the caller (batch signing);
+    with ``timestamp=False`` the timestamp is (see ``_timestamp_batch``).
+
+    Returns:
+        Tuple of (signature, timestamp_token, worm_protected)
+    """
+    signature = None
+    timestamp_token = None
+    worm_protected = 0
+
+    if not (enable_compliance and COMPLIANCE_AVAILABLE):
+        return signature, timestamp_token, worm_protected
+
+    # Initialize signing keys if they don't exist
+    try:
+        initialize_signing_keys()
+    except Exception:
+        pass
+
+    # Create digital signature
+    if sign:
+        try:
+            signature_data = _signature_data(ts, method, path, user, status, entry_hash, prev_hash)
+            signature = sign_entry(signature_data, signer or get_signer())
+        except Exception as e:
+            # Log signature failure
+            record_anomaly("signature_error", "high",
+                           f"Failed to sign entry: {str(e)}", db)
+
+    # Create timestamp
+    if timestamp:
+        try:
+            ts_info = create_local_timestamp(entry_hash, timestamp_metadata)
+            timestamp_token = ts_info["token"]
+        except Exception:
+            pass
+
+    # Mark for WORM protection
+    worm_protected = 1
+
+    return signature, timestamp_token, worm_protected
+
+
+def _sign_batch(db, rows, signer=None):
+    """
+    Sign chained rows (``INSERT_SQL`` order) with one Merkle-root signature.
+
+    Returns:
+        List of signatures, one per row (all None if signing failed)
+    """
+    try:
+        return sign_entry_batch(
+            [_signature_data(*row[:5], row[7], row[8]) for row in rows],
+            signer or get_signer()
+        )
+    except Exception as e:
+        record_anomaly("signature_error", "high",
+                       f"Failed to sign batch of {len(rows)} entries: {str(e)}", db)
+        return [None] * len(rows)
+
+
+def _timestamp_batch(rows, metadata):
+    """
+    Timestamp chained rows (``INSERT_SQL`` order) in one transaction.
+
+    Returns:
+        List of timestamp tokens, one per row (all None if timestamping failed)
+    """
+    try:
+        infos = create_local_timestamps(zip((row[7] for row in rows), metadata))
+    except Exception:
+        return [None] * len(rows)
+    return [info["token"] for info in infos]
+
+
+def _protect_batch(db, rows, row_ids):
+    """Apply WORM protection to committed rows (``INSERT_SQL`` order) in one transaction."""
+    try:
+        protect_entries(db, [
+            (row[7], row_id, {"ts": row[0]}) for row, row_id in zip(rows, row_ids) if row[12]
+        ])
+    except Exception:
+        pass
+
+
 def add_entry(db, entry, enable_compliance=True):
     """
     Add entry with optional compliance features.
@@ -119,100 +399,74 @@ def add_entry(db, entry, enable_compliance=True):
             "response": {"success": True}
         })
     """
-    _ensure_db(db)
+    # A segmented root appends to its active segment
+    return on_active_segment(db, lambda path: _add_entry(path, entry, enable_compliance))
 
-    conn = sqlite3.connect(db)
-    cur = conn.cursor()
-
-    # Get previous hash (latest by timestamp, same as middleware)
-    cur.execute("SELECT hash FROM ledger ORDER BY ts DESC LIMIT 1")
-    prev = cur.fetchone()
-    prev_hash = prev[0] if prev else ""
-
-    ts = datetime.now(timezone.utc).isoformat()
-
-    # Encrypt body/response BEFORE hashing, mirroring middleware
-    enc_body = _encrypt_body(entry.get("body", ""))
-    # Response might be bytes in your app; we accept either
-    enc_resp = _encrypt_body(entry.get("response", ""))
-
-    # Compute hash on the exact same string the middleware uses
-    entry_hash = _compute_hash_string(
-        ts,
-        entry["method"],
-        entry["path"],
-        entry["user"],
-        int(entry["status"]),
-        enc_body,
-        enc_resp,
-        prev_hash,
-        key_id
-    )
 
-    # Initialize compliance features if needed
-    signature = None
-    timestamp_token = None
-    worm_protected = 0
+def _add_entry(db, entry, enable_compliance):
+    with chain_lock(db):
+        # The write lock is held from reading the head to the commit, so
+        # writers in other processes cannot chain onto the same entry
+        with write_cursor(db, _create_ledger_schema) as cur:
+            # Get previous hash from the chain head (O(1), no sort over the ledger)
+            prev_seq, prev_hash = get_chain_head(cur.connection, db)
 
-    if enable_compliance and COMPLIANCE_AVAILABLE:
-        # Initialize signing keys if they don't exist
-        try:
-            initialize_signing_keys()
-        except Exception:
-            pass
+            ts = datetime.now(timezone.utc).isoformat()
 
-        # Create digital signature
-        try:
-            signature_data = {
-                "ts": ts,
-                "method": entry["method"],
-                "path": entry["path"],
-                "user": entry["user"],
-                "status": int(entry["status"]),
-                "hash": entry_hash,
-                "prev_hash": prev_hash
-            }
-            signature = sign_entry(signature_data)
-        except Exception as e:
-            # Log signature failure
-            if COMPLIANCE_AVAILABLE:
-                record_anomaly("signature_error", "high", 
-                             f"Failed to sign entry: {str(e)}", db)
+            # Compress and encrypt body/response BEFORE hashing, mirroring
+            # middleware. Response might be bytes in your app; we accept either.
+            # Repeated payloads are stored once and the row references them.
+            key_id, compression, payloads = _encrypt_payloads(entry)
+            enc_body, enc_resp = (store_payload(cur.connection, *payload) for payload in payloads)
 
-        # Create timestamp
-        try:
-            ts_info = create_local_timestamp(entry_hash, {"db": db, "ts": ts})
-            timestamp_token = ts_info["token"]
-        except Exception:
-            pass
+            # Chain over the digests of the encrypted values, as the middleware does
+            entry_hash, body_digest, response_digest = _hash_entry(
+                ts,
+                entry["method"],
+                entry["path"],
+                entry["user"],
+                int(entry["status"]),
+                enc_body,
+                enc_resp,
+                prev_hash,
+                key_id
+            )
 
-        # Mark for WORM protection
-        worm_protected = 1
-
-    # Store encrypted body/response and the chain
-    cur.execute(
-        "INSERT INTO ledger (ts, method, path, user, status, body, response, hash, prev_hash, key_id, signature, timestamp_token, worm_protected) "
-        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-        (
-            ts,
-            entry["method"],
-            entry["path"],
-            entry["user"],
-            int(entry["status"]),
-            enc_body,
-            enc_resp,
-            entry_hash,
-            prev_hash,
-            key_id,
-            signature,
-            timestamp_token,
-            worm_protected
-        ),
-    )
+            signature, timestamp_token, worm_protected = _seal_compliance(
+                db, ts, entry["method"], entry["path"], entry["user"], int(entry["status"]),
+                entry_hash, prev_hash, {"db": db, "ts": ts}, enable_compliance
+            )
+
+            # Store encrypted body/response and the chain
+            cur.execute(
+                INSERT_SQL,
+                _storage_row((
+                    ts,
+                    entry["method"],
+                    entry["path"],
+                    entry["user"],
+                    int(entry["status"]),
+                    enc_body,
+                    enc_resp,
+                    entry_hash,
+                    prev_hash,
+                    key_id,
+                    signature,
+                    timestamp_token,
+                    worm_protected,
+                    FORMAT_VERSION,
+                    body_digest,
+                    response_digest,
+                    compression
+                ), _blob_hashes(cur.connection)),
+            )
 
-    row_id = cur.lastrowid
-    conn.commit()
-    conn.close()
+            row_id = cur.lastrowid
+            store_data_keys(cur.connection, (enc_body, enc_resp))
+            advance_chain_head(cur, row_id, entry_hash)
+            extend_merkle_index(cur, prev_seq, [(row_id, entry_hash)])
+
+        set_cached_head(db, row_id, entry_hash)
 
     # Apply WORM protection after insertion
     if worm_protected and COMPLIANCE_AVAILABLE:
@@ -224,22 +478,338 @@ def add_entry(db, entry, enable_compliance=True):
     return entry_hash
 
 
-def verify_ledger(db_path, check_signatures=True, check_worm=True):
+SIGNING_MODES = ("entry", "batch")
+
+# Entries chained and committed per transaction by add_entries
+ADD_BATCH_SIZE = 1000
+
+
+def add_entries(db, entries, enable_compliance=True, batch_size=ADD_BATCH_SIZE,
+                signing_mode="entry", signer=None):
+    """
+    Add many entries, e.g. to backfill historical events.
+
+    Entries are read from ``entries`` (any iterable, including a generator)
+    ``batch_size`` at a time, so memory stays flat however many there are.
+    Each batch is chained in memory and committed in one transaction with
+    ``executemany``; its timestamps and WORM records are written in one
+    transaction each. The result is the same ledger that calling
+    :func:`add_entry` for every entry would produce.
+
+    Args:
+        db: Database path
+        entries: Iterable of entry dicts (method, path, user, status, body, response)
+        enable_compliance: Enable signatures, timestamps, and WORM (default: True)
+        batch_size: Entries per transaction (default: 1000)
+        signing_mode: "entry" signs every entry; "batch" signs one Merkle
+            root per batch (see ``signatures.sign_entry_batch``)
+        signer: Signer to use (default: the shared process-wide signer)
+
+    Returns:
+        Number of entries added
+
+    Example:
+        def events():
+            for record in historical_records():
+                yield {"method": record.method, "path": record.path, "user": record.user,
+                       "status": record.status, "body": record.body, "response": record.response}
+
+        add_entries("audit_log.db", events(), signing_mode="batch")
+    """
+    if signing_mode not in SIGNING_MODES:
+        raise ValueError(f"signing_mode must be one of {SIGNING_MODES}, got {signing_mode!r}")
+    _ensure_db(db)
+    compliance = enable_compliance and COMPLIANCE_AVAILABLE
+    batch_signing = signing_mode == "batch" and compliance
+
+    added = 0
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, batch_size))
+        if not batch:
+            return added
+        added += on_active_segment(
+            db, lambda path: _add_batch(path, batch, enable_compliance, batch_signing, signer)
+        )
+
+
+def _add_batch(db, batch, enable_compliance, batch_signing, signer):
+    """Chain and commit one batch of ``add_entries``; returns the number added."""
+    compliance = enable_compliance and COMPLIANCE_AVAILABLE
+    with chain_lock(db):
+        with write_cursor(db) as cur:
+            prev_seq, prev_hash = get_chain_head(cur.connection, db)
+
+            rows = []
+            metadata = []
+            for entry in batch:
+                ts = datetime.now(timezone.utc).isoformat()
+                status = int(entry["status"])
+                key_id, compression, payloads = _encrypt_payloads(entry)
+                enc_body, enc_resp = (store_payload(cur.connection, *payload) for payload in payloads)
+                entry_hash, body_digest, response_digest = _hash_entry(
+                    ts, entry["method"], entry["path"], entry["user"], status,
+                    enc_body, enc_resp, prev_hash, key_id
+                )
+                signature, timestamp_token, worm_protected = _seal_compliance(
+                    db, ts, entry["method"], entry["path"], entry["user"], status,
+                    entry_hash, prev_hash, None, enable_compliance, signer,
+                    sign=not batch_signing, timestamp=False
+                )
+                rows.append((
+                    ts, entry["method"], entry["path"], entry["user"], status,
+                    enc_body, enc_resp, entry_hash, prev_hash, key_id,
+                    signature, timestamp_token, worm_protected, FORMAT_VERSION,
+                    body_digest, response_digest, compression
+                ))
+                metadata.append({"db": db, "ts": ts})
+                prev_hash = entry_hash
+
+            if batch_signing:
+                signatures = _sign_batch(db, rows, signer)
+                rows = [row[:10] + (sig,) + row[11:] for row, sig in zip(rows, signatures)]
+            if compliance:
+                tokens = _timestamp_batch(rows, metadata)
+                rows = [row[:11] + (token,) + row[12:] for row, token in zip(rows, tokens)]
+
+            blob_hashes = _blob_hashes(cur.connection)
+            cur.executemany(INSERT_SQL, [_storage_row(row, blob_hashes) for row in rows])
+            # The chain lock and the write transaction keep the new rowids contiguous
+            (last_id,) = cur.execute("SELECT last_insert_rowid()").fetchone()
+            row_ids = range(last_id - len(rows) + 1, last_id + 1)
+            store_data_keys(cur.connection, (value for row in rows for value in row[5:7]))
+
+            advance_chain_head(cur, last_id, prev_hash)
+            extend_merkle_index(cur, prev_seq, [(row_id, row[7]) for row_id, row in zip(row_ids, rows)])
+
+        set_cached_head(db, last_id, prev_hash)
+
+    if compliance:
+        _protect_batch(db, rows, row_ids)
+    return len(rows)
+
+
+# Columns read by verification, with the value used when a column does not
+# exist. Format 2 rows are chained over the payload digests, so their
+# body/response are never read.
+_VERIFY_COLUMNS = (
+    ("rowid", None), ("ts", None), ("method", None), ("path", None), ("user", None),
+    ("status", None),
+    ("body", None), ("response", None),
+    ("hash", None), ("prev_hash", None), ("key_id", None),
+    ("signature", "NULL"), ("worm_protected", "0"),
+    ("format_version", "1"), ("body_digest", "NULL"), ("response_digest", "NULL"),
+)
+_PAYLOAD_COLUMNS = ("body", "response")
+
+
+def _verify_select(table_columns):
+    """SELECT list for verification, for a ledger table with ``table_columns``."""
+    has_format = "format_version" in table_columns
+    parts = []
+    for name, default in _VERIFY_COLUMNS:
+        if default is not None and name not in table_columns:
+            parts.append(default)
+        elif name in _PAYLOAD_COLUMNS and has_format:
+            parts.append(f"CASE WHEN format_version >= 2 THEN NULL ELSE {name} END")
+        else:
+            parts.append(name)
+    return ", ".join(parts)
+
+
+# Below this many rows per worker a process pool costs more than it saves
+PARALLEL_MIN_ROWS_PER_WORKER = 20000
+# Rows fetched per page while verifying
+VERIFY_PAGE_SIZE = 1000
+# Approximate per-row cost of everything except format 1 body/response, for max_memory
+_ROW_OVERHEAD = 512
+
+
+def _iter_page_rows(conn, columns, lo, hi, page_size, max_memory=None):
+    """
+    Yield rows with ``lo < rowid <= hi`` in rowid order, one page in memory at a time.
+
+    Pages are fetched by keyset (``rowid > last``) so every page is an index
+    range scan. With ``max_memory`` the page size shrinks to fit the average
+    size of the rows just read, so ledgers with large payloads stay under the
+    ceiling.
+    """
+    last = lo
+    # With a ceiling, size the first page from a one-row probe
+    size = 1 if max_memory else page_size
+    while True:
+        page = conn.execute(
+            f"SELECT {columns} FROM ledger WHERE rowid > ? AND rowid <= ? ORDER BY rowid ASC LIMIT ?",
+            (last, hi, size)
+        ).fetchall()
+        if not page:
+            return
+        last = page[-1][0]
+        if max_memory:
+            page_bytes = sum(len(r[6] or "") + len(r[7] or "") + _ROW_OVERHEAD for r in page)
+            size = max(1, min(page_size, max_memory * len(page) // page_bytes))
+        yield from page
+        page = None
+
+
+def _iter_row_issues(db_path, rows, last_hash, check_signatures, check_worm, counts, on_progress=None, progress_every=1000):
+    """
+    Verify consecutive ledger rows, starting after a row whose hash is ``last_hash``.
+
+    Yields issue dictionaries as they are found; ``counts`` is updated in
+    place with rows, signature_failures and worm_violations.
+    """
+    for r in rows:
+        counts["rows"] += 1
+        (rowid, ts, method, path, user, status, body, response, entry_hash, prev_hash, kid,
+         signature, worm_protected, format_version, body_digest, response_digest) = r
+        entry_hash = hash_hex(entry_hash)
+        prev_hash = hash_hex(prev_hash)
+
+        # 1) Chain check
+        if prev_hash != last_hash:
+            yield {"row": rowid, "reason": "Previous hash mismatch", "path": path}
+
+        # 2) Integrity check (stored encrypted values or their digests, as hashed on write)
+        computed_hash = _recompute_hash(
+            ts, method, path, user, int(status), body, response, prev_hash, kid,
+            format_version, body_digest, response_digest
+        )
+        if computed_hash != entry_hash:
+            yield {"row": rowid, "reason": "Hash mismatch", "path": path}
+
+        # 3) Signature verification
+        if check_signatures and signature and COMPLIANCE_AVAILABLE:
+            try:
+                signature_data = _signature_data(
+                    ts, method, path, user, int(status), entry_hash, prev_hash
+                )
+                valid = verify_entry_signature(signature_data, signature)
+            except Exception as e:
+                yield {"row": rowid, "reason": f"Signature check error: {str(e)}", "path": path}
+            else:
+                if not valid:
+                    counts["signature_failures"] += 1
+                    yield {"row": rowid, "reason": "Signature verification failed", "path": path}
+
+        # 4) WORM integrity check
+        if check_worm and worm_protected and COMPLIANCE_AVAILABLE:
+            try:
+                intact = verify_entry_integrity(db_path, rowid, entry_hash)
+            except Exception:
+                intact = True
+            if not intact:
+                counts["worm_violations"] += 1
+                yield {"row": rowid, "reason": "WORM integrity violation", "path": path}
+
+        last_hash = entry_hash
+
+        if on_progress is not None and counts["rows"] % progress_every == 0:
+            on_progress(counts["rows"])
+
+
+def _iter_range_issues(task, counts, on_progress=None):
+    """
+    Verify rows with ``lo < rowid <= hi``, yielding issues as they are found.
+
+    The chain is seeded with the stored hash of the last row at or before
+    ``lo``, which is exactly what the serial pass compares against, so the
+    boundary rows of adjacent ranges are checked as if the ranges were one.
+    The first row of a ledger is checked against its chain base.
+    """
+    db_path, lo, hi, columns, check_signatures, check_worm, page_size, max_memory = task
+    conn = connection(db_path)
+
+    seed = conn.execute(
+        "SELECT hash FROM ledger WHERE rowid <= ? ORDER BY rowid DESC LIMIT 1", (lo,)
+    ).fetchone()
+    rows = _iter_page_rows(conn, columns, lo, hi, page_size, max_memory)
+
+    yield from _iter_row_issues(
+        db_path, rows, hash_hex(seed[0]) if seed else chain_base(conn)[1], check_signatures, check_worm,
+        counts, on_progress, page_size
+    )
+
+
+def _verify_range(task):
+    """Verify one rowid range in a worker process; returns (issues, counts)."""
+    counts = _new_counts()
+    issues = list(_iter_range_issues(task, counts))
+    return issues, counts
+
+
+def _new_counts():
+    return {"rows": 0, "signature_failures": 0, "worm_violations": 0}
+
+
+def _split_rowid_range(lo, hi, parts):
+    """Split ``(lo, hi]`` into at most ``parts`` contiguous ``(lo, hi]`` ranges."""
+    step = max(1, -(-(hi - lo) // parts))
+    bounds = list(range(lo, hi, step)) + [hi]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def verify_ledger(db_path, check_signatures=True, check_worm=True, workers=1,
+                  page_size=VERIFY_PAGE_SIZE, max_memory=None, on_issue=None, on_progress=None,
+                  full=False, checkpoint=False, recheck=False):
     """
     Verify ledger with optional compliance checks.
     
     Recomputes the hash using the stored (already encrypted) body/response strings,
     matching the middleware's entry_str computation. No decryption required.
+    Format 2 rows are chained over the digests of those strings, so only the
+    narrow metadata columns are read; see :func:`verify_payloads` for the
+    pass that checks the payloads against their digests.
+    
+    With ``workers`` > 1 the ledger is split into rowid ranges that are
+    verified in a process pool; each range seeds its chain check with the
+    stored hash of the row before it, and the per-range results are stitched
+    back together in rowid order. The result is identical to the serial pass.
+    
+    Rows are read in rowid-ordered pages, so memory stays flat however large
+    the ledger is. Issues can be streamed through ``on_issue`` as they are
+    found instead of being collected.
+    
+    Verification is incremental: only rows after the latest trusted signed
+    checkpoint are checked, and a clean pass with ``checkpoint`` records a
+    new checkpoint; otherwise the ledger is only read. A
+    checkpoint that fails its signature or no longer matches the ledger is
+    reported as an issue and the whole ledger is re-verified. Rows before
+    the checkpoint are not re-checked unless ``recheck`` (their stored
+    hashes against the checkpoints' signed range digests) or ``full``.
+    
+    For the root of a sharded ledger the shards are verified one per worker
+    process and the anchor chain is validated afterwards; see
+    :func:`audittrail.shards.verify_shards`. Segmented ledgers are verified
+    segment by segment in the same way, followed by their manifests and
+    links (:func:`audittrail.segments.verify_segments`).
     
     Args:
         db_path: Database path
         check_signatures: Verify digital signatures (default: True)
         check_worm: Check WORM integrity (default: True)
+        workers: Worker processes (default: 1, serial; None uses every CPU).
+            Small ledgers are always verified serially.
+        page_size: Maximum rows held in memory per page (default: 1000)
+        max_memory: Approximate ceiling in bytes for one page; pages shrink
+            when payloads are large (default: None, page_size only)
+        on_issue: Callback ``on_issue(issue)`` called as each issue is found.
+            When given, issues are not collected into ``details``.
+        on_progress: Callback ``on_progress(rows_checked, total_rows)`` called
+            after every page (serial) or range (parallel)
+        full: Ignore checkpoints and re-verify every row (default: False)
+        checkpoint: Record a signed checkpoint after a clean pass (default:
+            False, verification does not write to the ledger). Sealed
+            segments are never checkpointed.
+        recheck: Compare the stored hashes of the rows before the checkpoint
+            with its signed range digests (default: False)
     
     Returns:
         Verification results dictionary with:
         - verified: bool
         - total_entries: int
+        - checked_entries: int (rows checked in this pass)
+        - checkpoint_id: int (if verification resumed from a checkpoint)
         - issues: int
         - details: list (if issues found)
         - signature_failures: int (if signatures checked)
@@ -251,83 +821,126 @@ def verify_ledger(db_path, check_signatures=True, check_worm=True):
             print("Ledger is valid!")
         else:
             print(f"Issues found: {result['details']}")
+
+        # 20M rows before a deadline: use every core
+        result = verify_ledger("audit_log.db", workers=None)
+
+        # Multi-GB ledger: flat memory, issues printed as they are found
+        verify_ledger("audit_log.db", max_memory=64 * 1024 * 1024, on_issue=print)
+
+        # Routine check: record a checkpoint so the next pass starts after it
+        result = verify_ledger("audit_log.db", checkpoint=True)
+
+        # Ignore checkpoints, e.g. for an annual audit
+        result = verify_ledger("audit_log.db", full=True)
     """
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
+    conn = connection(db_path)
+    for is_root, verify_parts in ((is_shard_root, verify_shards), (is_segment_root, verify_segments)):
+        if is_root(conn):
+            return verify_parts(
+                db_path, check_signatures, check_worm, workers, on_issue, on_progress,
+                page_size=page_size, max_memory=max_memory, full=full, checkpoint=checkpoint,
+                recheck=recheck
+            )
     
-    # Check if compliance columns exist
-    columns = [col[1] for col in cur.execute("PRAGMA table_info(ledger)").fetchall()]
-    has_signatures = "signature" in columns
-    has_worm = "worm_protected" in columns
+    # Only select the columns this ledger has
+    table_columns = _ledger_columns(conn)
+    has_signatures = "signature" in table_columns
+    has_worm = "worm_protected" in table_columns
+    columns = _verify_select(table_columns)
     
-    if has_signatures and has_worm:
-        rows = cur.execute(
-            "SELECT rowid, ts, method, path, user, status, body, response, hash, prev_hash, key_id, signature, worm_protected "
-            "FROM ledger ORDER BY rowid ASC"
-        ).fetchall()
-    else:
-        rows = cur.execute(
-            "SELECT rowid, ts, method, path, user, status, body, response, hash, prev_hash, key_id "
-            "FROM ledger ORDER BY rowid ASC"
-        ).fetchall()
+    min_rowid, max_rowid, row_count = conn.execute(
+        "SELECT MIN(rowid), MAX(rowid), COUNT(*) FROM ledger"
+    ).fetchone()
     
-    conn.close()
-
-    last_hash = ""
     issues = []
-    signature_failures = 0
-    worm_violations = 0
+    issue_count = 0
+    counts = _new_counts()
     
-    for r in rows:
-        if has_signatures and has_worm:
-            rowid, ts, method, path, user, status, body, response, entry_hash, prev_hash, kid, signature, worm_protected = r
+    def report(issue):
+        nonlocal issue_count
+        issue_count += 1
+        if on_issue is not None:
+            on_issue(issue)
         else:
-            rowid, ts, method, path, user, status, body, response, entry_hash, prev_hash, kid = r
-            signature = None
-            worm_protected = 0
-
-        # 1) Chain check
-        if prev_hash != last_hash:
-            issues.append({"row": rowid, "reason": "Previous hash mismatch", "path": path})
-
-        # 2) Integrity check (use stored encrypted values exactly as middleware hashed)
-        computed_hash = _compute_hash_string(
-            ts, method, path, user, int(status), body, response, prev_hash, kid
-        )
-        if computed_hash != entry_hash:
-            issues.append({"row": rowid, "reason": "Hash mismatch", "path": path})
-
-        # 3) Signature verification
-        if check_signatures and signature and COMPLIANCE_AVAILABLE:
-            try:
-                signature_data = {
-                    "ts": ts,
-                    "method": method,
-                    "path": path,
-                    "user": user,
-                    "status": int(status),
-                    "hash": entry_hash,
-                    "prev_hash": prev_hash
-                }
-                if not verify_entry_signature(signature_data, signature):
-                    issues.append({"row": rowid, "reason": "Signature verification failed", "path": path})
-                    signature_failures += 1
-            except Exception as e:
-                issues.append({"row": rowid, "reason": f"Signature check error: {str(e)}", "path": path})
-
-        # 4) WORM integrity check
-        if check_worm and worm_protected and COMPLIANCE_AVAILABLE:
-            try:
-                if not verify_entry_integrity(db_path, rowid, entry_hash):
-                    issues.append({"row": rowid, "reason": "WORM integrity violation", "path": path})
-                    worm_violations += 1
-            except Exception:
-                pass
-
-        last_hash = entry_hash
+            issues.append(issue)
+    
+    # Resume after the latest trusted checkpoint
+    trusted = None
+    start_rowid = (min_rowid or 1) - 1
+    if not full and row_count and COMPLIANCE_AVAILABLE:
+        latest, problem = latest_trusted_checkpoint(db_path, recheck=recheck)
+        if problem:
+            report({"row": latest["last_rowid"], "reason": problem, "path": None})
+        elif latest:
+            trusted = latest
+            start_rowid = trusted["last_rowid"]
+    to_check = row_count - (trusted["total_entries"] if trusted else 0)
+    
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, to_check // PARALLEL_MIN_ROWS_PER_WORKER))
+    
+    if row_count == 0 or start_rowid >= max_rowid:
+        ranges = []
+    elif workers == 1:
+        ranges = [(start_rowid, max_rowid)]
+    else:
+        # Several ranges per worker so an uneven range does not leave cores idle
+        ranges = _split_rowid_range(start_rowid, max_rowid, workers * 4)
+    tasks = [
+        (db_path, lo, hi, columns, check_signatures, check_worm, page_size, max_memory)
+        for lo, hi in ranges
+    ]
+    
+    if workers == 1:
+        progress = None
+        if on_progress is not None:
+            progress = lambda rows_checked: on_progress(rows_checked, to_check)
+        for task in tasks:
+            for issue in _iter_range_issues(task, counts, progress):
+                report(issue)
+        if progress is not None and counts["rows"] % page_size:
+            progress(counts["rows"])
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for range_issues, range_counts in pool.map(_verify_range, tasks):
+                for issue in range_issues:
+                    report(issue)
+                for name, value in range_counts.items():
+                    counts[name] += value
+                if on_progress is not None:
+                    on_progress(counts["rows"], to_check)
+    
+    # Rows removed (or inserted) before the checkpoint do not break the
+    # chain after it, but they do change the row count
+    if trusted and row_count - counts["rows"] != trusted["total_entries"]:
+        report({
+            "row": trusted["last_rowid"],
+            "reason": f"Entry count up to checkpoint {trusted['id']} changed "
+                      f"({trusted['total_entries']} -> {row_count - counts['rows']})",
+            "path": None
+        })
+    
+    # A ledger rotated to a new key carries a signed record linking it to
+    # the chain it replaced
+    for issue in check_rotation_records(db_path, check_signatures):
+        report(issue)
+    
+    signature_failures = counts["signature_failures"]
+    worm_violations = counts["worm_violations"]
+    total_entries = row_count
+    
+    if (checkpoint and issue_count == 0 and counts["rows"] and COMPLIANCE_AVAILABLE
+            and not is_sealed_segment(conn)):
+        try:
+            create_checkpoint(db_path, start_rowid, max_rowid, row_count)
+        except Exception:
+            # No signing key: verification still stands, it just is not checkpointed
+            pass
 
     # Record anomalies if issues found
-    if issues and COMPLIANCE_AVAILABLE:
+    if issue_count and COMPLIANCE_AVAILABLE:
         if signature_failures > 0:
             record_anomaly("signature_error", "critical",
                          f"Found {signature_failures} signature verification failures", db_path)
@@ -336,11 +949,15 @@ def verify_ledger(db_path, check_signatures=True, check_worm=True):
                          f"Found {worm_violations} WORM violations", db_path)
 
     result = {
-        "verified": len(issues) == 0,
-        "total_entries": len(rows),
-        "issues": len(issues)
+        "verified": issue_count == 0,
+        "total_entries": total_entries,
+        "checked_entries": counts["rows"],
+        "issues": issue_count
     }
     
+    if trusted:
+        result["checkpoint_id"] = trusted["id"]
+    
     if issues:
         result["details"] = issues
     
@@ -351,3 +968,87 @@ def verify_ledger(db_path, check_signatures=True, check_worm=True):
         result["worm_violations"] = worm_violations
     
     return result
+
+
+def verify_payloads(db_path, blob_dir=None, check_blobs=True, page_size=VERIFY_PAGE_SIZE,
+                    on_issue=None, on_progress=None):
+    """
+    Check stored bodies and responses against the digests the chain covers.
+
+    ``verify_ledger`` checks format 2 rows from their narrow metadata
+    columns alone; this is the separate pass over the payloads themselves.
+    Each format 2 body/response must hash to its stored digest, and each
+    spooled blob file and deduplicated payload must match the digest in
+    its reference. Format 1
+    payloads are already covered by ``verify_ledger``; only their blob
+    files are checked here.
+
+    Args:
+        db_path: Database path
+        blob_dir: Directory holding spooled blobs (default: ``<db_path>.blobs``)
+        check_blobs: Also read and hash blob files (default: True)
+        page_size: Maximum rows held in memory per page (default: 1000)
+        on_issue: Callback ``on_issue(issue)`` called as each issue is found.
+            When given, issues are not collected into ``details``.
+        on_progress: Callback ``on_progress(rows_checked, total_rows)`` called
+            after every page
+
+    Returns:
+        Dictionary with verified, checked_entries, blobs_checked, issues and
+        details (if issues found)
+
+    Example:
+        result = verify_payloads("audit_log.db")
+        if not result["verified"]:
+            print(result["details"])
+    """
+    conn = connection(db_path)
+    blob_dir = blob_dir or default_blob_dir(db_path)
+    table_columns = _ledger_columns(conn)
+    if "format_version" in table_columns:
+        columns = "rowid, path, body, response, format_version, body_digest, response_digest"
+    else:
+        columns = "rowid, path, body, response, 1, NULL, NULL"
+    (total,) = conn.execute("SELECT COUNT(*) FROM ledger").fetchone()
+
+    issues = []
+    issue_count = 0
+    checked = 0
+    blobs_checked = 0
+
+    def report(issue):
+        nonlocal issue_count
+        issue_count += 1
+        if on_issue is not None:
+            on_issue(issue)
+        else:
+            issues.append(issue)
+
+    for rowid, path, body, response, format_version, body_digest, response_digest in _iter_page_rows(
+        conn, columns, 0, 2 ** 63 - 1, page_size
+    ):
+        checked += 1
+        for field, value, digest in (("Body", body, body_digest), ("Response", response, response_digest)):
+            if format_version >= 2 and payload_digest(value) != digest:
+                report({"row": rowid, "reason": f"{field} digest mismatch", "path": path})
+            if check_blobs and is_blob_ref(value):
+                blobs_checked += 1
+                if not verify_blob(blob_dir, value):
+                    report({"row": rowid, "reason": f"{field} blob missing or modified", "path": path})
+            if is_payload_ref(value) and not verify_payload_ref(conn, value):
+                report({"row": rowid, "reason": f"{field} payload missing or modified", "path": path})
+        if on_progress is not None and checked % page_size == 0:
+            on_progress(checked, total)
+
+    if on_progress is not None and checked % page_size:
+        on_progress(checked, total)
+
+    result = {
+        "verified": issue_count == 0,
+        "checked_entries": checked,
+        "blobs_checked": blobs_checked,
+        "issues": issue_count
+    }
+    if issues:
+        result["details"] = issues
+    return result
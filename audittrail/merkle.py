@@ -0,0 +1,238 @@
+"""
+Merkle tree primitives (RFC 6962 / RFC 9162 hashing).
+
+Leaves are hashed as SHA-256(0x00 || data) and interior nodes as
+SHA-256(0x01 || left || right), so a leaf can never be confused with a
+node. Subtree hashes are supplied through a ``subtree_hash(lo, hi)``
+callable, which lets the same proof code run over an in-memory batch or a
+tree persisted in the database.
+"""
+
+import hashlib
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+
+SubtreeHash = Callable[[int, int], bytes]
+
+
+def leaf_hash(data: bytes) -> bytes:
+    """Hash leaf data."""
+    return hashlib.sha256(b"\x00" + data).digest()
+
+
+def node_hash(left: bytes, right: bytes) -> bytes:
+    """Hash two child nodes."""
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+
+def split_point(n: int) -> int:
+    """Largest power of two strictly less than ``n`` (n >= 2)."""
+    k = 1
+    while k << 1 < n:
+        k <<= 1
+    return k
+
+
+class InMemoryTree:
+    """
+    Merkle tree over a list of leaf hashes with memoized subtree hashes.
+
+    Used for per-batch signing, where all leaves are known up front.
+    """
+
+    def __init__(self, leaves: Sequence[bytes]):
+        self.leaves = list(leaves)
+        self._cache: Dict[Tuple[int, int], bytes] = {}
+
+    @property
+    def size(self) -> int:
+        return len(self.leaves)
+
+    def subtree_hash(self, lo: int, hi: int) -> bytes:
+        """MTH(D[lo:hi])."""
+        if hi - lo == 1:
+            return self.leaves[lo]
+        key = (lo, hi)
+        cached = self._cache.get(key)
+        if cached is None:
+            k = split_point(hi - lo)
+            cached = node_hash(self.subtree_hash(lo, lo + k), self.subtree_hash(lo + k, hi))
+            self._cache[key] = cached
+        return cached
+
+    def root(self) -> bytes:
+        return root_hash(self.size, self.subtree_hash)
+
+    def audit_path(self, index: int) -> List[bytes]:
+        return audit_path(index, self.size, self.subtree_hash)
+
+
+def root_hash(size: int, subtree_hash: SubtreeHash) -> bytes:
+    """Root of a tree of ``size`` leaves (the hash of the empty string for size 0)."""
+    if size == 0:
+        return hashlib.sha256(b"").digest()
+    return subtree_hash(0, size)
+
+
+def audit_path(index: int, size: int, subtree_hash: SubtreeHash, offset: int = 0) -> List[bytes]:
+    """
+    Inclusion proof PATH(index, D[offset:offset + size]) from RFC 6962 section 2.1.1.
+
+    Returns:
+        Sibling hashes from the leaf up to the root
+    """
+    if not 0 <= index < size:
+        raise ValueError(f"Leaf index {index} out of range for tree size {size}")
+    path = []
+    lo, n, m = offset, size, index
+    while n > 1:
+        k = split_point(n)
+        if m < k:
+            path.append(subtree_hash(lo + k, lo + n))
+            n = k
+        else:
+            path.append(subtree_hash(lo, lo + k))
+            lo, n, m = lo + k, n - k, m - k
+    path.reverse()
+    return path
+
+
+def root_from_audit_path(index: int, size: int, leaf: bytes, path: Sequence[bytes]):
+    """
+    Recompute the root from an inclusion proof (RFC 9162 section 2.1.3.2).
+
+    Returns:
+        Root hash, or None if the proof is malformed for this index/size
+    """
+    if not 0 <= index < size:
+        return None
+    fn, sn, r = index, size - 1, leaf
+    for p in path:
+        if sn == 0:
+            return None
+        if fn & 1 or fn == sn:
+            r = node_hash(p, r)
+            if not fn & 1:
+                while not fn & 1 and fn != 0:
+                    fn >>= 1
+                    sn >>= 1
+        else:
+            r = node_hash(r, p)
+        fn >>= 1
+        sn >>= 1
+    if sn != 0:
+        return None
+    return r
+
+
+def verify_audit_path(index: int, size: int, leaf: bytes, path: Sequence[bytes], root: bytes) -> bool:
+    """Check that ``leaf`` is at ``index`` in the tree of ``size`` leaves with ``root``."""
+    return root_from_audit_path(index, size, leaf, path) == root
+
+
+def consistency_proof(old_size: int, new_size: int, subtree_hash: SubtreeHash) -> List[bytes]:
+    """
+    Consistency proof PROOF(old_size, D[0:new_size]) from RFC 6962 section 2.1.2.
+
+    Proves the tree of ``old_size`` leaves is a prefix of the tree of
+    ``new_size`` leaves.
+    """
+    if not 0 <= old_size <= new_size:
+        raise ValueError(f"Invalid tree sizes {old_size} -> {new_size}")
+    if old_size == 0 or old_size == new_size:
+        return []
+
+    proof = []
+    lo, n, m, complete = 0, new_size, old_size, True
+    while m != n:
+        k = split_point(n)
+        if m <= k:
+            proof.append(subtree_hash(lo + k, lo + n))
+            n = k
+        else:
+            proof.append(subtree_hash(lo, lo + k))
+            lo, n, m, complete = lo + k, n - k, m - k, False
+    if not complete:
+        proof.append(subtree_hash(lo, lo + n))
+    proof.reverse()
+    return proof
+
+
+def verify_consistency(old_size: int, new_size: int, old_root: bytes, new_root: bytes,
+                       proof: Sequence[bytes]) -> bool:
+    """
+    Check a consistency proof (RFC 9162 section 2.1.4.2).
+
+    Returns:
+        True if the tree with ``old_root`` is a prefix of the tree with ``new_root``
+    """
+    if not 0 <= old_size <= new_size:
+        return False
+    if old_size == new_size:
+        return not proof and old_root == new_root
+    if old_size == 0:
+        return not proof
+    if not proof:
+        return False
+
+    path = list(proof)
+    if old_size & (old_size - 1) == 0:
+        path.insert(0, old_root)
+
+    fn, sn = old_size - 1, new_size - 1
+    while fn & 1:
+        fn >>= 1
+        sn >>= 1
+
+    fr = sr = path[0]
+    for c in path[1:]:
+        if sn == 0:
+            return False
+        if fn & 1 or fn == sn:
+            fr = node_hash(c, fr)
+            sr = node_hash(c, sr)
+            if not fn & 1:
+                while not fn & 1 and fn != 0:
+                    fn >>= 1
+                    sn >>= 1
+        else:
+            sr = node_hash(sr, c)
+        fn >>= 1
+        sn >>= 1
+
+    return sn == 0 and fr == old_root and sr == new_root
+
+
+def streaming_root(leaves, on_subtree: Optional[Callable[[int, int, bytes], bool]] = None):
+    """
+    Root of the tree over an iterable of leaf hashes, in O(log n) memory.
+
+    Complete subtrees are merged as soon as they form; the remaining
+    stack is folded right to left, which matches the RFC 6962 split.
+
+    Args:
+        leaves: Iterable of leaf hashes
+        on_subtree: Optional ``on_subtree(end, size, hash)`` called for every
+            complete subtree of ``size`` leaves ending before leaf ``end``
+            (relative to the first leaf); returning False stops early
+
+    Returns:
+        Root hash, or None if ``on_subtree`` stopped the walk
+    """
+    stack = []  # (leaf count, hash) with strictly decreasing counts
+    count = 0
+    for leaf in leaves:
+        count += 1
+        size, h = 1, leaf
+        while stack and stack[-1][0] == size:
+            left_size, left = stack.pop()
+            size, h = size + left_size, node_hash(left, h)
+            if on_subtree is not None and on_subtree(count, size, h) is False:
+                return None
+        stack.append((size, h))
+    if not stack:
+        return hashlib.sha256(b"").digest()
+    h = stack[-1][1]
+    for _, left in reversed(stack[:-1]):
+        h = node_hash(left, h)
+    return h
@@ -0,0 +1,343 @@
+"""
+Incremental Merkle tree index over the ledger (Certificate Transparency style).
+
+Every ledger entry is a leaf, in rowid order; the leaf is the RFC 6962 leaf
+hash of the entry's chain hash, which already commits to the whole row.
+Only complete, aligned subtrees are stored (``merkle_nodes``), so an append
+writes the leaf plus one node per completed level (amortized O(1)), and any
+root, inclusion proof or consistency proof needs O(log n) node reads.
+
+Auditors can check one entry, or that the log only grew between two
+sizes, without replaying the hash chain:
+
+    proof = inclusion_proof("audit_log.db", rowid=42)
+    assert verify_inclusion(proof["entry_hash"], proof)
+
+    proof = consistency_proof("audit_log.db", old_size=1000)
+    assert verify_consistency_proof(proof)
+"""
+
+from typing import Dict, Any, Iterable, Optional, Tuple
+
+from .merkle import (
+    consistency_proof as _consistency_proof,
+    audit_path,
+    leaf_hash,
+    node_hash,
+    root_hash,
+    split_point,
+    verify_audit_path,
+    verify_consistency,
+)
+from .chain import chain_base, chain_lock, hash_hex
+from .store import connection, cursor, write_cursor
+
+
+# Ledger rows indexed per transaction by sync_merkle_index
+SYNC_BATCH_SIZE = 10000
+
+
+def ensure_merkle_tables(conn):
+    """Create the Merkle index tables if they do not exist."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS merkle_leaves (
+        idx INTEGER PRIMARY KEY,
+        ledger_rowid INTEGER NOT NULL UNIQUE
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS merkle_nodes (
+        level INTEGER NOT NULL,
+        idx INTEGER NOT NULL,
+        hash BLOB NOT NULL,
+        PRIMARY KEY (level, idx)
+    ) WITHOUT ROWID
+    """)
+
+
+def entry_leaf_hash(entry_hash: str) -> bytes:
+    """Leaf hash for a ledger entry's chain hash (hex, or as stored)."""
+    return leaf_hash(hash_hex(entry_hash).encode())
+
+
+def _last_leaf(conn) -> Tuple[int, int]:
+    """(tree size, ledger rowid of the last leaf); (0, base seq) for an empty index."""
+    row = conn.execute(
+        "SELECT idx, ledger_rowid FROM merkle_leaves ORDER BY idx DESC LIMIT 1"
+    ).fetchone()
+    if row is None:
+        return 0, chain_base(conn)[0]
+    return row[0] + 1, row[1]
+
+
+def append_leaves(cur, entries: Iterable[Tuple[int, str]], size: Optional[int] = None) -> int:
+    """
+    Append ledger entries to the index inside the caller's transaction.
+
+    Args:
+        cur: Cursor on the ledger database
+        entries: ``(rowid, entry_hash)`` pairs in ledger order
+        size: Current tree size, if already known
+
+    Returns:
+        New tree size
+    """
+    if size is None:
+        size, _ = _last_leaf(cur.connection)
+
+    new_nodes = {}
+
+    def node(level, idx):
+        h = new_nodes.get((level, idx))
+        if h is None:
+            h = cur.execute(
+                "SELECT hash FROM merkle_nodes WHERE level = ? AND idx = ?", (level, idx)
+            ).fetchone()[0]
+        return h
+
+    leaves = []
+    for rowid, entry_hash in entries:
+        leaves.append((size, rowid))
+        h = entry_leaf_hash(entry_hash)
+        level, idx = 0, size
+        new_nodes[(level, idx)] = h
+        # Each odd index completes a subtree with its left sibling
+        while idx & 1:
+            h = node_hash(node(level, idx - 1), h)
+            level, idx = level + 1, idx >> 1
+            new_nodes[(level, idx)] = h
+        size += 1
+
+    cur.executemany("INSERT INTO merkle_leaves (idx, ledger_rowid) VALUES (?, ?)", leaves)
+    cur.executemany(
+        "INSERT INTO merkle_nodes (level, idx, hash) VALUES (?, ?, ?)",
+        [(level, idx, h) for (level, idx), h in new_nodes.items()]
+    )
+    return size
+
+
+def extend_merkle_index(cur, prev_rowid: int, entries) -> bool:
+    """
+    Append freshly chained entries if the index is up to date.
+
+    Called by every write path in the same transaction as the insert.
+    ``prev_rowid`` is the chain head before the entries were inserted. If
+    the index lags behind the ledger (e.g. a ledger created before the
+    index existed) nothing is written; :func:`sync_merkle_index` catches up.
+
+    Returns:
+        True if the entries were indexed
+    """
+    size, last_rowid = _last_leaf(cur.connection)
+    if last_rowid != prev_rowid:
+        return False
+    append_leaves(cur, entries, size)
+    return True
+
+
+def sync_merkle_index(db_path: str) -> int:
+    """
+    Index any ledger rows that are not yet in the tree.
+
+    Returns:
+        Tree size after syncing
+    """
+    connection(db_path, ensure_merkle_tables)
+    while True:
+        # Writers extend the index under the same locks
+        with chain_lock(db_path):
+            with write_cursor(db_path) as cur:
+                size, last_rowid = _last_leaf(cur.connection)
+                rows = cur.execute(
+                    "SELECT rowid, hash FROM ledger WHERE rowid > ? ORDER BY rowid ASC LIMIT ?",
+                    (last_rowid, SYNC_BATCH_SIZE)
+                ).fetchall()
+                if not rows:
+                    return size
+                append_leaves(cur, rows, size)
+
+
+def rebuild_merkle_index(db_path: str) -> int:
+    """
+    Drop and rebuild the index from the ledger.
+
+    Returns:
+        Tree size
+    """
+    with chain_lock(db_path):
+        with cursor(db_path) as cur:
+            clear_merkle_index(cur.connection)
+        return sync_merkle_index(db_path)
+
+
+def clear_merkle_index(conn):
+    """Delete the index (used when the ledger itself is cleared)."""
+    ensure_merkle_tables(conn)
+    conn.execute("DELETE FROM merkle_leaves")
+    conn.execute("DELETE FROM merkle_nodes")
+
+
+class StoredTree:
+    """Subtree hashes read from ``merkle_nodes``, memoized for one proof."""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._cache = {}
+
+    def subtree_hash(self, lo: int, hi: int) -> bytes:
+        """MTH(D[lo:hi]) for ranges produced by the RFC 6962 split."""
+        key = (lo, hi)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        n = hi - lo
+        level = n.bit_length() - 1
+        if n == 1 << level and lo % n == 0:
+            row = self._conn.execute(
+                "SELECT hash FROM merkle_nodes WHERE level = ? AND idx = ?", (level, lo >> level)
+            ).fetchone()
+            if row is None:
+                raise LookupError(f"Merkle node for leaves [{lo}, {hi}) is missing")
+            cached = row[0]
+        else:
+            k = split_point(n)
+            cached = node_hash(self.subtree_hash(lo, lo + k), self.subtree_hash(lo + k, hi))
+        self._cache[key] = cached
+        return cached
+
+
+def _resolve_size(conn, db_path: str, size: Optional[int]) -> int:
+    current, _ = _last_leaf(conn)
+    if current == 0 or size is None or size > current:
+        current = sync_merkle_index(db_path)
+    if size is None:
+        return current
+    if not 0 <= size <= current:
+        raise ValueError(f"Tree size {size} exceeds ledger size {current}")
+    return size
+
+
+def tree_size(db_path: str) -> int:
+    """Number of ledger entries covered by the index (syncing it first)."""
+    return sync_merkle_index(db_path)
+
+
+def get_root(db_path: str, size: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Merkle root of the first ``size`` entries (default: the whole ledger).
+
+    Returns:
+        Dictionary with tree_size and root (hex)
+    """
+    conn = connection(db_path, ensure_merkle_tables)
+    size = _resolve_size(conn, db_path, size)
+    return {"tree_size": size, "root": root_hash(size, StoredTree(conn).subtree_hash).hex()}
+
+
+def inclusion_proof(db_path: str, rowid: int, size: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Prove that the ledger row ``rowid`` is in the tree of ``size`` entries.
+
+    Args:
+        db_path: Ledger database path
+        rowid: Ledger rowid of the entry
+        size: Tree size to prove against (default: the whole ledger)
+
+    Returns:
+        Dictionary with rowid, leaf_index, tree_size, entry_hash, path (hex
+        list) and root (hex)
+
+    Raises:
+        LookupError: If the row is not in the ledger (or not within ``size``)
+    """
+    conn = connection(db_path, ensure_merkle_tables)
+    size = _resolve_size(conn, db_path, size)
+
+    row = conn.execute(
+        "SELECT l.idx, g.hash FROM merkle_leaves l JOIN ledger g ON g.rowid = l.ledger_rowid "
+        "WHERE l.ledger_rowid = ?", (rowid,)
+    ).fetchone()
+    if row is None or row[0] >= size:
+        raise LookupError(f"Ledger row {rowid} is not in the tree of size {size}")
+    index, entry_hash = row
+    entry_hash = hash_hex(entry_hash)
+
+    tree = StoredTree(conn)
+    return {
+        "rowid": rowid,
+        "leaf_index": index,
+        "tree_size": size,
+        "entry_hash": entry_hash,
+        "path": [h.hex() for h in audit_path(index, size, tree.subtree_hash)],
+        "root": root_hash(size, tree.subtree_hash).hex(),
+    }
+
+
+def verify_inclusion(entry_hash: str, proof: Dict[str, Any], root: Optional[str] = None) -> bool:
+    """
+    Check an inclusion proof without access to the ledger.
+
+    Args:
+        entry_hash: Chain hash of the entry (recompute it from the row to
+            also prove the row's contents)
+        proof: Output of :func:`inclusion_proof`
+        root: Trusted root (hex) to check against (default: the proof's root)
+
+    Returns:
+        True if the entry is at ``leaf_index`` in the tree with that root
+    """
+    try:
+        return verify_audit_path(
+            proof["leaf_index"], proof["tree_size"], entry_leaf_hash(entry_hash),
+            [bytes.fromhex(h) for h in proof["path"]],
+            bytes.fromhex(root or proof["root"])
+        )
+    except (KeyError, ValueError):
+        return False
+
+
+def consistency_proof(db_path: str, old_size: int, new_size: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Prove that the ledger at ``old_size`` entries is a prefix of the ledger at ``new_size``.
+
+    Returns:
+        Dictionary with old_size, new_size, old_root, new_root (hex) and proof (hex list)
+    """
+    conn = connection(db_path, ensure_merkle_tables)
+    new_size = _resolve_size(conn, db_path, new_size)
+    if not 0 <= old_size <= new_size:
+        raise ValueError(f"Invalid tree sizes {old_size} -> {new_size}")
+
+    tree = StoredTree(conn)
+    return {
+        "old_size": old_size,
+        "new_size": new_size,
+        "old_root": root_hash(old_size, tree.subtree_hash).hex(),
+        "new_root": root_hash(new_size, tree.subtree_hash).hex(),
+        "proof": [h.hex() for h in _consistency_proof(old_size, new_size, tree.subtree_hash)],
+    }
+
+
+def verify_consistency_proof(proof: Dict[str, Any], old_root: Optional[str] = None,
+                             new_root: Optional[str] = None) -> bool:
+    """
+    Check a consistency proof without access to the ledger.
+
+    Args:
+        proof: Output of :func:`consistency_proof`
+        old_root: Previously trusted root (hex) (default: the proof's old_root)
+        new_root: Root (hex) to check against (default: the proof's new_root)
+
+    Returns:
+        True if the old tree is a prefix of the new tree
+    """
+    try:
+        return verify_consistency(
+            proof["old_size"], proof["new_size"],
+            bytes.fromhex(old_root or proof["old_root"]),
+            bytes.fromhex(new_root or proof["new_root"]),
+            [bytes.fromhex(h) for h in proof["proof"]]
+        )
+    except (KeyError, ValueError):
+        return False
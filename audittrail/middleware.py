@@ -2,49 +2,157 @@
 AuditTrail middleware with optional compliance features.
 """
 
-from cryptography.fernet import Fernet
-import os, hashlib, json, sqlite3
-from starlette.middleware.base import BaseHTTPMiddleware
+import json
 from datetime import datetime, timezone
+from .chain import advance_chain_head, chain_lock, get_chain_head, load_chain_head, set_cached_head
+from .ledger import (
+    FORMAT_VERSION, INSERT_SQL, _blob_hashes, _create_ledger_schema, _ensure_db, _hash_entry,
+    _seal_compliance, _storage_row
+)
+from .merkle_index import extend_merkle_index
+from .store import connection, set_profile, write_cursor
+from .writer import LedgerWriter, LedgerWriteError
+from .shards import ANCHOR_INTERVAL, ShardAnchorer, init_shard_root, shard_path
+from .segments import init_segmented_ledger, is_segment_root, on_active_segment
+from .blobstore import BodySpool, default_blob_dir
+from .cipher import get_cipher, legacy_cipher, set_cipher, store_data_keys
+from .compression import compress_payloads, set_compression
+from .payloads import payload_id, set_dedup, store_payload
 
-# Load or create encryption key
-KEY_PATH = os.path.expanduser("~/.audittrail.key")
-if not os.path.exists(KEY_PATH):
-    with open(KEY_PATH, "wb") as f:
-        f.write(Fernet.generate_key())
-with open(KEY_PATH, "rb") as f:
-    CIPHER = Fernet(f.read())
+def __getattr__(name):
+    # Fernet cipher of the master key, for payloads written before envelope
+    # encryption; built on first use so that importing needs no key
+    if name == "CIPHER":
+        return legacy_cipher().fernet
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Import compliance modules (optional)
 try:
-    from .signatures import sign_entry, initialize_signing_keys
-    from .timestamp import create_local_timestamp
+    from .signatures import initialize_signing_keys, Signer
     from .worm import protect_entry
-    from .anomaly import record_anomaly
     COMPLIANCE_AVAILABLE = True
 except ImportError:
     COMPLIANCE_AVAILABLE = False
 
 
-class AuditTrailMiddleware(BaseHTTPMiddleware):
+class AuditTrailMiddleware:
     """
     AuditTrail middleware for FastAPI with optional compliance features.
+
+    Implemented as a raw ASGI middleware: request and response chunks are
+    teed as they pass through ``receive`` and ``send``, so the response
+    streams to the client unchanged and the audit entry is written once
+    the final body chunk has been sent.
     
     Args:
         app: FastAPI application
         storage_path: Path to SQLite database
         enable_compliance: Enable digital signatures, timestamps, and WORM protection (default: True)
+        background_writer: Hand entries to a background group-commit writer instead of
+            writing them inside the request (default: False)
+        queue_size: Maximum pending entries for the background writer
+        batch_size: Maximum entries committed per transaction by the background writer
+        stream_threshold: Bodies larger than this many bytes are encrypted chunk by chunk
+            into a blob file instead of being buffered (default: None, always buffer)
+        blob_dir: Directory for spooled bodies (default: ``<storage_path>.blobs``)
+        signing_mode: "entry" signs every row; "batch" signs one Merkle root per
+            background-writer batch (default: "entry"; requires background_writer)
+        shard_by: Callable ``shard_by(entry)`` returning the shard key for an entry
+            (``method``, ``path``, ``user``, ``status``). Each shard is an independent
+            chain in its own database and ``storage_path`` becomes the root holding the
+            anchors (default: None, one chain)
+        anchor_interval: Seconds between anchors of the shard heads (default: 60;
+            None disables the anchoring thread)
+        segment_interval: Roll the ledger over to a new segment file every "hourly",
+            "daily", "weekly" or number of seconds; ``storage_path`` becomes the root
+            of the segments (default: None)
+        segment_max_rows: Roll over once a segment holds this many entries (default: None)
+        profile: SQLite performance profile for every database: "durable", "balanced"
+            or "throughput" (default: None, ``AUDITTRAIL_PROFILE`` or "durable")
+        cipher: Payload cipher: "aes-256-gcm", "chacha20-poly1305" or "fernet"
+            (default: None, ``AUDITTRAIL_CIPHER`` or "aes-256-gcm")
+        compression: Compress bodies and responses before encryption: "zlib", "lzma" or
+            a registered codec (default: None, ``AUDITTRAIL_COMPRESSION`` or off)
+        compress_threshold: Smallest body plus response size, in bytes, that is
+            compressed (default: 256)
+        dedup: Store repeated bodies and responses once per ledger file and
+            reference them from the rows (default: None, on unless ``AUDITTRAIL_DEDUP=0``)
     
     Example:
         app = FastAPI()
         app.add_middleware(AuditTrailMiddleware, storage_path="audit_log.db", enable_compliance=True)
+
+        # High-throughput mode: the audit step is a queue put
+        app.add_middleware(AuditTrailMiddleware, storage_path="audit_log.db", background_writer=True)
+
+        # One signature per batch instead of per request
+        app.add_middleware(AuditTrailMiddleware, storage_path="audit_log.db",
+                           background_writer=True, signing_mode="batch")
+
+        # Bounded memory for large downloads/uploads
+        app.add_middleware(AuditTrailMiddleware, storage_path="audit_log.db", stream_threshold=1024 * 1024)
+
+        # One chain per top-level route, appended in parallel
+        app.add_middleware(AuditTrailMiddleware, storage_path="audit_log.db",
+                           background_writer=True, shard_by=route_prefix())
+
+        # A new ledger file every day
+        app.add_middleware(AuditTrailMiddleware, storage_path="audit_log.db", segment_interval="daily")
+
+        # Trade durability on power loss for commit speed
+        app.add_middleware(AuditTrailMiddleware, storage_path="audit_log.db", profile="balanced")
+
+        # Compress JSON payloads before encrypting them
+        app.add_middleware(AuditTrailMiddleware, storage_path="audit_log.db", compression="zlib")
     """
     
-    def __init__(self, app, storage_path="audit_log.db", enable_compliance=True):
-        super().__init__(app)
+    def __init__(self, app, storage_path="audit_log.db", enable_compliance=True,
+                 background_writer=False, queue_size=10000, batch_size=256,
+                 stream_threshold=None, blob_dir=None, signing_mode="entry",
+                 shard_by=None, anchor_interval=ANCHOR_INTERVAL, segment_interval=None,
+                 segment_max_rows=None, profile=None, cipher=None, compression=None,
+                 compress_threshold=None, dedup=None):
+        if signing_mode == "batch" and not background_writer:
+            raise ValueError("signing_mode='batch' requires background_writer=True")
+        if shard_by is not None and (segment_interval or segment_max_rows):
+            raise ValueError("shard_by cannot be combined with segment rollover")
+        if profile is not None:
+            set_profile(profile)
+        if cipher is not None:
+            set_cipher(cipher)
+        if compression is not None:
+            set_compression(compression, compress_threshold)
+        if dedup is not None:
+            set_dedup(dedup)
+        self.app = app
         self.storage_path = storage_path
         self.enable_compliance = enable_compliance
+        self.stream_threshold = stream_threshold
+        self.blob_dir = blob_dir or default_blob_dir(storage_path)
+        self.shard_by = shard_by
+        self.segment_interval = segment_interval
+        self.segment_max_rows = segment_max_rows
         self._init_db()
+
+        # One parsed signing key for the middleware's lifetime
+        self.signer = Signer() if enable_compliance and COMPLIANCE_AVAILABLE else None
+
+        # Background writers by ledger path: one, or one per shard
+        self.background_writer = background_writer
+        self._writer_options = {
+            "enable_compliance": enable_compliance,
+            "max_queue_size": queue_size,
+            "batch_size": batch_size,
+            "signer": self.signer,
+            "signing_mode": signing_mode,
+        }
+        self._writers = {}
+        self.writer = self._writer_for(storage_path) if background_writer and shard_by is None else None
+
+        self.anchorer = None
+        if shard_by is not None and anchor_interval:
+            self.anchorer = ShardAnchorer(storage_path, anchor_interval, self.signer)
+            self.anchorer.start()
         
         # Initialize signing keys if compliance is enabled
         if self.enable_compliance and COMPLIANCE_AVAILABLE:
@@ -54,112 +162,181 @@ class AuditTrailMiddleware(BaseHTTPMiddleware):
                 pass
 
     def _init_db(self):
-        conn = sqlite3.connect(self.storage_path)
-        
-        # Schema with optional compliance columns
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS ledger (
-        ts TEXT,
-        method TEXT,
-        path TEXT,
-        user TEXT,
-        status INT,
-        body TEXT,
-        response TEXT,
-        hash TEXT,
-        prev_hash TEXT,
-        key_id TEXT DEFAULT 'local',
-        signature TEXT,
-        timestamp_token TEXT,
-        worm_protected INTEGER DEFAULT 0
-        )
-        """)
-        conn.commit()
-        conn.close()
-
-    async def dispatch(self, request, call_next):
-        # --- capture body ---
-        raw_body = await request.body()
-        try:
-            body_json = json.loads(raw_body.decode()) if raw_body else {}
-        except Exception:
-            body_json = {"raw": str(raw_body)}
-        body_str = json.dumps(body_json, sort_keys=True)
+        if self.shard_by is not None:
+            # Shard databases are created on their first entry
+            init_shard_root(self.storage_path)
+            return
+        if self.segment_interval or self.segment_max_rows:
+            init_segmented_ledger(self.storage_path, self.segment_interval, self.segment_max_rows)
+        if is_segment_root(connection(self.storage_path)):
+            # Each segment's head is validated on its first append
+            return
 
-        # --- call the endpoint ---
-        response = await call_next(request)
-        response_body = b"".join([chunk async for chunk in response.body_iterator]) or b""
-        async def new_body_iterator():
-            yield response_body
+        _ensure_db(self.storage_path)
 
-        response.body_iterator = new_body_iterator()
+        # Validate the cached chain head against the ledger tail once at startup
+        load_chain_head(connection(self.storage_path), self.storage_path)
 
-        # --- encrypt request/response ---
-        enc_body = CIPHER.encrypt(body_str.encode()).decode()
-        enc_response = CIPHER.encrypt(response_body).decode()
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan" and (self.background_writer or self.anchorer is not None):
+            await self.app(scope, self._lifespan_receive(receive), send)
+            return
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-        # --- hash chain ---
-        conn = sqlite3.connect(self.storage_path)
-        cur = conn.cursor()
-        cur.execute("SELECT hash FROM ledger ORDER BY ts DESC LIMIT 1")
-        prev = cur.fetchone()
-        prev_hash = prev[0] if prev else ""
+        cipher = get_cipher()
+        request_spool = BodySpool(self.blob_dir, cipher, self.stream_threshold)
+        response_spool = BodySpool(self.blob_dir, cipher, self.stream_threshold)
+        response_status = [500]
+        recorded = [False]
 
-        ts = datetime.now(timezone.utc).isoformat()
-        key_id = os.getenv("AUDITTRAIL_KEY_ID", "local")
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request":
+                request_spool.write(message.get("body", b""))
+            return message
 
-        entry_str = f"{ts}|{request.method}|{request.url.path}|{request.client.host}|{response.status_code}|{enc_body}|{enc_response}|{prev_hash}|{key_id}"
-        entry_hash = hashlib.sha256(entry_str.encode()).hexdigest()
+        async def send_wrapper(message):
+            await send(message)
+            if message["type"] == "http.response.start":
+                response_status[0] = message["status"]
+            elif message["type"] == "http.response.body":
+                response_spool.write(message.get("body", b""))
+                if not message.get("more_body", False):
+                    recorded[0] = True
+                    await self._record(scope, cipher, request_spool, response_status[0], response_spool)
 
-        # --- Compliance features (optional) ---
-        signature = None
-        timestamp_token = None
-        worm_protected = 0
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            if not recorded[0]:
+                request_spool.abort()
+                response_spool.abort()
 
-        if self.enable_compliance and COMPLIANCE_AVAILABLE:
-            # Digital signature
-            try:
-                signature_data = {
-                    "ts": ts,
-                    "method": request.method,
-                    "path": request.url.path,
-                    "user": request.client.host,
-                    "status": response.status_code,
-                    "hash": entry_hash,
-                    "prev_hash": prev_hash
-                }
-                signature = sign_entry(signature_data)
-            except Exception as e:
-                record_anomaly("signature_error", "high",
-                             f"Failed to sign entry: {str(e)}", self.storage_path)
-
-            # Timestamp
+    def _lifespan_receive(self, receive):
+        """Flush the background writers (and anchor the shards) when the server shuts down."""
+        async def wrapper():
+            message = await receive()
+            if message["type"] == "lifespan.shutdown":
+                # Drain every writer and anchor what was committed before
+                # reporting entries that could not be written
+                errors = []
+                for writer in list(self._writers.values()):
+                    try:
+                        writer.flush()
+                    except LedgerWriteError as e:
+                        errors.append(e)
+                if self.anchorer is not None:
+                    self.anchorer.anchor()
+                if errors:
+                    raise errors[0]
+            return message
+        return wrapper
+
+    def _ledger_path(self, entry):
+        """Database the entry is chained into: the storage path or its shard."""
+        if self.shard_by is None:
+            return self.storage_path
+        return shard_path(self.storage_path, str(self.shard_by(entry)))
+
+    def _writer_for(self, ledger_path):
+        writer = self._writers.get(ledger_path)
+        if writer is None:
+            writer = self._writers.setdefault(
+                ledger_path, LedgerWriter(ledger_path, **self._writer_options)
+            )
+        return writer
+
+    async def _record(self, scope, cipher, request_spool, status_code, response_spool):
+        # --- request (spooled bodies are already encrypted in the blob) ---
+        body = None
+        if not request_spool.spooled:
+            raw_body = request_spool.getvalue()
             try:
-                ts_info = create_local_timestamp(entry_hash, {"path": request.url.path})
-                timestamp_token = ts_info["token"]
+                body_json = json.loads(raw_body.decode()) if raw_body else {}
             except Exception:
-                pass
+                body_json = {"raw": str(raw_body)}
+            body = json.dumps(body_json, sort_keys=True).encode()
+
+        # --- response ---
+        response = None if response_spool.spooled else response_spool.getvalue()
+
+        # --- compress (if enabled), then encrypt ---
+        compression, (body, response) = compress_payloads([body, response])
+        enc_body = request_spool.close() if body is None else cipher.encrypt(body)
+        enc_response = response_spool.close() if response is None else cipher.encrypt(response)
+        payload_ids = (payload_id(body, compression), payload_id(response, compression))
+
+        client = scope.get("client")
+        entry = {
+            "method": scope["method"],
+            "path": scope["path"],
+            "user": client[0] if client else None,
+            "status": status_code,
+            "body": enc_body,
+            "response": enc_response,
+            "key_id": cipher.key_id,
+            "compression": compression,
+            "payload_ids": payload_ids,
+            "timestamp_metadata": {"path": scope["path"]}
+        }
 
-            worm_protected = 1
+        ledger_path = self._ledger_path(entry)
+        if self.background_writer:
+            await self._writer_for(ledger_path).submit_async(entry)
+        else:
+            on_active_segment(ledger_path, lambda path: self._write_entry(entry, path))
 
-        # --- Insert entry ---
-        cur.execute(
-            "INSERT INTO ledger (ts, method, path, user, status, body, response, hash, prev_hash, key_id, signature, timestamp_token, worm_protected) "
-            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-            (ts, request.method, request.url.path, request.client.host,
-            response.status_code, enc_body, enc_response, entry_hash, prev_hash, key_id,
-            signature, timestamp_token, worm_protected),
-        )
+    def _write_entry(self, entry, ledger_path=None):
+        """Chain and insert a single entry synchronously."""
+        ledger_path = ledger_path or self.storage_path
+        # --- hash chain ---
+        with chain_lock(ledger_path):
+            # The write lock is held from reading the head to the commit
+            with write_cursor(ledger_path, _create_ledger_schema) as cur:
+                prev_seq, prev_hash = get_chain_head(cur.connection, ledger_path)
+
+                ts = datetime.now(timezone.utc).isoformat()
+
+                # Repeated payloads are stored once and the row references them
+                body, response = (
+                    store_payload(cur.connection, value, content_id)
+                    for value, content_id in zip((entry["body"], entry["response"]), entry["payload_ids"])
+                )
+
+                entry_hash, body_digest, response_digest = _hash_entry(
+                    ts, entry["method"], entry["path"], entry["user"], entry["status"],
+                    body, response, prev_hash, entry["key_id"]
+                )
 
-        row_id = cur.lastrowid
-        conn.commit()
-        conn.close()
+                # --- Compliance features (optional) ---
+                signature, timestamp_token, worm_protected = _seal_compliance(
+                    ledger_path, ts, entry["method"], entry["path"], entry["user"], entry["status"],
+                    entry_hash, prev_hash, entry["timestamp_metadata"], self.enable_compliance,
+                    self.signer
+                )
+
+                # --- Insert entry ---
+                cur.execute(
+                    INSERT_SQL,
+                    _storage_row((ts, entry["method"], entry["path"], entry["user"],
+                    entry["status"], body, response, entry_hash, prev_hash, entry["key_id"],
+                    signature, timestamp_token, worm_protected, FORMAT_VERSION, body_digest, response_digest,
+                    entry["compression"]),
+                    _blob_hashes(cur.connection)),
+                )
+
+                row_id = cur.lastrowid
+                store_data_keys(cur.connection, (body, response))
+                advance_chain_head(cur, row_id, entry_hash)
+                extend_merkle_index(cur, prev_seq, [(row_id, entry_hash)])
+
+            set_cached_head(ledger_path, row_id, entry_hash)
 
         # Apply WORM protection
         if worm_protected and COMPLIANCE_AVAILABLE:
             try:
-                protect_entry(self.storage_path, entry_hash, row_id, {"ts": ts})
+                protect_entry(ledger_path, entry_hash, row_id, {"ts": ts})
             except Exception:
                 pass
-
-        return response
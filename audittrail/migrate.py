@@ -0,0 +1,161 @@
+"""
+Online migration of ledger databases to the current schema.
+
+Schema 1 ledgers (no version marker) have no primary key or indexes and
+store hashes as hex TEXT. :func:`migrate_ledger` upgrades them to schema
+2 without stopping the application:
+
+1. Rows are copied in short batches into a ``ledger_new`` table with the
+   schema 2 layout. Every batch is its own transaction, so writers are
+   only held up for one batch at a time. Rowids are kept as ``seq``, so
+   the chain head, Merkle index, checkpoints and WORM records stay valid.
+2. Under the chain lock and an IMMEDIATE transaction, the rows appended
+   since the last batch are copied, the tables are swapped and
+   ``PRAGMA user_version`` is set, all in one commit.
+3. The old table is dropped.
+
+An interrupted migration resumes from the last copied row. Rows are
+append-only, so a row changed in the old table after it was copied is not
+carried over; verify the ledger before migrating.
+"""
+
+import time
+from typing import Dict, Any
+
+from .chain import chain_lock, hash_blob
+from .ledger import (
+    LEDGER_SCHEMA_VERSION, _create_ledger_table, _ensure_db, ledger_schema_version
+)
+from .store import begin_immediate, connection, cursor
+
+
+# Rows copied per transaction
+MIGRATE_BATCH_SIZE = 10000
+
+_NEW_TABLE = "ledger_new"
+_OLD_TABLE = "ledger_old"
+
+# Columns carried over, in schema 2 order (seq is the old rowid)
+_COLUMNS = (
+    "ts", "method", "path", "user", "status", "hash", "prev_hash", "key_id", "signature",
+    "timestamp_token", "worm_protected", "format_version", "body_digest", "response_digest",
+    "compression", "body", "response",
+)
+_SELECT_SQL = f"SELECT rowid, {', '.join(_COLUMNS)} FROM ledger WHERE rowid > ? ORDER BY rowid ASC LIMIT ?"
+_INSERT_SQL = (
+    f"INSERT INTO {_NEW_TABLE} (seq, {', '.join(_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * (len(_COLUMNS) + 1))})"
+)
+
+
+def _table_exists(conn, name) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone() is not None
+
+
+def _copy_batch(conn, last_seq, batch_size):
+    """Copy up to ``batch_size`` rows after ``last_seq``; returns (rows copied, new last_seq)."""
+    rows = conn.execute(_SELECT_SQL, (last_seq, batch_size)).fetchall()
+    if not rows:
+        return 0, last_seq
+    conn.executemany(
+        _INSERT_SQL,
+        [row[:6] + (hash_blob(row[6]), hash_blob(row[7])) + row[8:] for row in rows]
+    )
+    return len(rows), rows[-1][0]
+
+
+def _drop_old_table(db_path):
+    with cursor(db_path) as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {_OLD_TABLE}")
+
+
+def migrate_ledger(db_path: str, batch_size: int = MIGRATE_BATCH_SIZE, on_progress=None,
+                   keep_old: bool = False) -> Dict[str, Any]:
+    """
+    Upgrade a ledger database to the current schema while it stays in use.
+
+    Safe to re-run: a finished migration is a no-op and an interrupted one
+    resumes where it stopped.
+
+    Args:
+        db_path: Ledger database path
+        batch_size: Rows copied per transaction (default: 10000)
+        on_progress: Callback ``on_progress(rows_copied, total_rows)`` called
+            after every batch
+        keep_old: Keep the schema 1 table as ``ledger_old`` (default: False)
+
+    Returns:
+        Dictionary with migrated (bool), schema_version, rows_copied,
+        resumed_from (seq of the last row copied by an earlier run) and
+        seconds
+
+    Example:
+        result = migrate_ledger("audit_log.db")
+        print(f"Copied {result['rows_copied']} rows")
+    """
+    started = time.time()
+    _ensure_db(db_path)
+    conn = connection(db_path)
+
+    if ledger_schema_version(conn) >= LEDGER_SCHEMA_VERSION:
+        # Finish a migration that stopped after the swap
+        if not keep_old and _table_exists(conn, _OLD_TABLE):
+            _drop_old_table(db_path)
+        return {
+            "migrated": False,
+            "schema_version": ledger_schema_version(conn),
+            "rows_copied": 0,
+            "resumed_from": None,
+            "seconds": time.time() - started,
+        }
+
+    with cursor(db_path) as cur:
+        _create_ledger_table(cur.connection, _NEW_TABLE)
+
+    (resumed_from,) = conn.execute(f"SELECT MAX(seq) FROM {_NEW_TABLE}").fetchone()
+    last_seq = resumed_from or 0
+    (total,) = conn.execute("SELECT COUNT(*) FROM ledger").fetchone()
+    (copied,) = conn.execute(f"SELECT COUNT(*) FROM {_NEW_TABLE}").fetchone()
+
+    # Bulk copy in short transactions while writers keep appending
+    while True:
+        with cursor(db_path) as cur:
+            count, last_seq = _copy_batch(cur.connection, last_seq, batch_size)
+        copied += count
+        if on_progress is not None and count:
+            on_progress(copied, max(total, copied))
+        if count < batch_size:
+            break
+
+    # Copy the tail and swap atomically; other processes' writers wait on
+    # the IMMEDIATE lock, this process's on the chain lock
+    with chain_lock(db_path):
+        begin_immediate(conn)
+        try:
+            while True:
+                count, last_seq = _copy_batch(conn, last_seq, batch_size)
+                copied += count
+                if count < batch_size:
+                    break
+            conn.execute(f"ALTER TABLE ledger RENAME TO {_OLD_TABLE}")
+            conn.execute(f"ALTER TABLE {_NEW_TABLE} RENAME TO ledger")
+            conn.execute(f"PRAGMA user_version = {LEDGER_SCHEMA_VERSION}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    if on_progress is not None:
+        on_progress(copied, copied)
+    if not keep_old:
+        _drop_old_table(db_path)
+
+    return {
+        "migrated": True,
+        "schema_version": LEDGER_SCHEMA_VERSION,
+        "rows_copied": copied,
+        "resumed_from": resumed_from,
+        "seconds": time.time() - started,
+    }
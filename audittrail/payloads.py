@@ -0,0 +1,182 @@
+"""
+Content-addressed store for repeated payloads.
+
+Health checks, static configuration and error bodies come back identical
+on every request. Instead of storing their ciphertext again in every
+ledger row, a payload is stored once in the ``payloads`` table of the
+ledger file, keyed by an HMAC of its plaintext, and rows hold a
+51-character reference, ``payload:`` and the base64url form of:
+
+- the id, 16 bytes of HMAC-SHA256 under a key derived from the master
+  key, so equal payloads share an id without the id revealing guessable
+  plaintext;
+- 16 bytes of the SHA-256 of the stored ciphertext. The row's digest
+  covers the reference, so the hash chain commits to the payload as
+  before, and ``verify_payloads`` checks the stored ciphertext against
+  it without decrypting.
+
+Payloads smaller than ``DEDUP_MIN_SIZE`` stay inline, as do spooled
+blobs. Each shard and segment file has its own table.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import sqlite3
+from typing import Optional
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+from .cipher import load_master_key, store_data_keys
+from .store import connection
+
+
+PAYLOAD_PREFIX = "payload:"
+
+# Plaintext size below which a payload is stored inline: its reference
+# would be about as large as the ciphertext
+DEDUP_MIN_SIZE = 64
+DEDUP = os.getenv("AUDITTRAIL_DEDUP", "1") != "0"
+
+_ID_SIZE = 16
+
+_dedup = DEDUP
+_dedup_min_size = DEDUP_MIN_SIZE
+_hmac_key = None
+
+
+def set_dedup(enabled: bool, min_size: Optional[int] = None):
+    """
+    Turn payload deduplication on or off for new rows.
+
+    Args:
+        enabled: Store repeated payloads once (default: on, ``AUDITTRAIL_DEDUP=0`` turns it off)
+        min_size: Smallest plaintext, in bytes, that is deduplicated
+            (default: unchanged, initially ``DEDUP_MIN_SIZE``)
+    """
+    global _dedup, _dedup_min_size
+    _dedup = enabled
+    if min_size is not None:
+        _dedup_min_size = min_size
+
+
+def _key() -> bytes:
+    global _hmac_key
+    if _hmac_key is None:
+        _hmac_key = HKDF(
+            algorithm=hashes.SHA256(), length=32, salt=None, info=b"audittrail payload dedup"
+        ).derive(load_master_key())
+    return _hmac_key
+
+
+def payload_id(data: bytes, compression: Optional[str] = None) -> Optional[bytes]:
+    """
+    Content id of a payload about to be encrypted, or None to store it inline.
+
+    Args:
+        data: Plaintext as it will be encrypted (after compression)
+        compression: Codec it was compressed with; the same plaintext
+            compressed differently gets a different id
+    """
+    if not _dedup or data is None or len(data) < _dedup_min_size:
+        return None
+    message = (compression or "").encode() + b"\0" + data
+    return hmac.new(_key(), message, hashlib.sha256).digest()[:_ID_SIZE]
+
+
+def ensure_payload_table(conn):
+    """Create the content-addressed payload table in a ledger database."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS payloads (
+        id BLOB PRIMARY KEY,
+        data BLOB NOT NULL
+    )
+    """)
+
+
+def is_payload_ref(value) -> bool:
+    """Check whether a stored body/response value is a payload reference."""
+    return isinstance(value, str) and value.startswith(PAYLOAD_PREFIX)
+
+
+def parse_payload_ref(ref: str):
+    """Split a payload reference into (id, truncated ciphertext digest)."""
+    encoded = ref[len(PAYLOAD_PREFIX):]
+    raw = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+    return raw[:_ID_SIZE], raw[_ID_SIZE:]
+
+
+def _digest(data) -> bytes:
+    return hashlib.sha256(data.encode() if isinstance(data, str) else data).digest()[:_ID_SIZE]
+
+
+def _payload_ref(content_id: bytes, data) -> str:
+    return PAYLOAD_PREFIX + base64.urlsafe_b64encode(content_id + _digest(data)).rstrip(b"=").decode()
+
+
+def store_payload(conn, value, content_id: Optional[bytes]):
+    """
+    Store an encrypted payload once and return what the ledger row holds.
+
+    Called inside the write transaction that inserts the row. When the
+    payload is already stored, the new ciphertext is dropped and the
+    reference points at the stored one.
+
+    Args:
+        conn: Connection with an open write transaction
+        value: Encrypted payload
+        content_id: Id from :func:`payload_id`, or None to keep it inline
+
+    Returns:
+        A payload reference, or ``value`` when stored inline
+    """
+    if content_id is None:
+        return value
+    insert = "INSERT OR IGNORE INTO payloads (id, data) VALUES (?, ?)"
+    try:
+        cur = conn.execute(insert, (content_id, value))
+    except sqlite3.OperationalError:
+        # Ledger created before payload deduplication
+        ensure_payload_table(conn)
+        cur = conn.execute(insert, (content_id, value))
+    if cur.rowcount:
+        store_data_keys(conn, (value,))
+        data = value
+    else:
+        (data,) = conn.execute("SELECT data FROM payloads WHERE id = ?", (content_id,)).fetchone()
+    return _payload_ref(content_id, data)
+
+
+def load_payload(value, db_path: str):
+    """
+    The stored encrypted payload for a ledger value, following payload references.
+
+    Args:
+        value: Stored body/response
+        db_path: Ledger it was read from, or the root of a segmented ledger
+    """
+    if not is_payload_ref(value):
+        return value
+    from .segments import ledger_files
+
+    content_id, _ = parse_payload_ref(value)
+    for path in ledger_files(db_path):
+        try:
+            row = connection(path).execute("SELECT data FROM payloads WHERE id = ?", (content_id,)).fetchone()
+        except sqlite3.OperationalError:
+            continue
+        if row is not None:
+            return row[0]
+    raise KeyError(f"Payload {content_id.hex()} not found in {db_path}")
+
+
+def verify_payload_ref(conn, ref: str) -> bool:
+    """Check that a referenced payload is stored and matches the digest in its reference."""
+    content_id, digest = parse_payload_ref(ref)
+    try:
+        row = conn.execute("SELECT data FROM payloads WHERE id = ?", (content_id,)).fetchone()
+    except sqlite3.OperationalError:
+        return False
+    return row is not None and _digest(row[0]) == digest
@@ -0,0 +1,479 @@
+"""
+Key rotation by re-encrypting a ledger into a new file.
+
+The hash chain covers the stored ciphertext, so payloads cannot be
+re-encrypted in place. :func:`rotate_ledger` writes a rotated copy of a
+ledger instead:
+
+1. The whole source is verified, ignoring checkpoints, so a rotation
+   never carries tampered rows into a chain that would vouch for them.
+   Every row is checked again as it is rotated: its hash and its link to
+   the row before, which also covers rows appended after the first pass.
+2. Rows are streamed in seq ranges of ``chunk_size``. Worker processes
+   read a range, decrypt every body/response (following payload and blob
+   references, each checked against the digest the chain covers) and
+   re-encrypt it under the new master key, without decompressing.
+3. The parent chains the results in seq order and commits one range per
+   transaction into the new file, keeping seqs. Rows that were signed,
+   timestamped or WORM-protected are sealed again over their new hashes
+   (one Merkle-root signature per range).
+4. Once the source tail is reached, under its write lock, a signed
+   rotation record linking the old and new chain heads is stored in the
+   new file's ``key_rotations`` table, along with the records of earlier
+   rotations.
+
+An interrupted rotation resumes after the last committed seq. Standalone
+ledger files are rotated on their own; the shards and segments of a
+sharded or segmented ledger are anchored to their current heads and
+cannot be rotated one by one.
+
+Usage:
+    result = rotate_ledger("audit_log.db", key_id="2025-q4", workers=None)
+    # stop writers, then put result["path"] in place of audit_log.db
+"""
+
+import json
+import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from .blobstore import BlobWriter, default_blob_dir, is_blob_ref, iter_blob, verify_blob
+from .chain import (
+    advance_chain_head, chain_base, chain_lock, get_chain_head, hash_hex, set_cached_head
+)
+from .cipher import (
+    CIPHERS, EnvelopeCipher, FernetCipher, data_key_records, decrypt_payload, get_cipher,
+    load_data_key_record, store_data_keys
+)
+from .key_manager import get_keyring
+from .key_rotations import record_message
+from .ledger import (
+    COMPLIANCE_AVAILABLE, FORMAT_VERSION, INSERT_SQL, _ensure_db, _hash_entry, _ledger_columns,
+    _protect_batch, _recompute_hash, _sign_batch, _storage_row, _timestamp_batch, payload_digest,
+    verify_ledger
+)
+from .merkle_index import extend_merkle_index
+from .payloads import is_payload_ref, load_payload, payload_id, store_payload, verify_payload_ref
+from .segments import is_segment_root
+from .shards import is_shard_root
+from .store import begin_immediate, connection, cursor, write_cursor
+
+if COMPLIANCE_AVAILABLE:
+    from .signatures import get_signer, initialize_signing_keys
+
+
+# Rows re-encrypted per worker task and committed per transaction
+ROTATE_CHUNK_SIZE = 2000
+
+# Source columns read for each row, with the value used when a column does
+# not exist (ledgers written by older releases)
+_SOURCE_COLUMNS = (
+    ("ts", None), ("method", None), ("path", None), ("user", None), ("status", None),
+    ("hash", None), ("prev_hash", None), ("key_id", "'local'"), ("signature", "NULL"), ("timestamp_token", "NULL"),
+    ("worm_protected", "0"), ("format_version", "1"), ("body_digest", "NULL"),
+    ("response_digest", "NULL"), ("compression", "NULL"), ("body", None), ("response", None),
+)
+
+# INSERT_SQL with the source seq kept
+_INSERT_SQL = INSERT_SQL.replace("INSERT INTO ledger (", "INSERT INTO ledger (seq, ").replace(
+    "VALUES (", "VALUES (?, "
+)
+
+# Cipher of a worker process, see _init_worker
+_target = None
+
+
+def _create_rotation_tables(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS rotation_info (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        source TEXT NOT NULL,
+        key_id TEXT NOT NULL,
+        cipher TEXT NOT NULL,
+        from_key_ids TEXT NOT NULL,
+        started_at TEXT NOT NULL,
+        completed_at TEXT
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS key_rotations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        record TEXT NOT NULL
+    )
+    """)
+
+
+def default_rotation_path(db_path: str) -> str:
+    """Where a rotated copy of ``db_path`` is written when no path is given."""
+    root, ext = os.path.splitext(db_path)
+    return f"{root}.rotated{ext or '.db'}"
+
+
+def _source_select(conn) -> str:
+    columns = _ledger_columns(conn)
+    return ", ".join(
+        name if default is None or name in columns else default for name, default in _SOURCE_COLUMNS
+    )
+
+
+def _init_worker(key_id: str, cipher: str):
+    """
+    Build the cipher rows are re-encrypted with in this process.
+
+    Every process gets its own envelope cipher, and so its own data keys,
+    instead of sharing the data key of a cipher inherited through fork().
+    """
+    global _target
+    if cipher == "fernet":
+        _target = FernetCipher(key_id)
+    else:
+        _target = EnvelopeCipher(cipher, master_key=get_keyring().key(key_id), key_id=key_id)
+
+
+def _rotate_value(conn, db_path, out_path, seq, value, digest, row_key_id, compression):
+    """
+    Re-encrypt one stored body/response.
+
+    Returns:
+        Tuple of (new value, content id for ``store_payload``)
+    """
+    if digest is not None and payload_digest(value) != digest:
+        raise ValueError(f"Row {seq}: payload does not match the digest the chain covers")
+    if not value:
+        return value, None
+
+    if is_blob_ref(value):
+        blob_dir = default_blob_dir(db_path)
+        if not verify_blob(blob_dir, value):
+            raise ValueError(f"Row {seq}: blob does not match its reference")
+        writer = BlobWriter(default_blob_dir(out_path), _target)
+        try:
+            for chunk in iter_blob(blob_dir, value):
+                writer.write(chunk)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.close(), None
+
+    if is_payload_ref(value):
+        if not verify_payload_ref(conn, value):
+            raise ValueError(f"Row {seq}: stored payload does not match its reference")
+        value = load_payload(value, db_path)
+    data = decrypt_payload(value, db_path, row_key_id)
+    return _target.encrypt(data), payload_id(data, compression)
+
+
+def _rotate_range(task):
+    """
+    Decrypt and re-encrypt the rows with ``lo < seq <= hi``.
+
+    Each row's hash is recomputed and its prev_hash checked against the row
+    before it (the last row at or before ``lo`` for the first one), as
+    ``verify_ledger`` does.
+
+    Returns:
+        Tuple of (rows, data key records), where each row is (seq, ts,
+        method, path, user, status, body, body id, response, response id,
+        compression, signed, timestamped, worm_protected, old key id)
+    """
+    db_path, out_path, lo, hi, columns = task
+    conn = connection(db_path)
+    seed = conn.execute(
+        "SELECT hash FROM ledger WHERE rowid <= ? ORDER BY rowid DESC LIMIT 1", (lo,)
+    ).fetchone()
+    last_hash = hash_hex(seed[0]) if seed else chain_base(conn)[1]
+    rows = []
+    for seq, *r in conn.execute(
+        f"SELECT rowid, {columns} FROM ledger WHERE rowid > ? AND rowid <= ? ORDER BY rowid ASC", (lo, hi)
+    ):
+        (ts, method, path, user, status, entry_hash, prev_hash, key_id, signature, timestamp_token,
+         worm_protected, format_version, body_digest, response_digest, compression, body, response) = r
+        entry_hash, prev_hash = hash_hex(entry_hash), hash_hex(prev_hash)
+        if prev_hash != last_hash:
+            raise ValueError(f"Row {seq}: previous hash mismatch; not rotating a broken chain")
+        computed = _recompute_hash(ts, method, path, user, int(status), body, response, prev_hash, key_id,
+                                   format_version, body_digest, response_digest)
+        if computed != entry_hash:
+            raise ValueError(f"Row {seq}: hash mismatch; not rotating a tampered row")
+        last_hash = entry_hash
+        if not (format_version and format_version >= 2):
+            # Format 1 rows are chained over the payloads themselves
+            body_digest = response_digest = None
+        body, body_id = _rotate_value(conn, db_path, out_path, seq, body, body_digest, key_id, compression)
+        response, response_id = _rotate_value(
+            conn, db_path, out_path, seq, response, response_digest, key_id, compression
+        )
+        rows.append((seq, ts, method, path, user, int(status), body, body_id, response, response_id,
+                     compression, bool(signature), bool(timestamp_token), int(worm_protected or 0), key_id))
+
+    # The parent stores the data keys with the rows; it does not share this process's cache
+    return rows, data_key_records(value for row in rows for value in (row[6], row[8]))
+
+
+def _iter_results(tasks, workers, key_id, cipher):
+    """Run rotation tasks, in a process pool if ``workers`` > 1, yielding results in order."""
+    if workers == 1:
+        for task in tasks:
+            yield _rotate_range(task)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(key_id, cipher)) as pool:
+        # A bounded window keeps memory flat however large the ledger is
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(_rotate_range, task))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _write_rows(out_path, rows, records, key_id, compliance, signer):
+    """Chain re-encrypted rows onto the new ledger and commit them in one transaction."""
+    for record in records:
+        load_data_key_record(record)
+    with chain_lock(out_path):
+        with write_cursor(out_path) as cur:
+            prev_seq, prev_hash = get_chain_head(cur.connection, out_path)
+            chained = []
+            for (seq, ts, method, path, user, status, body, body_id, response, response_id,
+                 compression, signed, timestamped, worm_protected, _) in rows:
+                body = store_payload(cur.connection, body, body_id)
+                response = store_payload(cur.connection, response, response_id)
+                entry_hash, body_digest, response_digest = _hash_entry(
+                    ts, method, path, user, status, body, response, prev_hash, key_id
+                )
+                chained.append((
+                    ts, method, path, user, status, body, response, entry_hash, prev_hash, key_id,
+                    None, None, worm_protected if compliance else 0, FORMAT_VERSION,
+                    body_digest, response_digest, compression
+                ))
+                prev_hash = entry_hash
+
+            if compliance:
+                # Seal again what was sealed: signatures and timestamps over the new hashes
+                signed = [i for i, row in enumerate(rows) if row[11]]
+                if signed:
+                    signatures = _sign_batch(out_path, [chained[i] for i in signed], signer)
+                    for i, signature in zip(signed, signatures):
+                        chained[i] = chained[i][:10] + (signature,) + chained[i][11:]
+                stamped = [i for i, row in enumerate(rows) if row[12]]
+                if stamped:
+                    tokens = _timestamp_batch([chained[i] for i in stamped],
+                                              [{"db": out_path, "ts": chained[i][0]} for i in stamped])
+                    for i, token in zip(stamped, tokens):
+                        chained[i] = chained[i][:11] + (token,) + chained[i][12:]
+
+            seqs = [row[0] for row in rows]
+            cur.executemany(_INSERT_SQL, [(seq,) + _storage_row(row, True) for seq, row in zip(seqs, chained)])
+            store_data_keys(cur.connection, (value for row in chained for value in row[5:7]))
+            advance_chain_head(cur, seqs[-1], prev_hash)
+            extend_merkle_index(cur, prev_seq, [(seq, row[7]) for seq, row in zip(seqs, chained)])
+            (from_key_ids,) = cur.execute("SELECT from_key_ids FROM rotation_info WHERE id = 1").fetchone()
+            from_key_ids = set(json.loads(from_key_ids)) | {row[14] or "local" for row in rows}
+            cur.execute("UPDATE rotation_info SET from_key_ids = ? WHERE id = 1",
+                        (json.dumps(sorted(from_key_ids)),))
+        set_cached_head(out_path, seqs[-1], prev_hash)
+
+    if compliance:
+        _protect_batch(out_path, chained, seqs)
+
+
+def _start(db_path, out_path, key_id, cipher):
+    """Create the new ledger file, or check that an existing one continues this rotation."""
+    _ensure_db(out_path)
+    conn = connection(out_path, _create_rotation_tables)
+    info = conn.execute("SELECT source, key_id, cipher, completed_at FROM rotation_info WHERE id = 1").fetchone()
+    source = os.path.abspath(db_path)
+    if info is None:
+        (rows,) = conn.execute("SELECT COUNT(*) FROM ledger").fetchone()
+        if rows:
+            raise ValueError(f"{out_path} already holds a ledger; choose another output path")
+        with cursor(out_path) as cur:
+            cur.execute(
+                "INSERT INTO rotation_info (id, source, key_id, cipher, from_key_ids, started_at) "
+                "VALUES (1, ?, ?, ?, '[]', ?)",
+                (source, key_id, cipher, datetime.now(timezone.utc).isoformat())
+            )
+            # Keep the history of earlier rotations
+            try:
+                previous = connection(db_path).execute("SELECT record FROM key_rotations ORDER BY id").fetchall()
+            except sqlite3.OperationalError:
+                previous = []
+            cur.executemany("INSERT INTO key_rotations (record) VALUES (?)", previous)
+        return None
+    if tuple(info[:3]) != (source, key_id, cipher):
+        raise ValueError(
+            f"{out_path} holds a rotation of {info[0]} to key {info[1]!r} ({info[2]}); "
+            "remove it to start over"
+        )
+    return info[3]
+
+
+def _finish(db_path, out_path, key_id, cipher, columns, signer, compliance) -> Dict[str, Any]:
+    """Rotate the source tail under its write lock and store the signed rotation record."""
+    src = connection(db_path)
+    with chain_lock(db_path):
+        begin_immediate(src)
+        try:
+            last_seq = get_chain_head(connection(out_path), out_path)[0]
+            (max_seq,) = src.execute("SELECT MAX(rowid) FROM ledger").fetchone()
+            if max_seq is not None and max_seq > last_seq:
+                rows, records = _rotate_range((db_path, out_path, last_seq, max_seq, columns))
+                if rows:
+                    _write_rows(out_path, rows, records, key_id, compliance, signer)
+
+            tail = src.execute("SELECT rowid, hash FROM ledger ORDER BY rowid DESC LIMIT 1").fetchone()
+            old_seq, old_hash = (tail[0], hash_hex(tail[1])) if tail else chain_base(src)
+            (entries,) = src.execute("SELECT COUNT(*) FROM ledger").fetchone()
+            new_seq, new_hash = get_chain_head(connection(out_path), out_path)
+            started_at, from_key_ids = connection(out_path).execute(
+                "SELECT started_at, from_key_ids FROM rotation_info WHERE id = 1"
+            ).fetchone()
+
+            record = {
+                "source": os.path.basename(db_path),
+                "old_seq": old_seq,
+                "old_hash": old_hash,
+                "new_seq": new_seq,
+                "new_hash": new_hash,
+                "entries": entries,
+                "from_key_ids": json.loads(from_key_ids),
+                "key_id": key_id,
+                "cipher": cipher,
+                "started_at": started_at,
+                "completed_at": datetime.now(timezone.utc).isoformat(),
+                "signature": None,
+            }
+            if COMPLIANCE_AVAILABLE:
+                initialize_signing_keys()
+                record["signature"] = (signer or get_signer()).sign(record_message(record))
+            with cursor(out_path) as cur:
+                cur.execute("INSERT INTO key_rotations (record) VALUES (?)", (json.dumps(record),))
+                cur.execute("UPDATE rotation_info SET completed_at = ? WHERE id = 1", (record["completed_at"],))
+        finally:
+            # Nothing was written to the source; this only releases its lock
+            src.rollback()
+    return record
+
+
+def rotate_ledger(db_path: str, out_path: Optional[str] = None, key_id: Optional[str] = None,
+                  cipher: Optional[str] = None, workers: Optional[int] = 1,
+                  chunk_size: int = ROTATE_CHUNK_SIZE, verify: bool = True,
+                  enable_compliance: bool = True, on_progress=None, signer=None) -> Dict[str, Any]:
+    """
+    Re-encrypt a ledger under another master key into a new ledger file.
+
+    Safe to re-run: an interrupted rotation resumes after the last
+    committed row, and a finished one is a no-op.
+
+    Args:
+        db_path: Standalone ledger database to rotate
+        out_path: New ledger file (default: ``<name>.rotated.db`` next to it)
+        key_id: Master key to encrypt under (default: the keyring's current key)
+        cipher: One of ``cipher.CIPHERS`` (default: the current cipher)
+        workers: Worker processes (default: 1, serial; None uses every CPU)
+        chunk_size: Rows per worker task and per transaction (default: 2000)
+        verify: Verify the source ledger first (default: True)
+        enable_compliance: Re-sign, timestamp and WORM-protect the rows that
+            were (default: True)
+        on_progress: Callback ``on_progress(rows_rotated, total_rows)``
+            called after every chunk
+        signer: Signer to use (default: the shared process-wide signer)
+
+    Returns:
+        Dictionary with rotated (bool), path, rows_rotated, resumed_from
+        (seq of the last row rotated by an earlier run), record (the signed
+        rotation record) and seconds
+
+    Raises:
+        ValueError: If the source is a shard or segment root, does not
+            verify, or a payload does not match its digest
+
+    Example:
+        result = rotate_ledger("audit_log.db", key_id="2025-q4", workers=None)
+        print(f"Rotated {result['rows_rotated']} rows into {result['path']}")
+    """
+    started = time.time()
+    out_path = out_path or default_rotation_path(db_path)
+    key_id = key_id or get_keyring().current
+    cipher = cipher or get_cipher().name
+    if cipher not in CIPHERS:
+        raise ValueError(f"cipher must be one of {CIPHERS}, got {cipher!r}")
+    # Fail before any work if the new key is missing; a label would
+    # re-encrypt under the local key
+    if not get_keyring().has_key(key_id):
+        raise RuntimeError(f"Missing key for {key_id}")
+
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(db_path)
+    src = connection(db_path)
+    segment_file = src.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'segment_info'"
+    ).fetchone()
+    if is_shard_root(src) or is_segment_root(src) or segment_file:
+        raise ValueError(
+            f"{db_path} is part of a sharded or segmented ledger; only standalone ledgers can be rotated"
+        )
+    if verify:
+        # Ignore checkpoints: rows before the latest one are rotated too
+        result = verify_ledger(db_path, workers=workers, full=True, checkpoint=False)
+        if not result["verified"]:
+            raise ValueError(f"{db_path} does not verify ({result['issues']} issues); not rotating it")
+
+    completed_at = _start(db_path, out_path, key_id, cipher)
+    out = connection(out_path)
+    resumed_from = get_chain_head(out, out_path)[0] or None
+    if completed_at is not None:
+        (record,) = out.execute("SELECT record FROM key_rotations ORDER BY id DESC LIMIT 1").fetchone()
+        return {
+            "rotated": False,
+            "path": out_path,
+            "rows_rotated": 0,
+            "resumed_from": resumed_from,
+            "record": json.loads(record),
+            "seconds": time.time() - started,
+        }
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    compliance = enable_compliance and COMPLIANCE_AVAILABLE
+    columns = _source_select(src)
+    _init_worker(key_id, cipher)
+
+    (total,) = src.execute("SELECT COUNT(*) FROM ledger").fetchone()
+    (done,) = out.execute("SELECT COUNT(*) FROM ledger").fetchone()
+    rotated = 0
+    last_seq = resumed_from or 0
+    while True:
+        # Rows appended meanwhile are picked up by the next pass
+        (max_seq,) = src.execute("SELECT MAX(rowid) FROM ledger").fetchone()
+        if max_seq is None or max_seq <= last_seq:
+            break
+        tasks = [(db_path, out_path, lo, min(lo + chunk_size, max_seq), columns)
+                 for lo in range(last_seq, max_seq, chunk_size)]
+        for rows, records in _iter_results(tasks, workers, key_id, cipher):
+            if rows:
+                _write_rows(out_path, rows, records, key_id, compliance, signer)
+                rotated += len(rows)
+            if on_progress is not None:
+                on_progress(done + rotated, max(total, done + rotated))
+        last_seq = max_seq
+
+    (before,) = out.execute("SELECT COUNT(*) FROM ledger").fetchone()
+    record = _finish(db_path, out_path, key_id, cipher, columns, signer, compliance)
+    (after,) = out.execute("SELECT COUNT(*) FROM ledger").fetchone()
+    rotated += after - before
+
+    return {
+        "rotated": True,
+        "path": out_path,
+        "rows_rotated": rotated,
+        "resumed_from": resumed_from,
+        "record": record,
+        "seconds": time.time() - started,
+    }
@@ -0,0 +1,585 @@
+"""
+Segmented ledgers: automatic rollover to a new database file.
+
+A single ledger file grows forever, and vacuum, backup and verification
+grow with it. A segmented ledger keeps its entries in a series of SQLite
+files under ``<root>.segments/`` and starts a new one by time (e.g. one
+per day) or by row count.
+
+The root database (the path the application is configured with) holds
+the rollover policy and the segment registry. Rolling over seals the
+active segment:
+
+1. Under the segment's write lock a manifest is recorded inside it:
+   first and last seq, last hash, entry count and Merkle root, signed
+   with the audit trail signing key. Triggers then reject any further
+   insert, update or delete of its entries.
+2. The next segment is created with the previous segment's final seq and
+   hash as its chain base, so seqs stay unique across segments and its
+   first entry chains onto the last entry of the previous one.
+3. The registry records the manifest and the new active segment.
+
+Writers resolve the active segment on every append (a cached lookup); one
+that still holds a sealed segment is rejected by the trigger and retries
+on the new one. ``add_entry``, ``add_entries``, the background writer and
+the middleware all do this, so appending to a root path just works.
+
+``verify_ledger`` on a root verifies the segments in parallel, then checks
+each manifest and the links between segments (see
+:func:`verify_segments`). A sealed segment is a self-contained unit that
+can be verified on its own (:func:`verify_segment`), archived or
+compressed.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List
+
+from .chain import cached_head, chain_lock, hash_hex
+from .merkle import root_hash
+from .merkle_index import StoredTree, _last_leaf, sync_merkle_index
+from .shards import _verify_ledgers
+from .store import begin_immediate, connection
+
+# Import compliance modules (optional)
+try:
+    from .signatures import get_signer, verify_signature
+    COMPLIANCE_AVAILABLE = True
+except ImportError:
+    COMPLIANCE_AVAILABLE = False
+
+
+# Named rollover intervals, in seconds
+SEGMENT_INTERVALS = {"hourly": 3600, "daily": 86400, "weekly": 7 * 86400}
+
+# Error raised by a sealed segment's triggers
+SEALED_MESSAGE = "audittrail: ledger segment is sealed"
+
+# Times an append is retried on a newer segment after hitting a sealed one.
+# Every retry means another writer rolled over meanwhile, so only very
+# small segments under heavy write load need more than one.
+SEALED_RETRIES = 100
+
+_ROOTS = {}
+_ACTIVE = {}
+
+
+def segment_dir(db_path: str) -> str:
+    """Directory holding the segment databases of a root ledger."""
+    return os.path.abspath(db_path) + ".segments"
+
+
+def _create_root_schema(conn):
+    if conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ledger'"
+    ).fetchone():
+        raise ValueError("Database already holds an unsegmented ledger; use a new path for a segmented one")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS segment_policy (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        interval REAL,
+        max_rows INTEGER
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ledger_segments (
+        id INTEGER PRIMARY KEY,
+        file TEXT NOT NULL UNIQUE,
+        base_seq INTEGER NOT NULL,
+        base_hash TEXT NOT NULL,
+        opened_at TEXT NOT NULL,
+        sealed_at TEXT,
+        manifest TEXT
+    )
+    """)
+
+
+def _create_segment_tables(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS segment_info (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        segment INTEGER NOT NULL,
+        base_seq INTEGER NOT NULL,
+        base_hash TEXT NOT NULL,
+        opened_at TEXT NOT NULL
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS segment_manifest (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        manifest TEXT NOT NULL
+    )
+    """)
+
+
+def is_segment_root(conn) -> bool:
+    """Check whether a database is the root of a segmented ledger."""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ledger_segments'"
+    ).fetchone() is not None
+
+
+def is_sealed_segment(conn) -> bool:
+    """Check whether a database is a sealed segment, which is never written again."""
+    try:
+        return conn.execute("SELECT 1 FROM segment_manifest WHERE id = 1").fetchone() is not None
+    except sqlite3.OperationalError:
+        return False
+
+
+def _is_root_path(db_path) -> bool:
+    key = os.path.abspath(db_path)
+    root = _ROOTS.get(key)
+    if root is None:
+        root = _ROOTS[key] = os.path.exists(key) and is_segment_root(connection(db_path))
+    return root
+
+
+def _interval_seconds(interval) -> Optional[float]:
+    if interval is None:
+        return None
+    if isinstance(interval, str):
+        if interval not in SEGMENT_INTERVALS:
+            raise ValueError(f"interval must be one of {sorted(SEGMENT_INTERVALS)} or seconds, got {interval!r}")
+        return float(SEGMENT_INTERVALS[interval])
+    if interval <= 0:
+        raise ValueError("interval must be positive")
+    return float(interval)
+
+
+def init_segmented_ledger(db_path: str, interval="daily", max_rows: Optional[int] = None):
+    """
+    Turn ``db_path`` into the root of a segmented ledger, or update its policy.
+
+    Args:
+        db_path: Root ledger database path (must not hold an unsegmented ledger)
+        interval: "hourly", "daily", "weekly", seconds, or None for no time-based
+            rollover. Segments roll over at multiples of the interval since the
+            epoch, so "daily" starts a new segment at midnight UTC.
+        max_rows: Roll over once a segment holds this many entries (default: None)
+
+    Example:
+        init_segmented_ledger("audit_log.db", interval="daily")
+        add_entry("audit_log.db", entry)  # appended to today's segment
+    """
+    seconds = _interval_seconds(interval)
+    conn = connection(db_path, _create_root_schema)
+    begin_immediate(conn)
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO segment_policy (id, interval, max_rows) VALUES (1, ?, ?)",
+            (seconds, max_rows)
+        )
+        if conn.execute("SELECT 1 FROM ledger_segments LIMIT 1").fetchone() is None:
+            _open_segment(db_path, conn, 1, 0, "")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    _ROOTS[os.path.abspath(db_path)] = True
+    _ACTIVE.pop(os.path.abspath(db_path), None)
+
+
+def _open_segment(db_path, root_conn, segment_id, base_seq, base_hash):
+    """Register and create segment ``segment_id`` inside the root's transaction."""
+    from .ledger import _create_ledger_schema
+
+    now = datetime.now(timezone.utc)
+    name = f"{segment_id:06d}-{now:%Y%m%dT%H%M%S}.db"
+    root_conn.execute(
+        "INSERT INTO ledger_segments (id, file, base_seq, base_hash, opened_at) VALUES (?, ?, ?, ?, ?)",
+        (segment_id, name, base_seq, base_hash, now.isoformat())
+    )
+
+    os.makedirs(segment_dir(db_path), exist_ok=True)
+    path = os.path.join(segment_dir(db_path), name)
+    conn = connection(path, _create_ledger_schema)
+    try:
+        _create_segment_tables(conn)
+        conn.execute(
+            "INSERT OR IGNORE INTO segment_info (id, segment, base_seq, base_hash, opened_at) "
+            "VALUES (1, ?, ?, ?, ?)",
+            (segment_id, base_seq, base_hash, now.isoformat())
+        )
+        # Continue the seq numbering (AUTOINCREMENT) and the chain
+        if conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'ledger'", (base_seq,)).rowcount == 0:
+            conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('ledger', ?)", (base_seq,))
+        conn.execute(
+            "INSERT OR REPLACE INTO ledger_head (id, seq, hash) VALUES (1, ?, ?)", (base_seq, base_hash)
+        )
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return path
+
+
+def _manifest_message(manifest: Dict[str, Any]) -> str:
+    return json.dumps({k: v for k, v in manifest.items() if k != "signature"}, sort_keys=True)
+
+
+def _seal_segment(path: str, signer=None) -> Dict[str, Any]:
+    """Record the manifest of a segment and make its entries immutable."""
+    conn = connection(path)
+    existing = conn.execute("SELECT manifest FROM segment_manifest WHERE id = 1").fetchone()
+    if existing:
+        # Sealed by a rollover that stopped before updating the registry
+        return json.loads(existing[0])
+
+    # Appends extend the index; this only catches up a lagging one
+    sync_merkle_index(path)
+    with chain_lock(path):
+        begin_immediate(conn)
+        try:
+            segment, base_seq, base_hash, opened_at = conn.execute(
+                "SELECT segment, base_seq, base_hash, opened_at FROM segment_info WHERE id = 1"
+            ).fetchone()
+            first_seq, last_seq, entries = conn.execute(
+                "SELECT MIN(rowid), MAX(rowid), COUNT(*) FROM ledger"
+            ).fetchone()
+            last_hash = base_hash
+            if last_seq is not None:
+                (last_hash,) = conn.execute("SELECT hash FROM ledger WHERE rowid = ?", (last_seq,)).fetchone()
+                last_hash = hash_hex(last_hash)
+            size, _ = _last_leaf(conn)
+            manifest = {
+                "segment": segment,
+                "file": os.path.basename(path),
+                "base_seq": base_seq,
+                "base_hash": base_hash,
+                "first_seq": first_seq,
+                "last_seq": last_seq if last_seq is not None else base_seq,
+                "last_hash": last_hash,
+                "entries": entries,
+                "tree_size": size,
+                "merkle_root": root_hash(size, StoredTree(conn).subtree_hash).hex(),
+                "opened_at": opened_at,
+                "sealed_at": datetime.now(timezone.utc).isoformat(),
+                "signature": None,
+            }
+            if COMPLIANCE_AVAILABLE:
+                try:
+                    manifest["signature"] = (signer or get_signer()).sign(_manifest_message(manifest))
+                except Exception:
+                    pass
+            conn.execute(
+                "INSERT INTO segment_manifest (id, manifest) VALUES (1, ?)", (json.dumps(manifest),)
+            )
+            for event in ("INSERT", "UPDATE", "DELETE"):
+                conn.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS ledger_sealed_{event.lower()} BEFORE {event} ON ledger "
+                    f"BEGIN SELECT RAISE(ABORT, '{SEALED_MESSAGE}'); END"
+                )
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    # Fold the WAL back so the sealed file can be archived on its own
+    # (best effort: a reader still on the file leaves it for later)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    return manifest
+
+
+def _rollover_due(policy, segment, path) -> bool:
+    interval, max_rows = policy
+    conn = connection(path)
+    if is_sealed_segment(conn):
+        # Sealed by a rollover that stopped before updating the registry
+        return True
+    if interval and time.time() >= _deadline(segment["opened_at"], interval):
+        return True
+    if max_rows:
+        (last_seq,) = conn.execute("SELECT MAX(rowid) FROM ledger").fetchone()
+        return (last_seq or segment["base_seq"]) - segment["base_seq"] >= max_rows
+    return False
+
+
+def _deadline(opened_at: str, interval: float) -> float:
+    opened = datetime.fromisoformat(opened_at).timestamp()
+    return (opened // interval + 1) * interval
+
+
+def rotate_segment(db_path: str, force: bool = False, signer=None) -> str:
+    """
+    Seal the active segment and open the next one if the policy says so.
+
+    Args:
+        db_path: Root ledger database path
+        force: Roll over regardless of the policy
+        signer: Signer for the manifest (default: the shared Signer)
+
+    Returns:
+        Path of the active segment afterwards
+    """
+    conn = connection(db_path, _create_root_schema)
+    # Rollovers in this process queue on the root's lock, other processes
+    # on the root's write lock; writers never take either
+    with chain_lock(db_path):
+        begin_immediate(conn)
+        try:
+            policy = conn.execute("SELECT interval, max_rows FROM segment_policy WHERE id = 1").fetchone()
+            segment = _active_row(conn)
+            path = os.path.join(segment_dir(db_path), segment["file"])
+            if force or _rollover_due(policy or (None, None), segment, path):
+                manifest = _seal_segment(path, signer)
+                conn.execute(
+                    "UPDATE ledger_segments SET sealed_at = ?, manifest = ? WHERE id = ?",
+                    (manifest["sealed_at"], json.dumps(manifest), segment["id"])
+                )
+                path = _open_segment(
+                    db_path, conn, segment["id"] + 1, manifest["last_seq"], manifest["last_hash"]
+                )
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    _ACTIVE.pop(os.path.abspath(db_path), None)
+    return path
+
+
+def _active_row(conn):
+    row = conn.execute(
+        "SELECT id, file, base_seq, base_hash, opened_at FROM ledger_segments "
+        "WHERE sealed_at IS NULL ORDER BY id DESC LIMIT 1"
+    ).fetchone()
+    if row is None:
+        raise ValueError("Segmented ledger has no active segment")
+    return dict(zip(("id", "file", "base_seq", "base_hash", "opened_at"), row))
+
+
+def active_segment(db_path: str) -> str:
+    """
+    Path of the segment appends should go to, rolling over first if it is due.
+
+    The policy check is a cached comparison against the rollover time and
+    this process's last committed seq; the registry is only read again
+    after a rollover.
+    """
+    key = os.path.abspath(db_path)
+    state = _ACTIVE.get(key)
+    if state is not None:
+        path, deadline, max_seq = state
+        head = cached_head(path)
+        if time.time() < deadline and not (max_seq and head and head[0] >= max_seq):
+            return path
+
+    conn = connection(db_path, _create_root_schema)
+    interval, max_rows = conn.execute(
+        "SELECT interval, max_rows FROM segment_policy WHERE id = 1"
+    ).fetchone()
+    segment = _active_row(conn)
+    path = os.path.join(segment_dir(db_path), segment["file"])
+    if _rollover_due((interval, max_rows), segment, path):
+        path = rotate_segment(db_path)
+        segment = _active_row(conn)
+    deadline = _deadline(segment["opened_at"], interval) if interval else float("inf")
+    max_seq = segment["base_seq"] + max_rows if max_rows else None
+    _ACTIVE[key] = (path, deadline, max_seq)
+    return path
+
+
+def on_active_segment(db_path: str, append):
+    """
+    Run ``append(path)`` on the ledger, or on the active segment of a segmented root.
+
+    An append that lands on a segment sealed in the meantime (by another
+    thread or process) is rolled back by the segment's triggers and
+    retried on the new active segment.
+    """
+    if not _is_root_path(db_path):
+        return append(db_path)
+    for attempt in range(SEALED_RETRIES):
+        path = active_segment(db_path)
+        try:
+            return append(path)
+        except sqlite3.IntegrityError as e:
+            if not is_sealed_error(e) or attempt == SEALED_RETRIES - 1:
+                raise
+            _ACTIVE.pop(os.path.abspath(db_path), None)
+
+
+def is_sealed_error(error) -> bool:
+    """Check whether an sqlite3 error came from a sealed segment's triggers."""
+    return isinstance(error, sqlite3.IntegrityError) and SEALED_MESSAGE in str(error)
+
+
+def list_segments(db_path: str) -> List[Dict[str, Any]]:
+    """
+    Get every segment of a segmented ledger, oldest first.
+
+    Returns:
+        List of dictionaries with id, path, base_seq, base_hash, opened_at,
+        sealed_at and manifest (None for the active segment)
+    """
+    rows = connection(db_path, _create_root_schema).execute(
+        "SELECT id, file, base_seq, base_hash, opened_at, sealed_at, manifest "
+        "FROM ledger_segments ORDER BY id ASC"
+    ).fetchall()
+    return [
+        {"id": sid, "path": os.path.join(segment_dir(db_path), file), "base_seq": base_seq,
+         "base_hash": base_hash, "opened_at": opened_at, "sealed_at": sealed_at,
+         "manifest": json.loads(manifest) if manifest else None}
+        for sid, file, base_seq, base_hash, opened_at, sealed_at, manifest in rows
+    ]
+
+
+def ledger_files(db_path: str) -> List[str]:
+    """Ledger databases holding the entries of ``db_path``, oldest first (itself if not segmented)."""
+    if not _is_root_path(db_path):
+        return [db_path]
+    return [segment["path"] for segment in list_segments(db_path)]
+
+
+def check_segment_manifest(path: str, check_signatures: bool = True) -> List[Dict[str, Any]]:
+    """
+    Check a sealed segment against the manifest recorded inside it.
+
+    Returns:
+        List of issues (empty if the segment matches its manifest or is not sealed)
+    """
+    conn = connection(path)
+    row = conn.execute("SELECT manifest FROM segment_manifest WHERE id = 1").fetchone()
+    if row is None:
+        return []
+    manifest = json.loads(row[0])
+    issues = []
+
+    def issue(reason):
+        issues.append({"row": None, "reason": reason, "path": None})
+
+    if check_signatures and manifest.get("signature") and COMPLIANCE_AVAILABLE:
+        try:
+            signed = verify_signature(_manifest_message(manifest), manifest["signature"])
+        except Exception:
+            signed = False
+        if not signed:
+            issue("Segment manifest signature verification failed")
+
+    base = conn.execute("SELECT base_seq, base_hash FROM segment_info WHERE id = 1").fetchone()
+    if base is None or tuple(base) != (manifest["base_seq"], manifest["base_hash"]):
+        issue("Segment chain base does not match its manifest")
+
+    first_seq, last_seq, entries = conn.execute(
+        "SELECT MIN(rowid), MAX(rowid), COUNT(*) FROM ledger"
+    ).fetchone()
+    if (first_seq, last_seq if last_seq is not None else manifest["base_seq"], entries) != (
+            manifest["first_seq"], manifest["last_seq"], manifest["entries"]):
+        issue(f"Segment entries changed since it was sealed "
+              f"({manifest['entries']} -> {entries} entries)")
+    elif last_seq is not None:
+        (last_hash,) = conn.execute("SELECT hash FROM ledger WHERE rowid = ?", (last_seq,)).fetchone()
+        if hash_hex(last_hash) != manifest["last_hash"]:
+            issue("Segment last hash does not match its manifest")
+
+    size, _ = _last_leaf(conn)
+    if size < manifest["tree_size"] or root_hash(
+            manifest["tree_size"], StoredTree(conn).subtree_hash).hex() != manifest["merkle_root"]:
+        issue("Segment Merkle root does not match its manifest")
+    return issues
+
+
+def verify_segment(path: str, check_signatures: bool = True, **kwargs) -> Dict[str, Any]:
+    """
+    Verify one segment file on its own, e.g. an archived copy.
+
+    Runs ``verify_ledger`` on the file and checks it against its sealed
+    manifest. Linking it to its neighbours needs the root (see
+    :func:`verify_segments`).
+    """
+    from .ledger import verify_ledger
+
+    result = verify_ledger(path, check_signatures=check_signatures, **kwargs)
+    issues = check_segment_manifest(path, check_signatures)
+    if issues:
+        result["verified"] = False
+        result["issues"] += len(issues)
+        result.setdefault("details", []).extend(issues)
+    return result
+
+
+def verify_segments(db_path: str, check_signatures: bool = True, check_worm: bool = True,
+                    workers: Optional[int] = None, on_issue=None, on_progress=None,
+                    **kwargs) -> Dict[str, Any]:
+    """
+    Verify every segment of a segmented ledger, then the seals and links between them.
+
+    Segments are verified in a process pool, one segment per task, each
+    incrementally from its own checkpoint. Then each sealed segment is
+    checked against its manifest (which must match the registry's copy),
+    and each segment's chain base against the end of the one before it.
+    ``verify_ledger`` calls this for root databases.
+
+    Args:
+        db_path: Root ledger database path
+        check_signatures: Verify entry and manifest signatures (default: True)
+        check_worm: Check WORM integrity (default: True)
+        workers: Worker processes (default: None, one per CPU up to the segment count)
+        on_issue: Callback ``on_issue(issue)`` called for each issue instead of
+            collecting them into ``details``
+        on_progress: Callback ``on_progress(rows_checked, total_rows)`` called
+            after every segment
+        **kwargs: Passed to ``verify_ledger`` for each segment (page_size,
+            max_memory, full, checkpoint, recheck)
+
+    Returns:
+        The ``verify_ledger`` result summed over segments, plus segments
+        (per-segment results) and sealed_segments. Issues carry the
+        ``segment`` id they were found in.
+    """
+    issues = []
+    issue_count = 0
+
+    def report(issue):
+        nonlocal issue_count
+        issue_count += 1
+        if on_issue is not None:
+            on_issue(issue)
+        else:
+            issues.append(issue)
+
+    segments = list_segments(db_path)
+    present = {}
+    for segment in segments:
+        if os.path.exists(segment["path"]):
+            present[segment["id"]] = segment["path"]
+        else:
+            report({"segment": segment["id"], "row": None, "reason": "Segment database missing", "path": None})
+
+    result = _verify_ledgers(
+        present, dict(kwargs, check_signatures=check_signatures, check_worm=check_worm),
+        workers, report, "segment", on_progress
+    )
+    result["segments"] = result.pop("results")
+
+    previous = (0, "")
+    for segment in segments:
+        def segment_issue(reason):
+            report({"segment": segment["id"], "row": None, "reason": reason, "path": None})
+
+        if (segment["base_seq"], segment["base_hash"]) != previous:
+            segment_issue("Segment does not continue the previous segment's chain")
+        manifest = segment["manifest"]
+        if manifest is not None:
+            previous = (manifest["last_seq"], manifest["last_hash"])
+        if segment["id"] not in present:
+            continue
+
+        stored = connection(segment["path"]).execute(
+            "SELECT manifest FROM segment_manifest WHERE id = 1"
+        ).fetchone()
+        if manifest is None:
+            continue
+        if stored is None or json.loads(stored[0]) != manifest:
+            segment_issue("Segment manifest does not match the registry")
+        for issue in check_segment_manifest(segment["path"], check_signatures):
+            report(dict(issue, segment=segment["id"]))
+
+    result["sealed_segments"] = sum(1 for segment in segments if segment["manifest"] is not None)
+    result["verified"] = issue_count == 0
+    result["issues"] = issue_count
+    if issues:
+        result["details"] = issues
+    return result
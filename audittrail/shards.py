@@ -0,0 +1,458 @@
+"""
+Sharded ledgers with a cross-anchoring root chain.
+
+One hash chain serializes every append through a single head. A sharded
+ledger splits entries into independent chains keyed by shard (tenant,
+route prefix, worker, ...). Each shard is a complete ledger in its own
+SQLite file under ``<root>.shards/``, with its own head, Merkle index,
+checkpoints and write lock, so appends to different shards never wait on
+each other.
+
+The root database (the path the application is configured with) holds
+the shard registry and the anchor chain. An anchor records the head
+(seq and hash) of every shard and is itself hash-chained and signed, so
+rewriting a whole shard, or rolling it back, breaks the anchors that
+committed to its old rows. :func:`anchor_shards` appends one anchor;
+:class:`ShardAnchorer` does so periodically.
+
+``verify_ledger`` on a root database verifies the shards in parallel and
+then validates the anchor chain against them (see :func:`verify_shards`).
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any
+
+from .chain import chain_base, hash_hex
+from .store import STORE, connection, cursor, write_cursor
+
+# Import compliance modules (optional)
+try:
+    from .signatures import get_signer, verify_signature
+    COMPLIANCE_AVAILABLE = True
+except ImportError:
+    COMPLIANCE_AVAILABLE = False
+
+
+# Seconds between anchors written by ShardAnchorer
+ANCHOR_INTERVAL = 60.0
+
+_SHARD_NAME = re.compile(r"[^A-Za-z0-9_.-]+")
+_PATHS = {}
+
+
+def shard_dir(db_path: str) -> str:
+    """Directory holding the shard databases of a root ledger."""
+    return os.path.abspath(db_path) + ".shards"
+
+
+def _create_root_schema(conn):
+    if conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ledger'"
+    ).fetchone():
+        raise ValueError("Database already holds an unsharded ledger; use a new path for a sharded one")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ledger_shards (
+        name TEXT PRIMARY KEY,
+        file TEXT NOT NULL UNIQUE,
+        created_at TEXT NOT NULL
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS shard_anchors (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        ts TEXT NOT NULL,
+        heads TEXT NOT NULL,
+        hash TEXT NOT NULL,
+        prev_hash TEXT NOT NULL,
+        signature TEXT
+    )
+    """)
+
+
+def is_shard_root(conn) -> bool:
+    """Check whether a database is the root of a sharded ledger."""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ledger_shards'"
+    ).fetchone() is not None
+
+
+def _shard_file(name: str) -> str:
+    # Readable and filesystem-safe, with a digest so distinct names never collide
+    slug = _SHARD_NAME.sub("_", name).strip("._")[:40] or "shard"
+    return f"{slug}-{hashlib.sha256(name.encode()).hexdigest()[:12]}.db"
+
+
+def shard_path(db_path: str, shard: str) -> str:
+    """
+    Get the database path of a shard, registering the shard on first use.
+
+    Args:
+        db_path: Root ledger database path
+        shard: Shard key
+
+    Returns:
+        Path of the shard's ledger database
+    """
+    key = (os.path.abspath(db_path), shard)
+    path = _PATHS.get(key)
+    if path is not None:
+        return path
+
+    conn = connection(db_path, _create_root_schema)
+    row = conn.execute("SELECT file FROM ledger_shards WHERE name = ?", (shard,)).fetchone()
+    if row is None:
+        with cursor(db_path) as cur:
+            cur.execute(
+                "INSERT OR IGNORE INTO ledger_shards (name, file, created_at) VALUES (?, ?, ?)",
+                (shard, _shard_file(shard), datetime.now(timezone.utc).isoformat())
+            )
+            row = cur.execute("SELECT file FROM ledger_shards WHERE name = ?", (shard,)).fetchone()
+        os.makedirs(shard_dir(db_path), exist_ok=True)
+
+    path = _PATHS[key] = os.path.join(shard_dir(db_path), row[0])
+    return path
+
+
+def list_shards(db_path: str) -> Dict[str, str]:
+    """Get ``{shard: database path}`` for every registered shard."""
+    rows = connection(db_path, _create_root_schema).execute(
+        "SELECT name, file FROM ledger_shards ORDER BY name"
+    ).fetchall()
+    return {name: os.path.join(shard_dir(db_path), file) for name, file in rows}
+
+
+def init_shard_root(db_path: str):
+    """Create the registry and anchor tables in a root ledger database."""
+    connection(db_path, _create_root_schema)
+
+
+def route_prefix(depth: int = 1):
+    """
+    Shard key function using the first ``depth`` path segments.
+
+    Example:
+        route_prefix()({"path": "/tenants/acme/orders"})   # "/tenants"
+        route_prefix(2)({"path": "/tenants/acme/orders"})  # "/tenants/acme"
+    """
+    def key(entry):
+        segments = [s for s in entry["path"].split("/") if s][:depth]
+        return "/" + "/".join(segments)
+    return key
+
+
+def _shard_head(path: str):
+    """(seq, hash) of a shard's last entry; (0, "") if it has none."""
+    if not os.path.exists(path):
+        return None
+    conn = connection(path)
+    try:
+        row = conn.execute("SELECT rowid, hash FROM ledger ORDER BY rowid DESC LIMIT 1").fetchone()
+    except sqlite3.OperationalError:
+        # Registered but nothing written yet
+        return (0, "")
+    return (row[0], hash_hex(row[1])) if row else (0, "")
+
+
+def _anchor_hash(ts: str, heads: Dict[str, Any], prev_hash: str) -> str:
+    heads_str = json.dumps(heads, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"anchor|{ts}|{heads_str}|{prev_hash}".encode()).hexdigest()
+
+
+def anchor_shards(db_path: str, signer=None, force: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Commit the current head of every shard into the root anchor chain.
+
+    Args:
+        db_path: Root ledger database path
+        signer: Signer for the anchor (default: the shared Signer when
+            compliance features are available)
+        force: Write an anchor even if no shard moved since the last one
+
+    Returns:
+        The new anchor (seq, ts, heads, hash, prev_hash, signature), or None
+        if nothing changed
+    """
+    heads = {}
+    for name, path in list_shards(db_path).items():
+        head = _shard_head(path)
+        if head and head[0]:
+            heads[name] = {"seq": head[0], "hash": head[1]}
+
+    with write_cursor(db_path, _create_root_schema) as cur:
+        last = cur.execute(
+            "SELECT heads, hash FROM shard_anchors ORDER BY seq DESC LIMIT 1"
+        ).fetchone()
+        prev_hash = last[1] if last else ""
+        if not force and (not heads or (last and json.loads(last[0]) == heads)):
+            return None
+
+        ts = datetime.now(timezone.utc).isoformat()
+        anchor_hash = _anchor_hash(ts, heads, prev_hash)
+        signature = None
+        if COMPLIANCE_AVAILABLE:
+            try:
+                signature = (signer or get_signer()).sign(anchor_hash)
+            except Exception:
+                pass
+        cur.execute(
+            "INSERT INTO shard_anchors (ts, heads, hash, prev_hash, signature) VALUES (?, ?, ?, ?, ?)",
+            (ts, json.dumps(heads, sort_keys=True), anchor_hash, prev_hash, signature)
+        )
+        seq = cur.lastrowid
+
+    return {"seq": seq, "ts": ts, "heads": heads, "hash": anchor_hash,
+            "prev_hash": prev_hash, "signature": signature}
+
+
+def verify_anchors(db_path: str, check_signatures: bool = True) -> Dict[str, Any]:
+    """
+    Validate the anchor chain of a root ledger against its shards.
+
+    Every anchor must chain onto the previous one, match its hash and
+    signature, never move a shard's head backwards, and name rows that
+    still exist in the shard with the recorded hash.
+
+    Returns:
+        Dictionary with anchors (checked), unanchored_entries (shard rows
+        after the latest anchor) and details (list of issues)
+    """
+    shards = list_shards(db_path)
+    conns = {name: connection(path) for name, path in shards.items() if os.path.exists(path)}
+    issues = []
+    prev_hash = ""
+    anchored = {}
+    count = 0
+
+    rows = connection(db_path).execute(
+        "SELECT seq, ts, heads, hash, prev_hash, signature FROM shard_anchors ORDER BY seq ASC"
+    )
+    for seq, ts, heads_json, anchor_hash, stored_prev, signature in rows:
+        count += 1
+        heads = json.loads(heads_json)
+
+        if stored_prev != prev_hash:
+            issues.append({"anchor": seq, "row": None, "reason": "Anchor chain broken", "path": None})
+        if _anchor_hash(ts, heads, stored_prev) != anchor_hash:
+            issues.append({"anchor": seq, "row": None, "reason": "Anchor hash mismatch", "path": None})
+        if check_signatures and signature and COMPLIANCE_AVAILABLE:
+            try:
+                signed = verify_signature(anchor_hash, signature)
+            except Exception:
+                signed = False
+            if not signed:
+                issues.append({"anchor": seq, "row": None, "reason": "Anchor signature verification failed",
+                               "path": None})
+        prev_hash = anchor_hash
+
+        for name, head in heads.items():
+            conn = conns.get(name)
+            if conn is None:
+                issues.append({"anchor": seq, "shard": name, "row": None, "reason": "Anchored shard is missing",
+                               "path": None})
+                continue
+            if head["seq"] < anchored.get(name, 0):
+                issues.append({"anchor": seq, "shard": name, "row": head["seq"],
+                               "reason": "Anchored shard head moved backwards", "path": None})
+            anchored[name] = head["seq"]
+            row = conn.execute("SELECT hash FROM ledger WHERE rowid = ?", (head["seq"],)).fetchone()
+            if row is None:
+                issues.append({"anchor": seq, "shard": name, "row": head["seq"],
+                               "reason": "Anchored entry missing", "path": None})
+            elif hash_hex(row[0]) != head["hash"]:
+                issues.append({"anchor": seq, "shard": name, "row": head["seq"],
+                               "reason": "Anchored entry hash mismatch", "path": None})
+
+    unanchored = 0
+    for name, path in shards.items():
+        head = _shard_head(path)
+        if head:
+            unanchored += max(0, head[0] - anchored.get(name, 0))
+
+    return {"anchors": count, "unanchored_entries": unanchored, "details": issues}
+
+
+def _verify_one(task):
+    """Process-pool entry point: verify one ledger database."""
+    from .ledger import verify_ledger
+    name, path, kwargs = task
+    return name, verify_ledger(path, **kwargs)
+
+
+def _verify_ledgers(ledgers: Dict[Any, str], kwargs: Dict[str, Any], workers: Optional[int],
+                    report, tag: str, on_progress=None) -> Dict[str, Any]:
+    """
+    Verify independent ledgers in a process pool, one ledger per task.
+
+    Shared by sharded and segmented ledgers. Issues are passed to
+    ``report`` with the ledger's name under ``tag``.
+
+    Returns:
+        Dictionary with total_entries and checked_entries summed over the
+        ledgers, signature_failures / worm_violations when present, and
+        ``results`` (per-ledger results without details)
+    """
+    tasks = [(name, path, kwargs) for name, path in ledgers.items()]
+    # Seqs above the chain base (a segment's seqs continue the previous segment's)
+    total_rows = sum(
+        max(0, (_shard_head(path) or (0,))[0] - chain_base(connection(path))[0]) for path in ledgers.values()
+    )
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(tasks)))
+
+    totals = {"total_entries": 0, "checked_entries": 0, "results": {}}
+    if workers == 1:
+        results = map(_verify_one, tasks)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = pool.map(_verify_one, tasks)
+    try:
+        for name, result in results:
+            for issue in result.pop("details", []):
+                report(dict(issue, **{tag: name}))
+            totals["results"][name] = result
+            totals["total_entries"] += result["total_entries"]
+            totals["checked_entries"] += result["checked_entries"]
+            for counter in ("signature_failures", "worm_violations"):
+                if counter in result:
+                    totals[counter] = totals.get(counter, 0) + result[counter]
+            if on_progress is not None:
+                on_progress(totals["checked_entries"], total_rows)
+    finally:
+        if workers > 1:
+            pool.shutdown()
+    return totals
+
+
+def verify_shards(db_path: str, check_signatures: bool = True, check_worm: bool = True,
+                  workers: Optional[int] = None, on_issue=None, on_progress=None,
+                  **kwargs) -> Dict[str, Any]:
+    """
+    Verify every shard of a sharded ledger, then its anchor chain.
+
+    Shards are independent chains, so they are verified in a process pool,
+    one shard per task, each incrementally from its own checkpoint. The
+    anchors are validated once all shards are done. ``verify_ledger``
+    calls this for root databases.
+
+    Args:
+        db_path: Root ledger database path
+        check_signatures: Verify entry and anchor signatures (default: True)
+        check_worm: Check WORM integrity (default: True)
+        workers: Worker processes (default: None, one per CPU up to the shard count)
+        on_issue: Callback ``on_issue(issue)`` called for each issue instead of
+            collecting them into ``details``
+        on_progress: Callback ``on_progress(rows_checked, total_rows)`` called
+            after every shard
+        **kwargs: Passed to ``verify_ledger`` for each shard (page_size,
+            max_memory, full, checkpoint, recheck)
+
+    Returns:
+        The ``verify_ledger`` result summed over shards, plus shards
+        (per-shard results), anchors and unanchored_entries. Issues carry
+        the ``shard`` they were found in.
+    """
+    issues = []
+    issue_count = 0
+
+    def report(issue):
+        nonlocal issue_count
+        issue_count += 1
+        if on_issue is not None:
+            on_issue(issue)
+        else:
+            issues.append(issue)
+
+    shards = list_shards(db_path)
+    for name, path in shards.items():
+        if not os.path.exists(path):
+            report({"shard": name, "row": None, "reason": "Shard database missing", "path": None})
+
+    result = _verify_ledgers(
+        {name: path for name, path in shards.items() if os.path.exists(path)},
+        dict(kwargs, check_signatures=check_signatures, check_worm=check_worm),
+        workers, report, "shard", on_progress
+    )
+    result["shards"] = result.pop("results")
+
+    anchors = verify_anchors(db_path, check_signatures)
+    for issue in anchors["details"]:
+        report(issue)
+    result["anchors"] = anchors["anchors"]
+    result["unanchored_entries"] = anchors["unanchored_entries"]
+
+    result["verified"] = issue_count == 0
+    result["issues"] = issue_count
+    if issues:
+        result["details"] = issues
+    return result
+
+
+class ShardAnchorer:
+    """
+    Background thread that anchors the shard heads every ``interval`` seconds.
+
+    An anchor is only written when a shard moved. ``close()`` writes a
+    final anchor so entries flushed at shutdown are covered.
+
+    Example:
+        anchorer = ShardAnchorer("audit_log.db", interval=30)
+        anchorer.start()
+        ...
+        anchorer.close()
+    """
+
+    def __init__(self, db_path, interval=ANCHOR_INTERVAL, signer=None):
+        self.db_path = db_path
+        self.interval = interval
+        self.signer = signer
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the anchoring thread if it is not already running."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            init_shard_root(self.db_path)
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name=f"audittrail-anchorer:{self.db_path}", daemon=True
+            )
+            self._thread.start()
+            atexit.register(self.close)
+
+    def anchor(self):
+        """Anchor now; errors are swallowed so the thread keeps running."""
+        try:
+            return anchor_shards(self.db_path, self.signer)
+        except Exception:
+            return None
+
+    def close(self, timeout=5.0):
+        """Stop the thread and write a final anchor."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join(timeout)
+        self.anchor()
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                self.anchor()
+        finally:
+            STORE.close()
@@ -0,0 +1,318 @@
+"""
+Shared SQLite store manager.
+
+Every module used to open a fresh connection and re-run its
+``CREATE TABLE IF NOT EXISTS`` statements on each call. The store manager
+keeps one long-lived connection per database file per thread and runs each
+schema initializer exactly once per process.
+
+Every connection it opens gets the pragmas of a performance profile
+(:data:`PROFILES`), so the ledger and the side databases (WORM,
+timestamps, anomalies) are tuned the same way. All profiles use WAL, so
+readers such as ``audittrail watch`` no longer block writers or each
+other; they differ in how much durability they trade for speed:
+
+- ``durable`` (default): ``synchronous=FULL``. Every commit is on disk
+  before it returns, as with SQLite's defaults.
+- ``balanced``: ``synchronous=NORMAL``. Survives application crashes;
+  an OS crash or power loss can drop the last commits, never corrupt.
+- ``throughput``: ``synchronous=OFF``. Survives application crashes;
+  an OS crash or power loss can lose commits or corrupt the database.
+
+Usage:
+    from .store import cursor
+
+    with cursor(WORM_DB, _create_worm_schema) as cur:
+        cur.execute("SELECT ...")
+
+    set_profile("balanced")                  # every database
+    set_profile("throughput", "bulk.db")     # one database file
+"""
+
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Attempts to take the write lock before giving up, and the first backoff
+# delay in seconds (doubled per attempt, with jitter). Each attempt also
+# waits up to the connection's busy timeout.
+WRITE_LOCK_RETRIES = 8
+WRITE_LOCK_BACKOFF = 0.01
+
+_MB = 1024 * 1024
+
+# Connection pragmas per profile. cache_size is negative KiB, as in SQLite.
+PROFILES = {
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -16 * 1024,
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+        "busy_timeout": 5000,
+        "journal_size_limit": 64 * _MB,
+    },
+    "balanced": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64 * 1024,
+        "mmap_size": 256 * _MB,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+        "journal_size_limit": 64 * _MB,
+    },
+    "throughput": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -256 * 1024,
+        "mmap_size": 1024 * _MB,
+        "temp_store": "MEMORY",
+        "busy_timeout": 10000,
+        "journal_size_limit": 256 * _MB,
+    },
+}
+
+# Profile for connections opened without a per-file profile
+DEFAULT_PROFILE = os.getenv("AUDITTRAIL_PROFILE", "durable")
+
+# journal_mode goes first: it needs the busy timeout and no open transaction
+_PRAGMA_ORDER = ("busy_timeout", "journal_mode", "synchronous", "cache_size", "mmap_size",
+                 "temp_store", "journal_size_limit")
+
+
+def _resolve_profile(profile):
+    """Pragmas for a profile name or a dict of pragmas."""
+    if isinstance(profile, str):
+        if profile not in PROFILES:
+            raise ValueError(f"profile must be one of {sorted(PROFILES)}, got {profile!r}")
+        return PROFILES[profile]
+    unknown = set(profile) - set(_PRAGMA_ORDER)
+    if unknown:
+        raise ValueError(f"Unsupported pragmas in profile: {sorted(unknown)}")
+    return profile
+
+
+def apply_profile(conn, profile):
+    """
+    Apply a profile's pragmas to a connection.
+
+    Args:
+        conn: sqlite3.Connection
+        profile: Name from :data:`PROFILES` or a dict of pragmas
+    """
+    pragmas = _resolve_profile(profile)
+    for name in _PRAGMA_ORDER:
+        if name in pragmas:
+            conn.execute(f"PRAGMA {name} = {pragmas[name]}").fetchall()
+
+
+def begin_immediate(conn, retries=WRITE_LOCK_RETRIES, backoff=WRITE_LOCK_BACKOFF):
+    """
+    Start a write transaction that holds the database write lock from the start.
+
+    A plain (deferred) transaction only takes the lock at its first write,
+    so anything read before that, such as the chain head, can be stale by
+    the time it is used. ``BEGIN IMMEDIATE`` makes read-then-write atomic
+    across processes. SQLITE_BUSY is retried with exponential backoff.
+
+    Raises:
+        RuntimeError: If the connection already has an open transaction; its
+            work would otherwise be committed outside the caller's lock
+        sqlite3.OperationalError: If the lock is still busy after ``retries`` attempts
+    """
+    if conn.in_transaction:
+        raise RuntimeError("Connection already has an open transaction; commit or roll it back first")
+    for attempt in range(retries):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            return
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e) and "busy" not in str(e):
+                raise
+            if attempt == retries - 1:
+                raise
+            time.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
+
+
+class StoreManager:
+    """
+    Owns thread-affine, long-lived connections keyed by database file.
+
+    Connections are never shared between threads, so the sqlite3 module's
+    same-thread check stays enabled. After ``fork()`` the child discards
+    the parent's connections and schema flags and starts fresh.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._initialized = set()
+        self._pid = os.getpid()
+        self._profile = DEFAULT_PROFILE
+        self._profiles = {}
+
+    def set_profile(self, profile, path=None):
+        """
+        Set the performance profile for new connections.
+
+        Args:
+            profile: Name from :data:`PROFILES` or a dict of pragmas
+            path: Only for this database file (default: every database)
+
+        Connections opened earlier keep their settings; set the profile
+        before the first write, or :meth:`close` and reopen.
+        """
+        _resolve_profile(profile)
+        if path is None:
+            self._profile = profile
+        else:
+            self._profiles[os.path.abspath(path)] = profile
+
+    def profile(self, path):
+        """Profile used for connections to ``path``."""
+        return self._profiles.get(os.path.abspath(path), self._profile)
+
+    def _connections(self):
+        if self._pid != os.getpid():
+            # Forked child: inherited connections must not be used
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._local = threading.local()
+                    self._initialized = set()
+                    self._pid = os.getpid()
+
+        conns = getattr(self._local, "conns", None)
+        if conns is None:
+            conns = self._local.conns = {}
+        return conns
+
+    def connection(self, path, schema=None):
+        """
+        Get this thread's connection to ``path``, opening it on first use.
+
+        Args:
+            path: Database file path
+            schema: Optional callable ``schema(conn)`` creating the tables;
+                it runs once per database file per process
+
+        Returns:
+            sqlite3.Connection
+        """
+        key = os.path.abspath(path)
+        conns = self._connections()
+        conn = conns.get(key)
+        if conn is None:
+            conn = sqlite3.connect(path)
+            apply_profile(conn, self.profile(key))
+            conns[key] = conn
+        if schema is not None:
+            self._ensure_schema(key, schema, conn)
+        return conn
+
+    def ensure_schema(self, path, schema):
+        """Run ``schema`` against ``path`` unless it already ran in this process."""
+        self.connection(path, schema)
+
+    def _ensure_schema(self, key, schema, conn):
+        marker = (key, schema.__module__, schema.__qualname__)
+        if marker in self._initialized:
+            return
+        with self._lock:
+            if marker in self._initialized:
+                return
+            schema(conn)
+            conn.commit()
+            self._initialized.add(marker)
+
+    @contextmanager
+    def cursor(self, path, schema=None):
+        """
+        Yield a cursor on the pooled connection; commit on success, roll back on error.
+
+        Do not nest ``cursor()`` blocks for the same database: they share one
+        connection and therefore one transaction.
+        """
+        conn = self.connection(path, schema)
+        cur = conn.cursor()
+        try:
+            yield cur
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    @contextmanager
+    def write_cursor(self, path, schema=None):
+        """
+        Like :meth:`cursor`, but the transaction holds the write lock from the
+        start (see :func:`begin_immediate`). Use it for appends that read
+        state (the chain head) and write based on it.
+        """
+        conn = self.connection(path, schema)
+        begin_immediate(conn)
+        cur = conn.cursor()
+        try:
+            yield cur
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    def close(self, path=None):
+        """
+        Close this thread's connections (all of them, or only ``path``).
+
+        Schema flags are kept; use :meth:`reset` after deleting a database file.
+        """
+        conns = self._connections()
+        keys = [os.path.abspath(path)] if path else list(conns)
+        for key in keys:
+            conn = conns.pop(key, None)
+            if conn is not None:
+                conn.close()
+
+    def reset(self, path=None):
+        """Close connections and forget that schemas were initialized."""
+        self.close(path)
+        with self._lock:
+            if path is None:
+                self._initialized = set()
+            else:
+                key = os.path.abspath(path)
+                self._initialized = {m for m in self._initialized if m[0] != key}
+
+
+STORE = StoreManager()
+
+
+def set_profile(profile, path=None):
+    """Set the performance profile for new connections (see :meth:`StoreManager.set_profile`)."""
+    STORE.set_profile(profile, path)
+
+
+def connection(path, schema=None):
+    """Get the pooled connection for ``path`` on the current thread."""
+    return STORE.connection(path, schema)
+
+
+def cursor(path, schema=None):
+    """Context manager yielding a pooled cursor that commits on exit."""
+    return STORE.cursor(path, schema)
+
+
+def write_cursor(path, schema=None):
+    """Context manager yielding a pooled cursor inside an IMMEDIATE write transaction."""
+    return STORE.write_cursor(path, schema)
+
+
+def ensure_schema(path, schema):
+    """Initialize a database schema once per process."""
+    STORE.ensure_schema(path, schema)
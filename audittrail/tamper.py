@@ -0,0 +1,207 @@
+"""
+Tamper localization.
+
+``verify_ledger`` tells you *that* a ledger was modified; ``locate_tamper``
+finds *where*, without a full verification pass. It bisects over the
+Merkle index: each range check rehashes the rows under one Merkle subtree
+and compares the result with the subtree root recorded when those rows
+were appended. Descending into the left half whenever it fails (and the
+right half otherwise) reaches the first modified, missing or re-chained
+row in O(log n) range checks. A range check stops at the first aligned
+block that does not match, so rows far past the tamper point are never
+read. Only the rows around it get a full re-verify (chain, signature and
+WORM).
+"""
+
+from typing import Dict, Any
+
+from .ledger import (
+    VERIFY_PAGE_SIZE, _iter_range_issues, _ledger_columns, _new_counts, _recompute_hash, _verify_select
+)
+from .merkle import leaf_hash, split_point, streaming_root
+from .chain import hash_hex
+from .merkle_index import StoredTree, _last_leaf, ensure_merkle_tables, entry_leaf_hash
+from .store import connection
+
+
+# Range checks compare each aligned block of this many leaves as soon as it
+# is rehashed, so a check stops shortly after the first bad row
+EARLY_EXIT_BLOCK = 1024
+
+# Leaf value for a row that is missing or whose stored hash is wrong; it can
+# never equal a real leaf hash
+_BAD_LEAF = leaf_hash(b"\x00audittrail:tampered")
+
+
+class _RangeChecker:
+    """Rehashes ledger rows under a Merkle subtree and compares with the stored root."""
+
+    def __init__(self, conn, page_size=VERIFY_PAGE_SIZE):
+        self.conn = conn
+        if "format_version" in _ledger_columns(conn):
+            # Format 2 rows are rehashed from their payload digests alone
+            self.columns = (
+                "CASE WHEN g.format_version >= 2 THEN NULL ELSE g.body END, "
+                "CASE WHEN g.format_version >= 2 THEN NULL ELSE g.response END, "
+                "g.prev_hash, g.key_id, g.hash, g.format_version, g.body_digest, g.response_digest"
+            )
+        else:
+            self.columns = "g.body, g.response, g.prev_hash, g.key_id, g.hash, 1, NULL, NULL"
+        self.page_size = page_size
+        self.tree = StoredTree(conn)
+        self.range_checks = 0
+        self.rows_hashed = 0
+        # Start of the first mismatching block found by the last failed check
+        self.bad_block = None
+
+    def _leaves(self, lo, hi):
+        last = lo - 1
+        while True:
+            page = self.conn.execute(
+                f"SELECT l.idx, g.rowid, g.ts, g.method, g.path, g.user, g.status, {self.columns} "
+                "FROM merkle_leaves l LEFT JOIN ledger g ON g.rowid = l.ledger_rowid "
+                "WHERE l.idx > ? AND l.idx < ? ORDER BY l.idx ASC LIMIT ?",
+                (last, hi, self.page_size)
+            ).fetchall()
+            if not page:
+                return
+            last = page[-1][0]
+            for (_, rowid, ts, method, path, user, status, body, response, prev_hash, kid, stored,
+                 format_version, body_digest, response_digest) in page:
+                self.rows_hashed += 1
+                if rowid is None:
+                    yield _BAD_LEAF
+                    continue
+                computed = _recompute_hash(
+                    ts, method, path, user, int(status), body, response, hash_hex(prev_hash), kid,
+                    format_version, body_digest, response_digest
+                )
+                yield entry_leaf_hash(computed) if computed == hash_hex(stored) else _BAD_LEAF
+
+    def intact(self, lo, hi):
+        """True if the rows for leaves [lo, hi) still hash to the recorded subtree root."""
+        self.range_checks += 1
+        self.bad_block = None
+
+        def check_block(end, size, h):
+            # Stop at the first bad block instead of rehashing the whole range
+            if size != EARLY_EXIT_BLOCK:
+                return True
+            start = lo + end - size
+            if h != self.tree.subtree_hash(start, start + size):
+                self.bad_block = start
+                return False
+            return True
+
+        root = streaming_root(self._leaves(lo, hi), check_block)
+        return root is not None and root == self.tree.subtree_hash(lo, hi)
+
+
+def _leaf_rowid(conn, index, default):
+    row = conn.execute("SELECT ledger_rowid FROM merkle_leaves WHERE idx = ?", (index,)).fetchone()
+    return row[0] if row else default
+
+
+def locate_tamper(db_path: str, verify_suspect: bool = True) -> Dict[str, Any]:
+    """
+    Find the first modified, missing or inserted ledger row.
+
+    The Merkle index is the reference: it records every entry's hash at
+    append time. Rows appended after the index tail are not covered and
+    are only counted (see ``unindexed_entries``).
+
+    Args:
+        db_path: Ledger database path
+        verify_suspect: Fully re-verify the rows around the first bad row (default: True)
+
+    Returns:
+        Dictionary with:
+        - tampered: bool
+        - tree_size: int (entries covered by the index)
+        - range_checks: int
+        - rows_hashed: int
+        - first_bad_rowid / first_bad_leaf: location of the first bad row (if tampered)
+        - reason: str (if tampered)
+        - suspect_range: [after_rowid, to_rowid] that was fully re-verified
+        - issues: list of issues from the suspect range
+        - unindexed_entries: int
+
+    Example:
+        result = locate_tamper("audit_log.db")
+        if result["tampered"]:
+            print(f"First bad row: {result['first_bad_rowid']} ({result['reason']})")
+    """
+    conn = connection(db_path, ensure_merkle_tables)
+    size, last_indexed_rowid = _last_leaf(conn)
+    checker = _RangeChecker(conn)
+
+    result = {
+        "tampered": False,
+        "tree_size": size,
+        "range_checks": 0,
+        "rows_hashed": 0,
+        "issues": [],
+    }
+
+    # Bisect: the left subtree of every split is checked; the right one is
+    # only entered (never rehashed as a whole) when the left is intact. A
+    # failed check that stopped at a bad block narrows straight to it.
+    first_bad = None
+    lo, hi = 0, size
+    while hi - lo > 1:
+        k = split_point(hi - lo)
+        if checker.intact(lo, lo + k):
+            lo = lo + k
+        elif checker.bad_block is not None:
+            lo, hi = checker.bad_block, checker.bad_block + EARLY_EXIT_BLOCK
+        else:
+            hi = lo + k
+    if size and not checker.intact(lo, lo + 1):
+        first_bad = lo
+
+    if first_bad is not None:
+        rowid = _leaf_rowid(conn, first_bad, None)
+        exists = conn.execute("SELECT 1 FROM ledger WHERE rowid = ?", (rowid,)).fetchone()
+        result.update({
+            "tampered": True,
+            "first_bad_leaf": first_bad,
+            "first_bad_rowid": rowid,
+            "reason": "Entry modified" if exists else "Entry missing",
+        })
+        suspect = (
+            _leaf_rowid(conn, first_bad - 1, 0),
+            _leaf_rowid(conn, first_bad + 1, rowid),
+        )
+    else:
+        # Every indexed entry is intact; look for rows slipped in between them
+        (covered,) = conn.execute(
+            "SELECT COUNT(*) FROM ledger WHERE rowid <= ?", (last_indexed_rowid,)
+        ).fetchone()
+        suspect = None
+        if covered != size:
+            inserted = conn.execute(
+                "SELECT rowid FROM ledger g WHERE rowid <= ? AND NOT EXISTS "
+                "(SELECT 1 FROM merkle_leaves l WHERE l.ledger_rowid = g.rowid) "
+                "ORDER BY rowid ASC LIMIT 1",
+                (last_indexed_rowid,)
+            ).fetchone()
+            result.update({
+                "tampered": True,
+                "first_bad_rowid": inserted[0],
+                "reason": "Entry inserted",
+            })
+            suspect = (inserted[0] - 1, inserted[0] + 1)
+
+    if suspect is not None:
+        result["suspect_range"] = list(suspect)
+        if verify_suspect:
+            columns = _verify_select(_ledger_columns(conn))
+            task = (db_path, suspect[0], suspect[1], columns, True, True, VERIFY_PAGE_SIZE, None)
+            result["issues"] = list(_iter_range_issues(task, _new_counts()))
+
+    (result["unindexed_entries"],) = conn.execute(
+        "SELECT COUNT(*) FROM ledger WHERE rowid > ?", (last_indexed_rowid,)
+    ).fetchone()
+    result["range_checks"] = checker.range_checks
+    result["rows_hashed"] = checker.rows_hashed
+    return result
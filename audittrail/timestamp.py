@@ -8,16 +8,16 @@ import json
 import hashlib
 import sqlite3
 from datetime import datetime, timezone
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+
+from .store import cursor, ensure_schema
 
 
 # Timestamp database path
 TIMESTAMP_DB = os.path.expanduser("~/.audittrail_timestamps.db")
 
 
-def init_timestamp_db():
-    """Initialize the timestamp database."""
-    conn = sqlite3.connect(TIMESTAMP_DB)
+def _create_timestamp_schema(conn):
     conn.execute("""
     CREATE TABLE IF NOT EXISTS timestamps (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -28,23 +28,15 @@ def init_timestamp_db():
         metadata TEXT
     )
     """)
-    conn.commit()
-    conn.close()
 
 
-def create_local_timestamp(entry_hash: str, metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-    """
-    Create a local timestamp for an entry.
-    
-    Args:
-        entry_hash: Hash of the entry to timestamp
-        metadata: Optional metadata to store with timestamp
-    
-    Returns:
-        Timestamp information dictionary
-    """
-    init_timestamp_db()
-    
+def init_timestamp_db():
+    """Initialize the timestamp database."""
+    ensure_schema(TIMESTAMP_DB, _create_timestamp_schema)
+
+
+def _local_timestamp(entry_hash: str, metadata: Optional[Dict[str, Any]] = None):
+    """Build a local timestamp; returns (info, timestamps table row)."""
     timestamp = datetime.now(timezone.utc).isoformat()
     
     # Create timestamp token (local version - not RFC 3161)
@@ -61,26 +53,69 @@ def create_local_timestamp(entry_hash: str, metadata: Optional[Dict[str, Any]] =
     token = json.dumps(token_data, sort_keys=True)
     token_hash = hashlib.sha256(token.encode()).hexdigest()
     
+    info = {
+        "timestamp": timestamp,
+        "source": "local",
+        "token": token,
+        "token_hash": token_hash
+    }
+    record = (entry_hash, timestamp, "local", token, json.dumps(metadata) if metadata else None)
+    return info, record
+
+
+def create_local_timestamp(entry_hash: str, metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Create a local timestamp for an entry.
+    
+    Args:
+        entry_hash: Hash of the entry to timestamp
+        metadata: Optional metadata to store with timestamp
+    
+    Returns:
+        Timestamp information dictionary
+    """
+    info, record = _local_timestamp(entry_hash, metadata)
+    
     # Store in database
-    conn = sqlite3.connect(TIMESTAMP_DB)
     try:
-        conn.execute(
-            "INSERT INTO timestamps (entry_hash, timestamp, source, token, metadata) VALUES (?, ?, ?, ?, ?)",
-            (entry_hash, timestamp, "local", token, json.dumps(metadata) if metadata else None)
-        )
-        conn.commit()
+        with cursor(TIMESTAMP_DB, _create_timestamp_schema) as cur:
+            cur.execute(
+                "INSERT INTO timestamps (entry_hash, timestamp, source, token, metadata) VALUES (?, ?, ?, ?, ?)",
+                record
+            )
     except sqlite3.IntegrityError:
         # Timestamp already exists
         pass
-    finally:
-        conn.close()
     
-    return {
-        "timestamp": timestamp,
-        "source": "local",
-        "token": token,
-        "token_hash": token_hash
-    }
+    return info
+
+
+def create_local_timestamps(entries) -> List[Dict[str, Any]]:
+    """
+    Create local timestamps for many entries in one transaction.
+    
+    Args:
+        entries: Iterable of (entry_hash, metadata) pairs
+    
+    Returns:
+        List of timestamp information dictionaries, in input order
+    """
+    infos = []
+    records = []
+    for entry_hash, metadata in entries:
+        info, record = _local_timestamp(entry_hash, metadata)
+        infos.append(info)
+        records.append(record)
+    
+    with cursor(TIMESTAMP_DB, _create_timestamp_schema) as cur:
+        # Existing timestamps are kept, as in create_local_timestamp
+        cur.executemany(
+            "INSERT OR IGNORE INTO timestamps (entry_hash, timestamp, source, token, metadata) "
+            "VALUES (?, ?, ?, ?, ?)",
+            records
+        )
+    
+    return infos
 
 
 def verify_local_timestamp(entry_hash: str, timestamp_token: str) -> bool:
@@ -115,16 +150,12 @@ def get_timestamp(entry_hash: str) -> Optional[Dict[str, Any]]:
     Returns:
         Timestamp information or None if not found
     """
-    init_timestamp_db()
-    
-    conn = sqlite3.connect(TIMESTAMP_DB)
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT timestamp, source, token, metadata FROM timestamps WHERE entry_hash = ?",
-        (entry_hash,)
-    )
-    row = cur.fetchone()
-    conn.close()
+    with cursor(TIMESTAMP_DB, _create_timestamp_schema) as cur:
+        cur.execute(
+            "SELECT timestamp, source, token, metadata FROM timestamps WHERE entry_hash = ?",
+            (entry_hash,)
+        )
+        row = cur.fetchone()
     
     if not row:
         return None
@@ -197,25 +228,19 @@ def batch_timestamp_entries(entry_hashes: list) -> Dict[str, Dict[str, Any]]:
 
 def get_timestamp_statistics() -> Dict[str, Any]:
     """Get statistics about timestamps."""
-    init_timestamp_db()
-    
-    conn = sqlite3.connect(TIMESTAMP_DB)
-    cur = conn.cursor()
-    
-    total = cur.execute("SELECT COUNT(*) FROM timestamps").fetchone()[0]
-    by_source = cur.execute(
-        "SELECT source, COUNT(*) FROM timestamps GROUP BY source"
-    ).fetchall()
-    
-    oldest = cur.execute(
-        "SELECT timestamp FROM timestamps ORDER BY timestamp ASC LIMIT 1"
-    ).fetchone()
-    
-    newest = cur.execute(
-        "SELECT timestamp FROM timestamps ORDER BY timestamp DESC LIMIT 1"
-    ).fetchone()
-    
-    conn.close()
+    with cursor(TIMESTAMP_DB, _create_timestamp_schema) as cur:
+        total = cur.execute("SELECT COUNT(*) FROM timestamps").fetchone()[0]
+        by_source = cur.execute(
+            "SELECT source, COUNT(*) FROM timestamps GROUP BY source"
+        ).fetchall()
+        
+        oldest = cur.execute(
+            "SELECT timestamp FROM timestamps ORDER BY timestamp ASC LIMIT 1"
+        ).fetchone()
+        
+        newest = cur.execute(
+            "SELECT timestamp FROM timestamps ORDER BY timestamp DESC LIMIT 1"
+        ).fetchone()
     
     return {
         "total_timestamps": total,
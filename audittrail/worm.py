@@ -10,14 +10,15 @@ import json
 from datetime import datetime, timezone
 from pathlib import Path
 
+from .chain import hash_hex
+from .store import connection, cursor, ensure_schema
+
 
 # WORM protection database
 WORM_DB = os.path.expanduser("~/.audittrail_worm.db")
 
 
-def init_worm_db():
-    """Initialize the WORM protection database."""
-    conn = sqlite3.connect(WORM_DB)
+def _create_worm_schema(conn):
     conn.execute("""
     CREATE TABLE IF NOT EXISTS worm_entries (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -41,9 +42,11 @@ def init_worm_db():
         details TEXT
     )
     """)
-    
-    conn.commit()
-    conn.close()
+
+
+def init_worm_db():
+    """Initialize the WORM protection database."""
+    ensure_schema(WORM_DB, _create_worm_schema)
 
 
 def generate_write_token(db_path: str, entry_hash: str, row_id: int) -> str:
@@ -73,24 +76,48 @@ def protect_entry(db_path: str, entry_hash: str, row_id: int, metadata: dict = N
         row_id: Row ID in the database
         metadata: Optional metadata
     """
-    init_worm_db()
-    
     write_token = generate_write_token(db_path, entry_hash, row_id)
     timestamp = datetime.now(timezone.utc).isoformat()
     
-    conn = sqlite3.connect(WORM_DB)
     try:
-        conn.execute(
-            "INSERT INTO worm_entries (db_path, entry_hash, row_id, timestamp, write_token, metadata) "
-            "VALUES (?, ?, ?, ?, ?, ?)",
-            (db_path, entry_hash, row_id, timestamp, write_token, json.dumps(metadata) if metadata else None)
-        )
-        conn.commit()
+        with cursor(WORM_DB, _create_worm_schema) as cur:
+            cur.execute(
+                "INSERT INTO worm_entries (db_path, entry_hash, row_id, timestamp, write_token, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (db_path, entry_hash, row_id, timestamp, write_token, json.dumps(metadata) if metadata else None)
+            )
     except sqlite3.IntegrityError:
         # Already protected
         pass
-    finally:
-        conn.close()
+
+
+def protect_entries(db_path: str, entries):
+    """
+    Mark many entries as write-protected (WORM) in one transaction.
+    
+    Args:
+        db_path: Path to the audit database
+        entries: Iterable of (entry_hash, row_id, metadata) tuples
+    
+    Returns:
+        Number of entries newly protected
+    """
+    timestamp = datetime.now(timezone.utc).isoformat()
+    records = [
+        (db_path, entry_hash, row_id, timestamp,
+         generate_write_token(db_path, entry_hash, row_id),
+         json.dumps(metadata) if metadata else None)
+        for entry_hash, row_id, metadata in entries
+    ]
+    
+    with cursor(WORM_DB, _create_worm_schema) as cur:
+        # Entries that are already protected are skipped, as in protect_entry
+        cur.executemany(
+            "INSERT OR IGNORE INTO worm_entries (db_path, entry_hash, row_id, timestamp, write_token, metadata) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            records
+        )
+        return cur.rowcount
 
 
 def is_protected(db_path: str, row_id: int) -> bool:
@@ -104,16 +131,12 @@ def is_protected(db_path: str, row_id: int) -> bool:
     Returns:
         True if protected, False otherwise
     """
-    init_worm_db()
-    
-    conn = sqlite3.connect(WORM_DB)
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT COUNT(*) FROM worm_entries WHERE db_path = ? AND row_id = ?",
-        (db_path, row_id)
-    )
-    count = cur.fetchone()[0]
-    conn.close()
+    with cursor(WORM_DB, _create_worm_schema) as cur:
+        cur.execute(
+            "SELECT COUNT(*) FROM worm_entries WHERE db_path = ? AND row_id = ?",
+            (db_path, row_id)
+        )
+        count = cur.fetchone()[0]
     
     return count > 0
 
@@ -130,16 +153,12 @@ def verify_entry_integrity(db_path: str, row_id: int, current_hash: str) -> bool
     Returns:
         True if integrity verified, False if tampered
     """
-    init_worm_db()
-    
-    conn = sqlite3.connect(WORM_DB)
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT entry_hash FROM worm_entries WHERE db_path = ? AND row_id = ?",
-        (db_path, row_id)
-    )
-    row = cur.fetchone()
-    conn.close()
+    with cursor(WORM_DB, _create_worm_schema) as cur:
+        cur.execute(
+            "SELECT entry_hash FROM worm_entries WHERE db_path = ? AND row_id = ?",
+            (db_path, row_id)
+        )
+        row = cur.fetchone()
     
     if not row:
         # Not protected
@@ -164,18 +183,14 @@ def record_violation(db_path: str, entry_hash: str, violation_type: str, details
         violation_type: Type of violation (modification, deletion, etc.)
         details: Additional details about the violation
     """
-    init_worm_db()
-    
     detected_at = datetime.now(timezone.utc).isoformat()
     
-    conn = sqlite3.connect(WORM_DB)
-    conn.execute(
-        "INSERT INTO worm_violations (db_path, entry_hash, violation_type, detected_at, details) "
-        "VALUES (?, ?, ?, ?, ?)",
-        (db_path, entry_hash, violation_type, detected_at, json.dumps(details) if details else None)
-    )
-    conn.commit()
-    conn.close()
+    with cursor(WORM_DB, _create_worm_schema) as cur:
+        cur.execute(
+            "INSERT INTO worm_violations (db_path, entry_hash, violation_type, detected_at, details) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (db_path, entry_hash, violation_type, detected_at, json.dumps(details) if details else None)
+        )
 
 
 def get_violations(db_path: str = None, limit: int = 100):
@@ -189,26 +204,21 @@ def get_violations(db_path: str = None, limit: int = 100):
     Returns:
         List of violation records
     """
-    init_worm_db()
-    
-    conn = sqlite3.connect(WORM_DB)
-    cur = conn.cursor()
-    
-    if db_path:
-        cur.execute(
-            "SELECT id, db_path, entry_hash, violation_type, detected_at, details "
-            "FROM worm_violations WHERE db_path = ? ORDER BY id DESC LIMIT ?",
-            (db_path, limit)
-        )
-    else:
-        cur.execute(
-            "SELECT id, db_path, entry_hash, violation_type, detected_at, details "
-            "FROM worm_violations ORDER BY id DESC LIMIT ?",
-            (limit,)
-        )
-    
-    rows = cur.fetchall()
-    conn.close()
+    with cursor(WORM_DB, _create_worm_schema) as cur:
+        if db_path:
+            cur.execute(
+                "SELECT id, db_path, entry_hash, violation_type, detected_at, details "
+                "FROM worm_violations WHERE db_path = ? ORDER BY id DESC LIMIT ?",
+                (db_path, limit)
+            )
+        else:
+            cur.execute(
+                "SELECT id, db_path, entry_hash, violation_type, detected_at, details "
+                "FROM worm_violations ORDER BY id DESC LIMIT ?",
+                (limit,)
+            )
+        
+        rows = cur.fetchall()
     
     violations = []
     for row in rows:
@@ -234,29 +244,23 @@ def get_protection_stats(db_path: str = None):
     Returns:
         Dictionary of statistics
     """
-    init_worm_db()
-    
-    conn = sqlite3.connect(WORM_DB)
-    cur = conn.cursor()
-    
-    if db_path:
-        protected_count = cur.execute(
-            "SELECT COUNT(*) FROM worm_entries WHERE db_path = ?", (db_path,)
-        ).fetchone()[0]
-        
-        violation_count = cur.execute(
-            "SELECT COUNT(*) FROM worm_violations WHERE db_path = ?", (db_path,)
-        ).fetchone()[0]
-    else:
-        protected_count = cur.execute(
-            "SELECT COUNT(*) FROM worm_entries"
-        ).fetchone()[0]
-        
-        violation_count = cur.execute(
-            "SELECT COUNT(*) FROM worm_violations"
-        ).fetchone()[0]
-    
-    conn.close()
+    with cursor(WORM_DB, _create_worm_schema) as cur:
+        if db_path:
+            protected_count = cur.execute(
+                "SELECT COUNT(*) FROM worm_entries WHERE db_path = ?", (db_path,)
+            ).fetchone()[0]
+            
+            violation_count = cur.execute(
+                "SELECT COUNT(*) FROM worm_violations WHERE db_path = ?", (db_path,)
+            ).fetchone()[0]
+        else:
+            protected_count = cur.execute(
+                "SELECT COUNT(*) FROM worm_entries"
+            ).fetchone()[0]
+            
+            violation_count = cur.execute(
+                "SELECT COUNT(*) FROM worm_violations"
+            ).fetchone()[0]
     
     return {
         "protected_entries": protected_count,
@@ -275,24 +279,18 @@ def enable_worm_for_database(db_path: str):
     Returns:
         Number of entries protected
     """
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
-    
     try:
-        rows = cur.execute(
+        rows = connection(db_path).execute(
             "SELECT rowid, hash FROM ledger ORDER BY rowid ASC"
         ).fetchall()
     except sqlite3.OperationalError:
         # Database doesn't exist or doesn't have ledger table
-        conn.close()
         return 0
     
-    conn.close()
-    
     count = 0
     for row_id, entry_hash in rows:
         if not is_protected(db_path, row_id):
-            protect_entry(db_path, entry_hash, row_id)
+            protect_entry(db_path, hash_hex(entry_hash), row_id)
             count += 1
     
     return count
@@ -309,26 +307,20 @@ def verify_worm_integrity(db_path: str):
         Dictionary with verification results
     """
     # Get all current entries from audit database
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
-    
     try:
-        current_entries = cur.execute(
+        current_entries = connection(db_path).execute(
             "SELECT rowid, hash FROM ledger ORDER BY rowid ASC"
         ).fetchall()
     except sqlite3.OperationalError:
-        conn.close()
         return {"error": "Database not accessible"}
     
-    conn.close()
-    
     # Check each protected entry
     violations = []
     verified = 0
     
     for row_id, current_hash in current_entries:
         if is_protected(db_path, row_id):
-            if verify_entry_integrity(db_path, row_id, current_hash):
+            if verify_entry_integrity(db_path, row_id, hash_hex(current_hash)):
                 verified += 1
             else:
                 violations.append(row_id)
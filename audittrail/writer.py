@@ -0,0 +1,304 @@
+"""
+Background group-commit writer for the audit ledger.
+
+The middleware puts captured entries on a bounded queue and returns
+immediately. A single writer thread drains the queue, chains the hashes
+and commits each batch inside one transaction, so throughput is set by
+batched commits rather than one fsync per request.
+
+With ``signing_mode="batch"`` each committed batch is also signed once: the
+entries become leaves of a Merkle tree and only its root is signed, while
+every row keeps its own audit path to that root.
+
+A batch that cannot be committed (e.g. the database stays locked) is
+retried; if it still fails it is kept, and the next :meth:`flush` raises
+:class:`LedgerWriteError` with its entries instead of dropping them.
+"""
+
+import asyncio
+import atexit
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from .cipher import store_data_keys
+from .payloads import store_payload
+from .chain import advance_chain_head, chain_lock, get_chain_head, set_cached_head
+from .merkle_index import extend_merkle_index
+from .segments import on_active_segment
+from .store import STORE, begin_immediate, connection
+from .ledger import (
+    FORMAT_VERSION, INSERT_SQL, COMPLIANCE_AVAILABLE, SIGNING_MODES, _blob_hashes, _ensure_db,
+    _hash_entry, _protect_batch, _seal_compliance, _sign_batch, _storage_row, _timestamp_batch
+)
+
+try:
+    from .anomaly import record_anomaly
+except ImportError:
+    pass
+
+
+_STOP = object()
+
+# Times a batch is attempted before it is reported as failed, and the
+# first delay between attempts (doubled each time)
+WRITE_ATTEMPTS = 5
+WRITE_RETRY_BACKOFF = 0.1
+
+logger = logging.getLogger(__name__)
+
+
+class LedgerWriteError(RuntimeError):
+    """Audit entries the background writer could not commit; ``entries`` can be resubmitted."""
+
+    def __init__(self, message, entries):
+        super().__init__(message)
+        self.entries = entries
+
+
+class LedgerWriter:
+    """
+    Single-threaded group-commit writer for one ledger database.
+
+    Args:
+        storage_path: Path to SQLite database
+        enable_compliance: Sign, timestamp and WORM-protect entries (default: True)
+        max_queue_size: Maximum number of pending entries before submitters wait
+        batch_size: Maximum number of entries committed per transaction
+        flush_interval: Seconds the writer waits for more entries before committing
+        signer: Signer held for the writer's lifetime (default: the shared Signer)
+        signing_mode: "entry" signs every row; "batch" signs one Merkle root per
+            committed batch (default: "entry")
+
+    Entries are dictionaries with already-encrypted ``body`` and ``response``
+    values plus ``method``, ``path``, ``user``, ``status``, ``key_id`` and,
+    if the payloads were compressed first, ``compression``. Optional
+    ``payload_ids`` (see ``payloads.payload_id``) store repeated payloads once.
+    The writer assigns ``ts`` when it chains the entry so that ledger order
+    and timestamp order always agree.
+
+    Example:
+        writer = LedgerWriter("audit_log.db")
+        writer.submit({"method": "GET", "path": "/", "user": "127.0.0.1", "status": 200,
+                       "body": enc_body, "response": enc_response, "key_id": "local"})
+        writer.close()
+    """
+
+    def __init__(self, storage_path, enable_compliance=True, max_queue_size=10000,
+                 batch_size=256, flush_interval=0.05, signer=None, signing_mode="entry"):
+        if signing_mode not in SIGNING_MODES:
+            raise ValueError(f"signing_mode must be one of {SIGNING_MODES}, got {signing_mode!r}")
+        self.storage_path = storage_path
+        self.signing_mode = signing_mode
+        self.enable_compliance = enable_compliance
+        self.signer = signer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self._failed = []
+        self._error = None
+
+    def start(self):
+        """Start the writer thread if it is not already running."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            _ensure_db(self.storage_path)
+            self._thread = threading.Thread(
+                target=self._run, name=f"audittrail-writer:{self.storage_path}", daemon=True
+            )
+            self._thread.start()
+            atexit.register(self.close)
+
+    def submit(self, entry, block=True, timeout=None):
+        """
+        Queue an entry for writing.
+
+        Raises:
+            queue.Full: If the queue is full and ``block`` is False or ``timeout`` expires
+            RuntimeError: If the writer has been closed or its thread has died
+        """
+        if self._closed:
+            raise RuntimeError("LedgerWriter is closed")
+        if self._thread is None:
+            self.start()
+        elif not self._thread.is_alive():
+            raise RuntimeError(f"LedgerWriter thread for {self.storage_path} is not running")
+        self._queue.put(entry, block=block, timeout=timeout)
+
+    async def submit_async(self, entry):
+        """
+        Queue an entry from async code.
+
+        The common case is a non-blocking put. When the queue is full the put
+        is moved to the default executor so the event loop keeps running while
+        the writer catches up.
+        """
+        try:
+            self.submit(entry, block=False)
+        except queue.Full:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.submit, entry)
+
+    def flush(self):
+        """
+        Block until every queued entry has been committed.
+
+        Raises:
+            LedgerWriteError: If entries could not be committed since the last
+                flush; they are in its ``entries``
+        """
+        if self._thread is not None:
+            self._queue.join()
+        with self._lock:
+            failed, error = self._failed, self._error
+            self._failed, self._error = [], None
+        if failed:
+            raise LedgerWriteError(
+                f"{len(failed)} audit entries could not be written to {self.storage_path}: {error}", failed
+            )
+
+    def close(self, timeout=5.0):
+        """Flush pending entries and stop the writer thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def _run(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    self._queue.task_done()
+                    return
+
+                batch = [item]
+                stop = False
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get(timeout=self.flush_interval)
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stop = True
+                        break
+                    batch.append(item)
+
+                try:
+                    self._commit_batch(batch)
+                except Exception as e:
+                    # Keep the thread alive for later batches; flush() reports this one
+                    self._fail(batch, e)
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+
+                if stop:
+                    self._queue.task_done()
+                    return
+        finally:
+            # This thread's connections: the ledger and any segments it wrote to
+            STORE.close()
+
+    def _commit_batch(self, batch):
+        """Commit a batch, retrying database errors such as a lock held past ``begin_immediate``'s retries."""
+        for attempt in range(WRITE_ATTEMPTS):
+            try:
+                # A segmented root is written through its active segment
+                return on_active_segment(self.storage_path, lambda path: self._commit_to(path, batch))
+            except sqlite3.Error:
+                if attempt == WRITE_ATTEMPTS - 1:
+                    raise
+                time.sleep(WRITE_RETRY_BACKOFF * 2 ** attempt)
+
+    def _fail(self, batch, error):
+        logger.error("Failed to commit %d audit entries to %s: %s", len(batch), self.storage_path, error)
+        if COMPLIANCE_AVAILABLE:
+            try:
+                record_anomaly("write_error", "critical",
+                               f"Failed to commit {len(batch)} audit entries: {error}", self.storage_path)
+            except Exception:
+                pass
+        with self._lock:
+            self._failed.extend(batch)
+            self._error = error
+
+    def _commit_to(self, ledger_path, batch):
+        with chain_lock(ledger_path):
+            row_ids, rows = self._chain_batch(connection(ledger_path), ledger_path, batch)
+
+        if COMPLIANCE_AVAILABLE and rows:
+            _protect_batch(ledger_path, rows, row_ids)
+
+    def _chain_rows(self, conn, batch, prev_hash):
+        """Chain, sign and timestamp a batch after ``prev_hash``; returns ``INSERT_SQL`` rows."""
+        compliance = self.enable_compliance and COMPLIANCE_AVAILABLE
+        batch_signing = self.signing_mode == "batch" and compliance
+        rows = []
+        for entry in batch:
+            ts = datetime.now(timezone.utc).isoformat()
+            status = int(entry["status"])
+            body, response = (
+                store_payload(conn, value, content_id)
+                for value, content_id in zip((entry["body"], entry["response"]),
+                                             entry.get("payload_ids", (None, None)))
+            )
+            entry_hash, body_digest, response_digest = _hash_entry(
+                ts, entry["method"], entry["path"], entry["user"], status,
+                body, response, prev_hash, entry["key_id"]
+            )
+            signature, timestamp_token, worm_protected = _seal_compliance(
+                self.storage_path, ts, entry["method"], entry["path"], entry["user"], status,
+                entry_hash, prev_hash, entry.get("timestamp_metadata"), self.enable_compliance,
+                self.signer, sign=not batch_signing, timestamp=False
+            )
+            rows.append((
+                ts, entry["method"], entry["path"], entry["user"], status,
+                body, response, entry_hash, prev_hash, entry["key_id"],
+                signature, timestamp_token, worm_protected, FORMAT_VERSION, body_digest, response_digest,
+                entry.get("compression")
+            ))
+            prev_hash = entry_hash
+
+        if batch_signing:
+            signatures = _sign_batch(self.storage_path, rows, self.signer)
+            rows = [row[:10] + (signature,) + row[11:] for row, signature in zip(rows, signatures)]
+        if compliance:
+            tokens = _timestamp_batch(rows, [entry.get("timestamp_metadata") for entry in batch])
+            rows = [row[:11] + (token,) + row[12:] for row, token in zip(rows, tokens)]
+        return rows
+
+    def _chain_batch(self, conn, ledger_path, batch):
+        cur = conn.cursor()
+        row_ids = []
+        # One IMMEDIATE transaction (and one fsync) for the whole batch. The
+        # head is read under the write lock, so writers in other processes
+        # cannot chain onto the same entry. Errors roll the batch back and
+        # propagate: a sealed segment is retried on the new one, anything
+        # else by _commit_batch.
+        begin_immediate(conn)
+        with conn:
+            head_seq, prev_hash = get_chain_head(conn, ledger_path)
+            rows = self._chain_rows(conn, batch, prev_hash)
+            blob_hashes = _blob_hashes(conn)
+            for row in rows:
+                cur.execute(INSERT_SQL, _storage_row(row, blob_hashes))
+                row_ids.append(cur.lastrowid)
+            store_data_keys(conn, (value for row in rows for value in row[5:7]))
+            advance_chain_head(cur, row_ids[-1], rows[-1][7])
+            extend_merkle_index(cur, head_seq, [(row_id, row[7]) for row_id, row in zip(row_ids, rows)])
+
+        set_cached_head(ledger_path, row_ids[-1], rows[-1][7])
+        return row_ids, rows
@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# Keys, users and side databases live under ~; keep them out of the real
+# home directory. Paths are resolved when audittrail is imported.
+os.environ["HOME"] = tempfile.mkdtemp(prefix="audittrail-home-")
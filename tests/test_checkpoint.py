@@ -0,0 +1,85 @@
+import os
+import sqlite3
+
+import pytest
+
+from audittrail import add_entries, verify_ledger
+from audittrail.segments import init_segmented_ledger, list_segments
+
+
+def _add(db, start, count):
+    add_entries(db, [
+        {"method": "GET", "path": "/c", "user": "alice", "status": 200, "body": {"i": i}, "response": b"ok"}
+        for i in range(start, start + count)
+    ])
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    db = str(tmp_path / "c.db")
+    _add(db, 0, 20)
+    assert verify_ledger(db, checkpoint=True)["verified"]
+    return db
+
+
+def _rewrite_hash(db, rowid):
+    conn = sqlite3.connect(db)
+    conn.execute("UPDATE ledger SET hash = ? WHERE rowid = ?", ("0" * 64, rowid))
+    conn.commit()
+    conn.close()
+
+
+def test_recheck_finds_rewritten_hash_before_checkpoint(ledger):
+    _rewrite_hash(ledger, 5)
+    assert verify_ledger(ledger)["verified"]
+
+    result = verify_ledger(ledger, recheck=True)
+    assert not result["verified"]
+    reasons = [issue["reason"] for issue in result["details"]]
+    assert "range digest does not match rows 1-20" in reasons[0]
+    # The rejected checkpoint falls back to a full pass that finds the row
+    assert any(issue["row"] == 5 for issue in result["details"][1:])
+
+
+def test_recheck_walks_back_through_earlier_checkpoints(ledger):
+    _add(ledger, 20, 10)
+    result = verify_ledger(ledger, checkpoint=True)
+    assert result["verified"] and result["checked_entries"] == 10
+
+    assert verify_ledger(ledger, recheck=True)["verified"]
+    _rewrite_hash(ledger, 5)
+    result = verify_ledger(ledger, recheck=True)
+    assert not result["verified"]
+    assert "rows 1-20" in result["details"][0]["reason"]
+
+
+def test_verification_does_not_write_without_checkpoint(tmp_path):
+    db = str(tmp_path / "r.db")
+    _add(db, 0, 5)
+    os.chmod(db, 0o444)
+    try:
+        conn = sqlite3.connect(db)
+        tables = conn.execute("SELECT name FROM sqlite_master").fetchall()
+        assert verify_ledger(db)["verified"]
+        assert conn.execute("SELECT name FROM sqlite_master").fetchall() == tables
+    finally:
+        os.chmod(db, 0o644)
+
+
+def test_sealed_segment_is_not_checkpointed(tmp_path):
+    root = str(tmp_path / "s.db")
+    init_segmented_ledger(root, interval=None, max_rows=3)
+    # One entry per call, so the first segment fills and is sealed
+    for i in range(5):
+        _add(root, i, 1)
+    assert verify_ledger(root, checkpoint=True)["verified"]
+
+    counts = []
+    for segment in list_segments(root):
+        conn = sqlite3.connect(segment["path"])
+        has_table = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'verification_checkpoints'"
+        ).fetchone()
+        counts.append(conn.execute("SELECT COUNT(*) FROM verification_checkpoints").fetchone()[0]
+                      if has_table else 0)
+    assert len(counts) == 2 and counts == [0, 1]
@@ -0,0 +1,28 @@
+import sqlite3
+
+import pytest
+
+from audittrail import cipher as cipher_module
+from audittrail.blobstore import BlobWriter, iter_blob
+from audittrail.cipher import ensure_data_key_table, make_cipher, store_data_keys
+
+
+def test_blob_data_keys_are_not_cached(tmp_path):
+    cipher = make_cipher("aes-256-gcm")
+    cached = set(cipher_module._DATA_KEYS)
+    writer = BlobWriter(str(tmp_path), cipher)
+    writer.write(b"x" * 1000)
+    ref = writer.close()
+
+    assert b"".join(iter_blob(str(tmp_path), ref, cipher)) == b"x" * 1000
+    assert set(cipher_module._DATA_KEYS) == cached
+
+
+def test_store_data_keys_refuses_uncached_key():
+    cipher = make_cipher("aes-256-gcm")
+    value = cipher.encrypt(b"payload", cipher.new_data_key(cache=False))
+    conn = sqlite3.connect(":memory:")
+    ensure_data_key_table(conn)
+
+    with pytest.raises(KeyError, match="not cached"):
+        store_data_keys(conn, (value,))
@@ -0,0 +1,42 @@
+import os
+
+import pytest
+from click.testing import CliRunner
+
+from audittrail import add_entry
+from audittrail.cli import cli
+
+
+@pytest.fixture
+def run():
+    runner = CliRunner()
+    runner.invoke(cli, ["login", "--username", "admin", "--password", "admin"], catch_exceptions=False)
+    return lambda *args: runner.invoke(cli, list(args), catch_exceptions=False)
+
+
+def test_rotate_refuses_plain_ledger(tmp_path, run):
+    db = str(tmp_path / "plain.db")
+    add_entry(db, {"method": "GET", "path": "/", "user": "u", "status": 200, "body": {}, "response": b"ok"})
+    with open(db, "rb") as f:
+        before = f.read()
+
+    result = run("rotate", db)
+    assert result.exit_code != 0
+    assert "not a segmented ledger" in result.output
+    with open(db, "rb") as f:
+        assert f.read() == before
+
+
+def test_rotate_refuses_missing_file(tmp_path, run):
+    db = str(tmp_path / "missing.db")
+    result = run("rotate", db)
+    assert result.exit_code != 0 and "No ledger" in result.output
+    assert not os.path.exists(db)
+
+
+def test_rotate_seals_segment(tmp_path, run):
+    db = str(tmp_path / "seg.db")
+    assert run("init", db, "--segment-rows", "100").exit_code == 0
+    add_entry(db, {"method": "GET", "path": "/", "user": "u", "status": 200, "body": {}, "response": b"ok"})
+    result = run("rotate", db)
+    assert result.exit_code == 0 and "Sealed segment" in result.output
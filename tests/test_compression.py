@@ -0,0 +1,91 @@
+import json
+import os
+import sqlite3
+import zlib
+
+import pytest
+
+from audittrail import add_entries, add_entry, compression, verify_ledger
+from audittrail.cipher import decrypt_payload
+from audittrail.compression import (
+    compress_payloads, decompress_payload, register_codec, set_compression
+)
+from audittrail.ledger import verify_payloads
+from audittrail.payloads import load_payload
+
+BIG = {"items": [{"id": i, "name": f"item-{i}"} for i in range(50)]}
+
+
+@pytest.fixture(autouse=True)
+def restore_compression():
+    yield
+    set_compression(compression.DEFAULT_COMPRESSION, compression.COMPRESS_THRESHOLD)
+
+
+def _entry(body, response=b"ok"):
+    return {"method": "POST", "path": "/c", "user": "u", "status": 200, "body": body, "response": response}
+
+
+def _rows(db):
+    conn = sqlite3.connect(db)
+    return conn.execute("SELECT compression, body, response, key_id FROM ledger ORDER BY rowid").fetchall()
+
+
+def _plaintext(db, codec, value, key_id):
+    return decompress_payload(codec, decrypt_payload(load_payload(value, db), db, key_id))
+
+
+@pytest.mark.parametrize("codec", ["zlib", "lzma"])
+def test_round_trip(tmp_path, codec):
+    db = str(tmp_path / "c.db")
+    set_compression(codec)
+    response = json.dumps(BIG).encode()
+    add_entry(db, _entry(BIG, response))
+    add_entries(db, [_entry(BIG, b"x" * 1000)] * 3)
+
+    rows = _rows(db)
+    assert [row[0] for row in rows] == [codec] * 4
+    body, stored_response = (_plaintext(db, codec, value, rows[0][3]) for value in rows[0][1:3])
+    assert json.loads(body) == BIG and stored_response == response
+    assert _plaintext(db, codec, rows[1][2], rows[1][3]) == b"x" * 1000
+
+    assert verify_ledger(db, full=True)["verified"]
+    assert verify_payloads(db)["verified"]
+
+
+def test_small_rows_are_stored_as_is(tmp_path):
+    db = str(tmp_path / "c.db")
+    set_compression("zlib", threshold=256)
+    add_entry(db, _entry({}))
+    set_compression(None)
+    add_entry(db, _entry(BIG))
+
+    rows = _rows(db)
+    assert [row[0] for row in rows] == [None, None]
+    assert _plaintext(db, None, rows[1][1], rows[1][3]) == json.dumps(BIG, sort_keys=True).encode()
+    assert verify_ledger(db)["verified"]
+
+
+def test_incompressible_payloads_are_stored_as_is():
+    set_compression("zlib", threshold=0)
+    data = os.urandom(4096)
+    assert compress_payloads([data, None]) == (None, [data, None])
+
+    codec, (body, response) = compress_payloads([b"a" * 4096, None])
+    assert codec == "zlib" and response is None
+    assert decompress_payload(codec, body) == b"a" * 4096
+
+
+def test_codecs():
+    with pytest.raises(ValueError, match="compression must be one of"):
+        set_compression("zstd")
+    with pytest.raises(ValueError, match="register_codec"):
+        decompress_payload("zstd", b"")
+
+    register_codec("zlib9", lambda data: zlib.compress(data, 9), zlib.decompress)
+    try:
+        set_compression("zlib9", threshold=0)
+        codec, (body,) = compress_payloads([b"a" * 4096])
+        assert codec == "zlib9" and decompress_payload(codec, body) == b"a" * 4096
+    finally:
+        del compression.CODECS["zlib9"]
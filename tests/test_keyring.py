@@ -0,0 +1,88 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+
+import pytest
+from cryptography.fernet import Fernet
+
+from audittrail import add_entry, key_manager, verify_ledger
+from audittrail import cipher as cipher_module
+from audittrail.cipher import decrypt_payload, decrypt_record, load_data_key_record, set_cipher
+from audittrail.key_manager import EnvKeySource, Keyring, set_keyring
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_with_unknown_key_id():
+    # The key id only labels rows until a key is registered for it
+    env = dict(os.environ, HOME=tempfile.mkdtemp(), AUDITTRAIL_KEY_ID="prod", PYTHONPATH=REPO)
+    script = (
+        "import os, sqlite3, audittrail\n"
+        "from audittrail import add_entry\n"
+        "from audittrail.cipher import decrypt_payload\n"
+        "db = os.path.join(os.environ['HOME'], 'a.db')\n"
+        "add_entry(db, {'method': 'GET', 'path': '/', 'user': 'u', 'status': 200, 'body': {}, 'response': b'ok'})\n"
+        "key_id, response = sqlite3.connect(db).execute('SELECT key_id, response FROM ledger').fetchone()\n"
+        "print(key_id, decrypt_payload(response, db, key_id).decode())\n"
+    )
+    result = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == ["prod", "ok"]
+
+
+def test_unknown_key_id_falls_back_to_local_key():
+    keyring = Keyring(EnvKeySource({"AUDITTRAIL_KEY_local": "bG9jYWw="}), current="prod")
+    assert keyring.key("prod") == keyring.key("local")
+    assert not keyring.has_key("prod") and keyring.has_key("local")
+
+
+@pytest.fixture
+def keys(monkeypatch):
+    """Two master keys; restores the process-wide keyring, cipher and data key cache."""
+    monkeypatch.setattr(key_manager, "_keyring", None)
+    monkeypatch.setattr(cipher_module, "_cipher", None)
+    monkeypatch.setattr(cipher_module, "_cipher_keyring", None)
+    monkeypatch.setattr(cipher_module, "_DATA_KEYS", {})
+    return EnvKeySource({f"AUDITTRAIL_KEY_{key_id}": Fernet.generate_key().decode() for key_id in ("a", "b")})
+
+
+def test_lookup_by_key_id(keys):
+    keyring = Keyring(keys, current="a")
+    assert keyring.key() == keyring.key("a") != keyring.key("b")
+    assert keyring.fernet("b") is keyring.fernet("b")
+    assert keyring.envelope("b") is keyring.envelope("b") is not keyring.envelope("a")
+    assert keyring.key_ids() == ["a", "b"]
+
+    token = keyring.fernet("b").encrypt(b"row")
+    assert keyring.decrypt_fernet(token, "b") == b"row"
+    # A wrong or missing row key id falls back to every known key
+    assert keyring.decrypt_fernet(token, "a") == keyring.decrypt_fernet(token.decode()) == b"row"
+
+
+def test_data_key_unwraps_with_its_master_key(keys):
+    envelope = Keyring(keys, current="b").envelope()
+    data_key = envelope.new_data_key(cache=False)
+    value = envelope.encrypt(b"payload", data_key)
+
+    set_keyring(Keyring(keys, current="a"))
+    assert decrypt_record(load_data_key_record(data_key.record(), cache=False), value) == b"payload"
+
+
+@pytest.mark.parametrize("cipher", ["aes-256-gcm", "fernet"])
+def test_rows_decrypt_with_their_own_key(tmp_path, keys, cipher):
+    db = str(tmp_path / "k.db")
+    for key_id in ("a", "b"):
+        set_keyring(Keyring(keys, current=key_id))
+        set_cipher(cipher)
+        add_entry(db, {"method": "GET", "path": "/", "user": "u", "status": 200, "body": {},
+                       "response": f"written with {key_id}".encode()})
+
+    set_keyring(Keyring(keys, current="a"))
+    cipher_module._DATA_KEYS.clear()
+    rows = sqlite3.connect(db).execute("SELECT key_id, response FROM ledger ORDER BY rowid").fetchall()
+    assert [(key_id, decrypt_payload(value, db, key_id)) for key_id, value in rows] == [
+        ("a", b"written with a"), ("b", b"written with b")
+    ]
+    assert verify_ledger(db, full=True)["verified"]
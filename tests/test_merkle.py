@@ -0,0 +1,80 @@
+import sqlite3
+
+import pytest
+
+from audittrail import add_entries, add_entry
+from audittrail.merkle import (
+    InMemoryTree, consistency_proof as tree_consistency_proof, leaf_hash, verify_audit_path, verify_consistency
+)
+from audittrail.merkle_index import (
+    consistency_proof, get_root, inclusion_proof, rebuild_merkle_index, verify_consistency_proof,
+    verify_inclusion
+)
+
+
+def _entries(start, count):
+    return [{"method": "GET", "path": f"/m/{i}", "user": "u", "status": 200, "body": {"i": i}, "response": b"ok"}
+            for i in range(start, start + count)]
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    db = str(tmp_path / "m.db")
+    add_entries(db, _entries(0, 13), enable_compliance=False)
+    return db
+
+
+def test_in_memory_proofs_for_every_size():
+    leaves = [leaf_hash(bytes([i])) for i in range(17)]
+    for size in range(1, 18):
+        tree = InMemoryTree(leaves[:size])
+        for index in range(size):
+            assert verify_audit_path(index, size, leaves[index], tree.audit_path(index), tree.root())
+        for old_size in range(1, size + 1):
+            old_root = InMemoryTree(leaves[:old_size]).root()
+            proof = tree_consistency_proof(old_size, size, tree.subtree_hash)
+            assert verify_consistency(old_size, size, old_root, tree.root(), proof)
+
+
+def test_inclusion_proof_for_every_row(ledger):
+    root = get_root(ledger)
+    assert root["tree_size"] == 13
+    for rowid in range(1, 14):
+        proof = inclusion_proof(ledger, rowid)
+        assert verify_inclusion(proof["entry_hash"], proof, root["root"])
+
+
+def test_inclusion_proof_rejects_other_entry(ledger):
+    proof = inclusion_proof(ledger, 5)
+    other = inclusion_proof(ledger, 6)["entry_hash"]
+    assert not verify_inclusion(other, proof)
+    with pytest.raises(LookupError):
+        inclusion_proof(ledger, 99)
+
+
+def test_consistency_proof_after_appends(ledger):
+    old_root = get_root(ledger)["root"]
+    add_entries(ledger, _entries(13, 9), enable_compliance=False)
+    add_entry(ledger, _entries(22, 1)[0], enable_compliance=False)
+
+    proof = consistency_proof(ledger, 13)
+    assert proof["new_size"] == 23
+    assert verify_consistency_proof(proof, old_root=old_root, new_root=get_root(ledger)["root"])
+
+
+def test_consistency_proof_detects_rewritten_history(ledger):
+    old_root = get_root(ledger)["root"]
+    conn = sqlite3.connect(ledger)
+    conn.execute("UPDATE ledger SET hash = ? WHERE rowid = 3", (bytes(32),))
+    conn.commit()
+    rebuild_merkle_index(ledger)
+
+    proof = consistency_proof(ledger, 13)
+    assert proof["old_root"] != old_root
+    assert not verify_consistency_proof(proof, old_root=old_root)
+
+
+def test_rebuilt_index_has_same_root(ledger):
+    root = get_root(ledger)["root"]
+    assert rebuild_merkle_index(ledger) == 13
+    assert get_root(ledger)["root"] == root
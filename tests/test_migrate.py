@@ -0,0 +1,82 @@
+import sqlite3
+
+import pytest
+
+from audittrail import add_entry, verify_ledger
+from audittrail import migrate as migrate_module
+from audittrail.ledger import LEDGER_SCHEMA_VERSION, _compute_hash_string
+from audittrail.migrate import migrate_ledger
+
+ROWS = 300
+
+
+def _entry(i):
+    return {"method": "POST", "path": f"/n/{i}", "user": "x", "status": 201, "body": {"i": i}, "response": b"ok"}
+
+
+@pytest.fixture
+def legacy(tmp_path):
+    """A schema 1 ledger: no primary key or indexes, hex TEXT hashes."""
+    db = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE ledger (ts TEXT, method TEXT, path TEXT, user TEXT, status INT, "
+                 "body TEXT, response TEXT, hash TEXT, prev_hash TEXT)")
+    prev = ""
+    for i in range(ROWS):
+        entry_hash = _compute_hash_string(f"t{i}", "GET", f"/{i}", "u", 200, "b", "r", prev, "local")
+        conn.execute("INSERT INTO ledger VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     (f"t{i}", "GET", f"/{i}", "u", 200, "b", "r", entry_hash, prev))
+        prev = entry_hash
+    conn.commit()
+    conn.close()
+    return db
+
+
+def test_migration_upgrades_schema_and_keeps_chain(legacy):
+    result = migrate_ledger(legacy, batch_size=64)
+    assert result["migrated"] and result["rows_copied"] == ROWS
+
+    conn = sqlite3.connect(legacy)
+    assert conn.execute("PRAGMA user_version").fetchone() == (LEDGER_SCHEMA_VERSION,)
+    assert conn.execute("SELECT typeof(hash), COUNT(*) FROM ledger GROUP BY 1").fetchall() == [("blob", ROWS)]
+    assert conn.execute("SELECT MIN(seq), MAX(seq) FROM ledger").fetchone() == (1, ROWS)
+    assert "ledger_old" not in {name for (name,) in conn.execute("SELECT name FROM sqlite_master")}
+
+    add_entry(legacy, _entry(0))
+    result = verify_ledger(legacy, full=True)
+    assert result["verified"] and result["total_entries"] == ROWS + 1
+    assert not migrate_ledger(legacy)["migrated"]
+
+
+def test_interrupted_migration_resumes(legacy, monkeypatch):
+    copy_batch = migrate_module._copy_batch
+    calls = []
+
+    def crash_on_third_batch(conn, last_seq, batch_size):
+        calls.append(last_seq)
+        if len(calls) == 3:
+            raise RuntimeError("crash")
+        return copy_batch(conn, last_seq, batch_size)
+
+    monkeypatch.setattr(migrate_module, "_copy_batch", crash_on_third_batch)
+    with pytest.raises(RuntimeError):
+        migrate_ledger(legacy, batch_size=100)
+    monkeypatch.setattr(migrate_module, "_copy_batch", copy_batch)
+
+    result = migrate_ledger(legacy, batch_size=100)
+    assert result["resumed_from"] == 200
+    assert verify_ledger(legacy, full=True)["verified"]
+
+
+def test_rows_appended_during_migration_are_copied(legacy):
+    appended = []
+
+    def append_while_copying(copied, total):
+        if len(appended) < 3:
+            add_entry(legacy, _entry(len(appended)))
+            appended.append(copied)
+
+    result = migrate_ledger(legacy, batch_size=100, on_progress=append_while_copying)
+    assert result["rows_copied"] == ROWS + 3
+    result = verify_ledger(legacy, full=True)
+    assert result["verified"] and result["total_entries"] == ROWS + 3
@@ -0,0 +1,19 @@
+import pytest
+
+from audittrail import payloads
+from audittrail.payloads import DEDUP_MIN_SIZE, payload_id, set_dedup
+
+
+@pytest.fixture(autouse=True)
+def restore_dedup():
+    yield
+    set_dedup(payloads.DEDUP, DEDUP_MIN_SIZE)
+
+
+def test_set_dedup_min_size_leaves_default_alone():
+    data = b"x" * 32
+    assert payload_id(data) is None
+
+    set_dedup(True, min_size=16)
+    assert payload_id(data) is not None
+    assert payloads.DEDUP_MIN_SIZE == 64
@@ -0,0 +1,61 @@
+import os
+import sqlite3
+
+import pytest
+from cryptography.fernet import Fernet
+
+from audittrail import add_entries, verify_ledger
+from audittrail.rotation import rotate_ledger
+
+
+@pytest.fixture
+def ledger(tmp_path, monkeypatch):
+    monkeypatch.setenv("AUDITTRAIL_KEY_k2", Fernet.generate_key().decode())
+    db = str(tmp_path / "r.db")
+    add_entries(db, [
+        {"method": "GET", "path": "/r", "user": "alice", "status": 200, "body": {"i": i}, "response": b"ok"}
+        for i in range(20)
+    ])
+    return db
+
+
+def _tamper(db):
+    conn = sqlite3.connect(db)
+    conn.execute("UPDATE ledger SET user = 'mallory', status = 999 WHERE rowid = 5")
+    conn.commit()
+    conn.close()
+
+
+def test_rotation_reencrypts_and_verifies(ledger):
+    result = rotate_ledger(ledger, key_id="k2")
+    assert result["rotated"] and result["rows_rotated"] == 20
+    assert verify_ledger(result["path"], full=True)["verified"]
+
+
+def test_rotation_refuses_row_tampered_before_checkpoint(ledger):
+    # The incremental pass only checks rows after this checkpoint
+    assert verify_ledger(ledger, checkpoint=True)["verified"]
+    _tamper(ledger)
+    assert verify_ledger(ledger)["verified"]
+
+    with pytest.raises(ValueError):
+        rotate_ledger(ledger, key_id="k2")
+
+
+def test_rotation_checks_chain_without_verification_pass(ledger):
+    _tamper(ledger)
+    with pytest.raises(ValueError, match="Row 5"):
+        rotate_ledger(ledger, key_id="k2", verify=False)
+    out = ledger.replace(".db", ".rotated.db")
+    assert sqlite3.connect(out).execute("SELECT COUNT(*) FROM ledger WHERE user = 'mallory'").fetchone() == (0,)
+
+
+def test_verification_checks_rotation_record(ledger):
+    path = rotate_ledger(ledger, key_id="k2")["path"]
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE key_rotations SET record = json_set(record, '$.new_hash', ?)", ("0" * 64,))
+    conn.commit()
+
+    result = verify_ledger(path)
+    assert not result["verified"]
+    assert any("Key rotation record" in issue["reason"] for issue in result["details"])
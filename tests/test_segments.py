@@ -0,0 +1,141 @@
+import json
+import sqlite3
+import time
+import types
+
+import pytest
+
+from audittrail import add_entries, add_entry, verify_ledger
+from audittrail import segments as segments_module
+from audittrail.segments import (
+    active_segment, check_segment_manifest, init_segmented_ledger, is_sealed_segment, ledger_files,
+    list_segments, rotate_segment, verify_segment
+)
+from audittrail.store import STORE, connection
+
+
+def _entry(i):
+    return {"method": "POST", "path": f"/s/{i}", "user": "u", "status": 200, "body": {"i": i}, "response": b"r"}
+
+
+def _add(root, start, count):
+    # One append per entry: a batch lands in a single segment
+    for i in range(start, start + count):
+        add_entry(root, _entry(i))
+
+
+@pytest.fixture
+def root(tmp_path):
+    db = str(tmp_path / "root.db")
+    init_segmented_ledger(db, interval=None, max_rows=3)
+    _add(db, 0, 7)
+    return db
+
+
+def _reasons(result):
+    return [issue["reason"] for issue in result.get("details", [])]
+
+
+def test_max_rows_seals_segments(root):
+    segments = list_segments(root)
+    assert [(s["base_seq"], s["manifest"] and s["manifest"]["entries"]) for s in segments] == [
+        (0, 3), (3, 3), (6, None)
+    ]
+    assert [is_sealed_segment(connection(s["path"])) for s in segments] == [True, True, False]
+
+    first, second = segments[0]["manifest"], segments[1]["manifest"]
+    assert (first["first_seq"], first["last_seq"]) == (1, 3)
+    assert first["signature"]
+    assert (segments[1]["base_seq"], segments[1]["base_hash"]) == (first["last_seq"], first["last_hash"])
+    assert (segments[2]["base_seq"], segments[2]["base_hash"]) == (second["last_seq"], second["last_hash"])
+
+    seqs = [seq for path in ledger_files(root)
+            for (seq,) in sqlite3.connect(path).execute("SELECT rowid FROM ledger ORDER BY rowid")]
+    assert seqs == list(range(1, 8))
+    result = verify_ledger(root)
+    assert result["verified"] and result["total_entries"] == 7 and result["sealed_segments"] == 2
+
+
+def test_batch_stays_in_one_segment(tmp_path):
+    db = str(tmp_path / "root.db")
+    init_segmented_ledger(db, interval=None, max_rows=3)
+    add_entries(db, [_entry(i) for i in range(5)])
+    assert [s["manifest"] for s in list_segments(db)] == [None]
+    _add(db, 5, 1)
+    assert [s["manifest"] and s["manifest"]["entries"] for s in list_segments(db)] == [5, None]
+
+
+def test_interval_seals_segment(tmp_path, monkeypatch):
+    db = str(tmp_path / "root.db")
+    init_segmented_ledger(db, interval="hourly")
+    _add(db, 0, 2)
+    assert len(list_segments(db)) == 1
+
+    later = time.time() + 3600
+    monkeypatch.setattr(segments_module, "time", types.SimpleNamespace(time=lambda: later))
+    _add(db, 2, 1)
+    segments = list_segments(db)
+    assert [s["manifest"] and s["manifest"]["entries"] for s in segments] == [2, None]
+    assert verify_ledger(db)["verified"]
+
+
+def test_forced_rotation(root):
+    path = rotate_segment(root, force=True)
+    assert path == active_segment(root) == list_segments(root)[-1]["path"]
+    # An empty active segment still seals, and the chain passes through it
+    rotate_segment(root, force=True)
+    manifests = [s["manifest"] for s in list_segments(root)]
+    assert [m and m["entries"] for m in manifests] == [3, 3, 1, 0, None]
+    assert manifests[3]["last_seq"] == 7
+    _add(root, 7, 1)
+    assert verify_ledger(root)["verified"]
+
+
+def test_rotation_waits_for_policy(root):
+    path = active_segment(root)
+    assert rotate_segment(root) == path
+
+
+def test_sealed_segment_rejects_writes(root):
+    conn = sqlite3.connect(list_segments(root)[0]["path"])
+    with pytest.raises(sqlite3.IntegrityError, match="sealed"):
+        conn.execute("UPDATE ledger SET status = 500 WHERE rowid = 2")
+    with pytest.raises(sqlite3.IntegrityError, match="sealed"):
+        conn.execute("DELETE FROM ledger WHERE rowid = 3")
+
+
+def test_truncated_segment_is_detected(root):
+    path = list_segments(root)[1]["path"]
+    conn = sqlite3.connect(path)
+    conn.execute("DROP TRIGGER ledger_sealed_delete")
+    conn.execute("DELETE FROM ledger WHERE rowid = 6")
+    conn.commit()
+    STORE.reset()
+
+    assert "Segment entries changed since it was sealed (3 -> 2 entries)" in [
+        issue["reason"] for issue in check_segment_manifest(path)
+    ]
+    assert not verify_segment(path)["verified"]
+    assert not verify_ledger(root)["verified"]
+
+
+def test_edited_manifest_is_detected(root):
+    path = list_segments(root)[0]["path"]
+    conn = sqlite3.connect(path)
+    (manifest,) = conn.execute("SELECT manifest FROM segment_manifest").fetchone()
+    manifest = dict(json.loads(manifest), entries=2, last_seq=2)
+    conn.execute("UPDATE segment_manifest SET manifest = ?", (json.dumps(manifest),))
+    conn.commit()
+
+    assert "Segment manifest signature verification failed" in [
+        issue["reason"] for issue in check_segment_manifest(path)
+    ]
+    reasons = _reasons(verify_ledger(root))
+    assert "Segment manifest does not match the registry" in reasons
+
+
+def test_unsegmented_ledger_cannot_become_root(tmp_path):
+    db = str(tmp_path / "plain.db")
+    add_entry(db, _entry(0))
+    with pytest.raises(ValueError, match="unsegmented ledger"):
+        init_segmented_ledger(db)
@@ -0,0 +1,90 @@
+import sqlite3
+
+import pytest
+
+from audittrail import add_entries, add_entry, verify_ledger
+from audittrail.shards import anchor_shards, list_shards, route_prefix, shard_path, verify_anchors
+from audittrail.store import STORE
+
+
+def _add(root, shard, count):
+    add_entries(shard_path(root, shard), [
+        {"method": "POST", "path": f"/{shard}", "user": "u", "status": 200, "body": {"i": i}, "response": b"r"}
+        for i in range(count)
+    ])
+
+
+@pytest.fixture
+def root(tmp_path):
+    db = str(tmp_path / "root.db")
+    _add(db, "acme", 10)
+    _add(db, "globex", 5)
+    heads = anchor_shards(db)["heads"]
+    assert {name: head["seq"] for name, head in heads.items()} == {"acme": 10, "globex": 5}
+    return db
+
+
+def _reasons(result):
+    return [issue["reason"] for issue in result["details"]]
+
+
+def test_shards_are_independent_chains(root):
+    assert list(list_shards(root)) == ["acme", "globex"]
+    for path in list_shards(root).values():
+        assert sqlite3.connect(path).execute("SELECT MIN(rowid) FROM ledger").fetchone() == (1,)
+
+    _add(root, "acme", 1)
+    result = verify_ledger(root)
+    assert result["verified"] and result["total_entries"] == 16
+    assert result["unanchored_entries"] == 1
+
+
+def test_anchor_only_when_a_shard_moved(root):
+    assert anchor_shards(root) is None
+    _add(root, "globex", 1)
+    anchor = anchor_shards(root)
+    assert anchor["heads"]["globex"]["seq"] == 6
+    assert anchor["seq"] == 2
+    assert verify_anchors(root) == {"anchors": 2, "unanchored_entries": 0, "details": []}
+
+
+def test_rolled_back_shard_breaks_anchor(root):
+    # Truncate globex to 3 rows: the shard's own chain still verifies
+    conn = sqlite3.connect(list_shards(root)["globex"])
+    conn.execute("DELETE FROM ledger WHERE rowid > 3")
+    conn.execute("DELETE FROM merkle_leaves WHERE idx >= 3")
+    conn.execute("UPDATE ledger_head SET seq = 3, hash = (SELECT hash FROM ledger WHERE rowid = 3)")
+    conn.commit()
+    STORE.reset()
+
+    assert "Anchored entry missing" in _reasons(verify_anchors(root))
+    # Anchoring the rolled-back head records a head that moved backwards
+    anchor_shards(root)
+    assert "Anchored shard head moved backwards" in _reasons(verify_anchors(root))
+    assert not verify_ledger(root)["verified"]
+
+
+def test_rewritten_shard_breaks_anchor(root):
+    conn = sqlite3.connect(list_shards(root)["acme"])
+    conn.execute("UPDATE ledger SET hash = ? WHERE rowid = 10", (bytes(32),))
+    conn.commit()
+    assert "Anchored entry hash mismatch" in _reasons(verify_anchors(root))
+
+
+def test_edited_anchor_is_detected(root):
+    conn = sqlite3.connect(root)
+    conn.execute("UPDATE shard_anchors SET heads = replace(heads, '\"seq\": 10', '\"seq\": 9') WHERE seq = 1")
+    conn.commit()
+    assert "Anchor hash mismatch" in _reasons(verify_anchors(root))
+
+
+def test_unsharded_ledger_cannot_become_root(tmp_path):
+    db = str(tmp_path / "plain.db")
+    add_entry(db, {"method": "GET", "path": "/", "user": "u", "status": 200, "body": {}, "response": b""})
+    with pytest.raises(ValueError, match="unsharded ledger"):
+        shard_path(db, "acme")
+
+
+def test_route_prefix():
+    assert route_prefix()({"path": "/tenants/acme/orders"}) == "/tenants"
+    assert route_prefix(2)({"path": "/tenants/acme/orders"}) == "/tenants/acme"
@@ -0,0 +1,21 @@
+from cryptography.hazmat.primitives.asymmetric import ed25519
+
+from audittrail import signatures
+from audittrail.signatures import Signer, initialize_signing_keys, verify_signature
+
+
+def test_signature_is_tagged_with_the_key_that_made_it(monkeypatch):
+    initialize_signing_keys()
+    signer = Signer()
+    raw_sign = signatures._raw_sign
+    other = ed25519.Ed25519PrivateKey.generate()
+
+    def sign_during_reload(private_key, data):
+        # Another thread picks up a different key while this one signs
+        monkeypatch.setattr(signatures, "load_private_key", lambda password=None: other)
+        signer.reload()
+        signer.private_key()
+        return raw_sign(private_key, data)
+
+    monkeypatch.setattr(signatures, "_raw_sign", sign_during_reload)
+    assert verify_signature("data", signer.sign("data"))
@@ -0,0 +1,27 @@
+import sqlite3
+
+import pytest
+
+from audittrail.store import begin_immediate
+
+
+def test_begin_immediate_refuses_open_transaction(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "s.db"))
+    conn.execute("CREATE TABLE t (x)")
+    conn.execute("INSERT INTO t VALUES (1)")
+
+    with pytest.raises(RuntimeError, match="open transaction"):
+        begin_immediate(conn)
+    # The caller's work was not committed behind its back
+    conn.rollback()
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone() == (0,)
+
+
+def test_begin_immediate_takes_write_lock(tmp_path):
+    path = str(tmp_path / "s.db")
+    conn = sqlite3.connect(path)
+    begin_immediate(conn)
+    other = sqlite3.connect(path, timeout=0)
+    with pytest.raises(sqlite3.OperationalError, match="locked"):
+        begin_immediate(other, retries=1)
+    conn.rollback()
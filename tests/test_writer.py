@@ -0,0 +1,75 @@
+import sqlite3
+
+import pytest
+
+from audittrail import writer as writer_module
+from audittrail.writer import LedgerWriteError, LedgerWriter
+
+
+def _entry(i):
+    return {"method": "GET", "path": "/w", "user": "alice", "status": 200,
+            "body": f"body-{i}", "response": "ok", "key_id": "local"}
+
+
+@pytest.fixture
+def writer(tmp_path, monkeypatch):
+    monkeypatch.setattr(writer_module, "WRITE_RETRY_BACKOFF", 0)
+    w = LedgerWriter(str(tmp_path / "w.db"), enable_compliance=False, flush_interval=0.01)
+    yield w
+    w.close()
+
+
+def _fail_commits(monkeypatch, writer, times, error):
+    calls = []
+    commit = writer._commit_to
+
+    def flaky(path, batch):
+        calls.append(len(batch))
+        if len(calls) <= times:
+            raise error
+        return commit(path, batch)
+
+    monkeypatch.setattr(writer, "_commit_to", flaky)
+    return calls
+
+
+def _count(writer):
+    return sqlite3.connect(writer.storage_path).execute("SELECT COUNT(*) FROM ledger").fetchone()[0]
+
+
+def test_locked_batch_is_retried(writer, monkeypatch):
+    calls = _fail_commits(monkeypatch, writer, 2, sqlite3.OperationalError("database is locked"))
+    writer.submit(_entry(0))
+    writer.flush()
+    assert len(calls) == 3
+    assert _count(writer) == 1
+
+
+def test_failed_batch_is_reported_and_thread_survives(writer, monkeypatch):
+    _fail_commits(monkeypatch, writer, writer_module.WRITE_ATTEMPTS, sqlite3.OperationalError("disk I/O error"))
+    writer.submit(_entry(0))
+    with pytest.raises(LedgerWriteError, match="disk I/O error") as excinfo:
+        writer.flush()
+    assert [entry["body"] for entry in excinfo.value.entries] == ["body-0"]
+
+    # The thread keeps writing, and the failed entries can be resubmitted
+    for entry in excinfo.value.entries + [_entry(1)]:
+        writer.submit(entry)
+    writer.flush()
+    assert _count(writer) == 2
+
+
+def test_unexpected_error_does_not_kill_thread(writer, monkeypatch):
+    _fail_commits(monkeypatch, writer, 1, TypeError("bad entry"))
+    writer.submit(_entry(0))
+    with pytest.raises(LedgerWriteError):
+        writer.flush()
+    assert writer._thread.is_alive()
+
+
+def test_submit_fails_when_thread_is_dead(writer):
+    writer.start()
+    writer._queue.put(writer_module._STOP)
+    writer._thread.join()
+    with pytest.raises(RuntimeError, match="not running"):
+        writer.submit(_entry(0))